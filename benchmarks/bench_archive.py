@@ -0,0 +1,59 @@
+"""
+Disk size and read times of the raw results as indented JSON (as saved before) and as archives
+(src/storage/raw_archive.py), on a synthetic multi-year history.
+
+    python -m benchmarks.bench_archive --papers 10000 --years 2020 2024
+
+For each format: the bytes on disk, the time to read every record back, and the time to read the
+last 25 records of a year (one result page), which the archives do from a single block.
+"""
+import argparse
+import tempfile
+import time
+from pathlib import Path
+
+from benchmarks.synthetic_corpus import generate_entries, build_affiliations, build_vocabulary
+from src.storage import raw_archive
+from src.storage.raw_archive import iter_records, read_records, write_records
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--papers", type=int, default=10_000, help="Papers per year")
+    parser.add_argument("--years", type=int, nargs=2, default=[2020, 2024], metavar=("START", "END"))
+    args = parser.parse_args()
+    years = range(args.years[0], args.years[1] + 1)
+
+    formats = [".json", ".jsonl.gz"] + ([".jsonl.zst"] if raw_archive.zstandard is not None else [])
+    affiliations = build_affiliations(max(100, args.papers // 20))
+    vocabulary = build_vocabulary()
+    print(f"{args.papers} papers x {len(years)} years")
+    print(f"{'format':<12}{'MiB':>8}{'ratio':>7}{'write s':>9}{'read all s':>12}{'last page ms':>14}")
+    with tempfile.TemporaryDirectory() as tmp:
+        sizes = {}
+        for suffix in formats:
+            directory = Path(tmp) / suffix.strip(".")
+            start = time.perf_counter()
+            for year in years:
+                write_records(generate_entries(args.papers, year, affiliations=affiliations, vocabulary=vocabulary),
+                              directory / f"synthetic_{year}_raw{suffix}")
+            write_time = time.perf_counter() - start
+            sizes[suffix] = sum(path.stat().st_size for path in directory.iterdir())
+
+            start = time.perf_counter()
+            n = sum(len(read_records(directory / f"synthetic_{year}_raw{suffix}")) for year in years)
+            read_time = time.perf_counter() - start
+            assert n == args.papers * len(years)
+
+            start = time.perf_counter()
+            for year in years:
+                page = list(iter_records(directory / f"synthetic_{year}_raw{suffix}", args.papers - 25, args.papers))
+                assert len(page) == 25
+            page_time = (time.perf_counter() - start) / len(years)
+
+            print(f"{suffix:<12}{sizes[suffix] / 2**20:>8.1f}{sizes['.json'] / sizes[suffix]:>7.1f}"
+                  f"{write_time:>9.2f}{read_time:>12.2f}{page_time * 1000:>14.1f}")
+
+
+if __name__ == "__main__":
+    main()
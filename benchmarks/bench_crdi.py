@@ -0,0 +1,87 @@
+"""
+Benchmark of calculate_crdi on synthetic paper-level frames.
+
+    python -m benchmarks.bench_crdi --rows 100000 1000000 10000000
+
+The previous two-groupby-and-merge implementation is timed too, up to --legacy-max-rows
+(its merges on state_name alone multiply rows, so it gets slow and memory hungry quickly).
+"""
+import argparse
+import tempfile
+import time
+from pathlib import Path
+import numpy as np
+import pandas as pd
+from src.cleaning.clean_data import AREA_DF, calculate_crdi
+
+
+def synthetic_state_papers(n_rows, seed=0):
+    """
+    Builds a frame shaped like building_state_df's output, with states drawn from provinces_area.json.
+    """
+    rng = np.random.default_rng(seed)
+    regions = AREA_DF[AREA_DF["state_name"] != ""].reset_index(drop=True)
+    # A few regions produce most papers: weight ~ 1 / rank over a random ranking of the regions
+    weights = 1.0 / rng.permutation(np.arange(1, len(regions) + 1))
+    picks = rng.choice(len(regions), size=n_rows, p=weights / weights.sum())
+    months = rng.integers(1, 13, size=n_rows)
+    return pd.DataFrame({
+        "state_name": regions["state_name"].to_numpy()[picks],
+        "affiliation_state": regions["state_name"].to_numpy()[picks],
+        "affiliation_country": regions["country_name"].to_numpy()[picks],
+        "affiliation_name": "someuniversity",
+        "citied_by": rng.negative_binomial(1, 0.1, size=n_rows),
+        "cover_date": pd.Series(months).map(lambda m: f"2023-{m:02d}-01").to_numpy(),
+        "area_km2": regions["area_km2"].to_numpy()[picks],
+    })
+
+
+def legacy_calculate_crdi(final_df, output_filename, year):
+    """The implementation calculate_crdi replaced, kept here for comparison."""
+    final_df = final_df.dropna(subset=["state_name","affiliation_country","area_km2",])
+    final_df = final_df.assign(
+        year=year,
+        month=final_df["cover_date"].str.extract(r"-(\d{2})-").astype(int)
+    )
+    paper_counts = final_df.groupby(["state_name","affiliation_country"]).size().reset_index(name="total_paper_num")
+    citied_counts = final_df.groupby(["state_name","affiliation_country"])["citied_by"].sum().reset_index(name="total_cited_num")
+    final_df = final_df.merge(paper_counts[["state_name","total_paper_num"]], on="state_name", how="left")
+    final_df = final_df.merge(citied_counts[["state_name","total_cited_num"]], on="state_name", how="left")
+    final_df["paper_num_density"] = final_df["total_paper_num"] / np.log(final_df["area_km2"] + 1)
+    final_df["citation_density"] = final_df["total_cited_num"] / np.log(final_df["area_km2"] + 1)
+    final_df["academic_index"] = final_df["total_cited_num"] / (final_df["total_paper_num"] + 1)
+    final_df["crdi_index"] = (final_df["paper_num_density"] + final_df["citation_density"] + final_df["academic_index"]) / 3
+    final_df = final_df[(final_df["state_name"] != "") & (final_df["affiliation_country"] != "")]
+    selected_columns = ["state_name", "affiliation_state", "affiliation_country", "total_paper_num","total_cited_num", "area_km2", "paper_num_density", "citation_density", "academic_index", "crdi_index","year","month"]
+    final_df = final_df[selected_columns].drop_duplicates(subset=["state_name", "affiliation_country"], keep="first")
+    final_df = final_df.sort_values(by="crdi_index", ascending=False)
+    final_df.to_csv(output_filename, index=False, sep=';', encoding='utf-8')
+    return final_df
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, nargs="+", default=[100_000, 1_000_000, 10_000_000])
+    parser.add_argument("--legacy-max-rows", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    print(f"{'rows':>12}{'states':>8}{'legacy s':>10}{'single groupby s':>18}")
+    with tempfile.TemporaryDirectory() as tmp:
+        output = Path(tmp) / "crdi.csv"
+        for n_rows in args.rows:
+            papers = synthetic_state_papers(n_rows)
+
+            legacy_time = "-"
+            if n_rows <= args.legacy_max_rows:
+                start = time.perf_counter()
+                legacy_calculate_crdi(papers, output, 2023)
+                legacy_time = f"{time.perf_counter() - start:.2f}"
+
+            start = time.perf_counter()
+            result = calculate_crdi(papers, output, 2023)
+            new_time = time.perf_counter() - start
+            print(f"{n_rows:>12}{len(result):>8}{legacy_time:>10}{new_time:>18.2f}")
+
+
+if __name__ == "__main__":
+    main()
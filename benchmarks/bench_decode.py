@@ -0,0 +1,77 @@
+"""
+Decode throughput and memory of a raw search results file (keyword_search.build_paper_json's input).
+
+    python -m benchmarks.bench_decode --papers 100000
+
+Compares, on a synthetic *_raw.json file:
+    json + dicts      json.loads into nested dicts, then the dict.get chains of entry_record (the former path)
+    loads + dicts     the same through scopus_records.loads (orjson if installed)
+    slots records     loads into Paper records (__slots__), then paper_record
+    decode_papers     scopus_records.decode_papers (msgspec Structs if installed, otherwise as above)
+
+For each: the seconds to decode and build the paper records, papers per second, the memory held by
+the decoded papers and the peak memory while decoding (tracemalloc).
+"""
+import argparse
+import gc
+import tempfile
+import time
+import tracemalloc
+import json
+from pathlib import Path
+
+from benchmarks.synthetic_corpus import generate_entries, write_raw_json
+from src import scopus_records
+from src.scopus_records import Paper, decode_papers, paper_record, entry_record, loads
+
+
+PATHS = {
+    "json + dicts": (json.loads, entry_record),
+    "loads + dicts": (loads, entry_record),
+    "slots records": (lambda data: [Paper.from_entry(entry) for entry in loads(data)], paper_record),
+    "decode_papers": (decode_papers, paper_record),
+}
+
+
+def measure(data, decode, build_record):
+    """
+    Returns (seconds, records, held bytes, peak bytes): decoding and building the records is timed
+    without tracing, then the decoding is repeated under tracemalloc for its memory.
+    """
+    gc.collect()
+    start = time.perf_counter()
+    records = [build_record(paper) for paper in decode(data)]
+    elapsed = time.perf_counter() - start
+
+    gc.collect()
+    tracemalloc.start()
+    papers = decode(data)
+    held, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del papers
+    return elapsed, records, held, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--papers", type=int, default=100_000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        raw_file = Path(tmp) / "raw.json"
+        write_raw_json(generate_entries(args.papers, 2023), raw_file)
+        data = raw_file.read_bytes()
+    print(f"{args.papers} papers, {len(data) / 2**20:.0f} MiB of JSON "
+          f"(msgspec: {scopus_records.msgspec is not None}, orjson: {scopus_records.orjson is not None})")
+    print(f"{'path':<18}{'seconds':>9}{'papers/s':>11}{'held MiB':>10}{'peak MiB':>10}")
+    reference = None
+    for name, (decode, build_record) in PATHS.items():
+        elapsed, records, held, peak = measure(data, decode, build_record)
+        # Every path must give the same paper records
+        assert reference is None or records == reference, name
+        reference = records
+        print(f"{name:<18}{elapsed:>9.2f}{args.papers / elapsed:>11.0f}{held / 2**20:>10.0f}{peak / 2**20:>10.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""
+Throughput benchmark of the fetch layer against the local mock Scopus API (benchmarks/mock_scopus_server.py).
+
+    python -m benchmarks.bench_fetch --keywords 4 --years 2022 2023 --latency 0.05 --throttle-rate 0.05
+
+Runs the batch fetch (id listing, EID fetches, affiliation matching) into a fresh paper store, then
+runs it again to check that a resumed run sends no request. Reports the wall time, the requests
+served by endpoint and status (the 429s and 503s were retried) and the highest number of requests in flight.
+"""
+import argparse
+import os
+import tempfile
+import time
+from pathlib import Path
+
+os.environ.setdefault("API_KEY", "benchmark")
+
+from benchmarks.mock_scopus_server import MockScopusServer
+from src import batch_search, quota_scheduler
+from src.quota_scheduler import QuotaScheduler
+from src.scopus_client import ScopusClient, RetryBudget, CircuitBreaker
+from src.storage.paper_store import PaperStore
+
+
+def point_at(server, keyword_search, affiliation_state_match, api_keys, quota_path, max_retries=5):
+    """
+    Sends the API calls of the two scripts to the mock server, through a scheduler of their own.
+    """
+    keyword_search.SEARCH_URL = f"{server.url}/content/search/scopus"
+    keyword_search.PAGE_DELAY = 0
+    affiliation_state_match.AFFILIATION_URL = f"{server.url}/content/affiliation"
+    clients = {}
+    def client_factory(api_key):
+        if api_key not in clients:
+            clients[api_key] = ScopusClient(api_key, max_retries=max_retries, backoff_base=0.05, backoff_cap=1.0,
+                                            retry_budget=RetryBudget(1000), breaker=CircuitBreaker(failure_threshold=50))
+        return clients[api_key]
+    quota_scheduler._SCHEDULER = QuotaScheduler(api_keys, path=quota_path, max_share=1.0, reserve=0,
+                                                client_factory=client_factory)
+    return quota_scheduler._SCHEDULER
+
+
+def run(keywords, years, max_results, server, work_dir):
+    keyword_search = batch_search.load_api_module("keyword_search")
+    affiliation_state_match = batch_search.load_api_module("affiliation_state_match")
+    point_at(server, keyword_search, affiliation_state_match, ["bench-key-1", "bench-key-2"],
+             Path(work_dir) / "api_quota.json")
+    # The state dictionary is saved to data/raw_data, under the working directory
+    (Path(work_dir) / "data" / "raw_data").mkdir(parents=True, exist_ok=True)
+    with PaperStore(Path(work_dir) / "papers.sqlite") as store:
+        start = time.perf_counter()
+        batch_search.collect_papers(keyword_search, store, keywords, years, max_results)
+        batch_search.match_affiliations(affiliation_state_match, store, keywords)
+        elapsed = time.perf_counter() - start
+        n_papers = store.conn.execute("SELECT COUNT(*) FROM papers").fetchone()[0]
+    return elapsed, n_papers
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--keywords", type=int, default=4)
+    parser.add_argument("--years", type=int, nargs=2, default=[2023, 2023], metavar=("START", "END"))
+    parser.add_argument("--max-results", type=int, default=200)
+    parser.add_argument("--papers-per-year", type=int, default=2000)
+    parser.add_argument("--latency", type=float, default=0.02)
+    parser.add_argument("--throttle-rate", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--rate-limit", type=int, default=None)
+    args = parser.parse_args()
+
+    keywords = [f"topic {i}" for i in range(args.keywords)]
+    years = list(range(args.years[0], args.years[1] + 1))
+    with tempfile.TemporaryDirectory() as tmp, MockScopusServer(
+            args.papers_per_year, latency=args.latency, throttle_rate=args.throttle_rate,
+            error_rate=args.error_rate, rate_limit=args.rate_limit) as server:
+        # The raw files and the state dictionary are relative to the working directory
+        os.chdir(tmp)
+        elapsed, n_papers = run(keywords, years, args.max_results, server, tmp)
+        first = dict(server.stats)
+        served = sum(first.values())
+        print(f"first run:   {elapsed:7.2f}s  {n_papers} papers  {served} requests "
+              f"({served / elapsed:.1f}/s)  max in flight {server.max_in_flight}")
+        for (endpoint, status), n in sorted(first.items(), key=str):
+            print(f"    {endpoint:12s}{status:5d}{n:8d}")
+
+        server.stats.clear()
+        elapsed, _ = run(keywords, years, args.max_results, server, tmp)
+        print(f"resumed run: {elapsed:7.2f}s  {sum(server.stats.values())} requests")
+
+
+if __name__ == "__main__":
+    main()
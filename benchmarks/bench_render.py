@@ -0,0 +1,123 @@
+"""
+Peak-RSS and wall-time benchmark for the word cloud / feature plot rendering.
+
+Every (mode, n_years) combination runs in a fresh interpreter so the peak RSS of one run
+does not leak into the next one:
+
+    python -m benchmarks.bench_render --years 5 50 --dpi 300
+
+Modes:
+    legacy     the previous pyplot code path (plt.figure, never closed), serial
+    agg        src.cleaning.render, serial
+    agg-pool   src.cleaning.render.render_batch with a process pool
+"""
+import argparse
+import json
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+from pathlib import Path
+import numpy as np
+import pandas as pd
+
+MODES = ["legacy", "agg", "agg-pool"]
+
+
+def synthetic_inputs(n_years, vocab_size=5000, seed=0):
+    """
+    Builds deterministic Zipf-distributed word frequencies and fake Lasso coefficients for n_years.
+    """
+    rng = np.random.default_rng(seed)
+    vocab = [f"term{i}" for i in range(vocab_size)]
+    word_freqs, coefs = [], []
+    for _ in range(n_years):
+        draws = rng.zipf(1.3, size=20000)
+        draws = draws[draws <= vocab_size] - 1
+        word_freqs.append(Counter({vocab[i]: int(c) for i, c in zip(*np.unique(draws, return_counts=True))}))
+        values = rng.normal(0, 0.1, size=30)
+        coefs.append(pd.Series(values, index=vocab[:30]).sort_values(key=abs, ascending=False))
+    return word_freqs, coefs
+
+
+def legacy_render(word_freqs, coefs, out_dir, dpi):
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+    from wordcloud import WordCloud
+
+    for idx, (word_freq, coef) in enumerate(zip(word_freqs, coefs)):
+        wordcloud = WordCloud(background_color='white').generate_from_frequencies(word_freq)
+        plt.figure(figsize=(10, 8))
+        plt.imshow(wordcloud, interpolation='bilinear')
+        plt.axis('off')
+        plt.savefig(out_dir / f"{idx}_word_cloud.png", format='png', dpi=dpi)
+
+        inverse = coef.iloc[::-1]
+        colors = ['red' if c > 0 else 'blue' for c in inverse.values]
+        plt.figure(figsize=(10, 6))
+        plt.barh(inverse.index, inverse.values, color=colors, alpha=0.7)
+        plt.savefig(out_dir / f"{idx}_features.png", format='png', dpi=dpi)
+
+
+def run_once(mode, n_years, dpi, image_format):
+    from src.cleaning.render import render_word_cloud, render_feature_coefs, render_batch
+
+    word_freqs, coefs = synthetic_inputs(n_years)
+    with tempfile.TemporaryDirectory() as tmp:
+        out_dir = Path(tmp)
+        start = time.perf_counter()
+        if mode == "legacy":
+            legacy_render(word_freqs, coefs, out_dir, dpi)
+        else:
+            jobs = []
+            for idx in range(n_years):
+                jobs.append((render_word_cloud, word_freqs[idx], out_dir / f"{idx}_word_cloud.png"))
+                jobs.append((render_feature_coefs, coefs[idx], out_dir / f"{idx}_features.png"))
+            render_batch(jobs, dpi=dpi, image_format=image_format, max_workers=None if mode == "agg-pool" else 1)
+        elapsed = time.perf_counter() - start
+        output_bytes = sum(f.stat().st_size for f in out_dir.iterdir())
+
+    # ru_maxrss is in kilobytes on Linux; RUSAGE_CHILDREN is the largest pool worker
+    self_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    child_rss = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024
+    return {
+        "mode": mode,
+        "years": n_years,
+        "seconds": round(elapsed, 2),
+        "peak_rss_mb": round(self_rss, 1),
+        "peak_worker_rss_mb": round(child_rss, 1),
+        "output_mb": round(output_bytes / 1024 ** 2, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--years", type=int, nargs="+", default=[5, 50])
+    parser.add_argument("--modes", nargs="+", default=MODES, choices=MODES)
+    parser.add_argument("--dpi", type=int, default=300)
+    parser.add_argument("--format", default="png")
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        print(json.dumps(run_once(args.modes[0], args.years[0], args.dpi, args.format)))
+        return
+
+    print(f"{'mode':<10}{'years':>6}{'seconds':>10}{'peak RSS MB':>13}{'worker RSS MB':>15}{'output MB':>11}")
+    for n_years in args.years:
+        for mode in args.modes:
+            out = subprocess.run(
+                [sys.executable, "-m", "benchmarks.bench_render", "--worker", "--modes", mode,
+                 "--years", str(n_years), "--dpi", str(args.dpi), "--format", args.format],
+                capture_output=True, text=True, check=True
+            )
+            r = json.loads(out.stdout.strip().splitlines()[-1])
+            print(f"{r['mode']:<10}{r['years']:>6}{r['seconds']:>10}{r['peak_rss_mb']:>13}"
+                  f"{r['peak_worker_rss_mb']:>15}{r['output_mb']:>11}")
+
+
+if __name__ == "__main__":
+    main()
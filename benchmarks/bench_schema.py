@@ -0,0 +1,47 @@
+"""
+Memory of a paper-level frame as loaded (object strings) and with the paper schema (src/cleaning/schema.py).
+
+    python -m benchmarks.bench_schema --rows 1000000
+
+Reports the deep memory usage of each column and the calculate_crdi time on both frames.
+"""
+import argparse
+import tempfile
+import time
+from pathlib import Path
+
+from benchmarks.bench_crdi import synthetic_state_papers
+from src.cleaning.clean_data import calculate_crdi
+from src.cleaning.schema import apply_paper_schema
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    papers = synthetic_state_papers(args.rows)
+    # As read from the paper records: citations are strings there
+    papers["citied_by"] = papers["citied_by"].astype(str)
+    start = time.perf_counter()
+    typed = apply_paper_schema(papers)
+    cast_time = time.perf_counter() - start
+
+    before = papers.memory_usage(deep=True, index=False)
+    after = typed.memory_usage(deep=True, index=False)
+    print(f"{'column':<22}{'object MiB':>12}{'typed MiB':>12}  dtype")
+    for column in papers.columns:
+        print(f"{column:<22}{before[column] / 2**20:>12.1f}{after[column] / 2**20:>12.1f}  {typed[column].dtype}")
+    print(f"{'total':<22}{before.sum() / 2**20:>12.1f}{after.sum() / 2**20:>12.1f}  "
+          f"({before.sum() / after.sum():.1f}x smaller, cast in {cast_time:.2f}s)")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        output = Path(tmp) / "crdi.csv"
+        for name, frame in (("object", papers), ("typed", typed)):
+            start = time.perf_counter()
+            calculate_crdi(frame, output, 2023)
+            print(f"calculate_crdi on the {name} frame: {time.perf_counter() - start:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
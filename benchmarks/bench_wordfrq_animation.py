@@ -0,0 +1,118 @@
+"""
+Frame-count and encode-time benchmark for the dynamic word frequency animation.
+
+    python -m benchmarks.bench_wordfrq_animation --years 5 50
+
+Compares the previous path (save every frame as a PNG, read it back with imageio, mimsave)
+with frames rendered into numpy buffers and streamed into the writer, and with the
+interactive Plotly animation built from the same top-k data.
+"""
+import argparse
+import tempfile
+import time
+from collections import Counter
+from pathlib import Path
+import imageio.v2 as imageio
+import numpy as np
+from src.cleaning.visualize_words_yr import (
+    top_words_by_year, frequency_axis_limit, render_frame, build_word_frq_animation, FRAME_DURATION_MS
+)
+
+
+def synthetic_word_freq_year(n_years, vocab_size=20000, seed=0):
+    rng = np.random.default_rng(seed)
+    word_freq_year = {}
+    for year in range(2000, 2000 + n_years):
+        draws = rng.zipf(1.3, size=50000)
+        draws = draws[draws <= vocab_size]
+        words, counts = np.unique(draws, return_counts=True)
+        word_freq_year[year] = Counter({f"term{w}": int(c) for w, c in zip(words, counts)})
+    return word_freq_year
+
+
+def legacy_gif(all_data, out_dir):
+    """The disk round trip that generate_word_frq_yearlygif used before."""
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+
+    max_freq = frequency_axis_limit(all_data)
+    filenames = []
+    for idx, (year, words, freqs) in enumerate(all_data):
+        plt.figure(figsize=(12, 7))
+        bars = plt.barh(words, freqs, color='skyblue')
+        plt.title(f'Top 10 Keywords in {year}', fontsize=14)
+        plt.xlabel('Frequency', fontsize=12)
+        plt.ylabel('Keywords', fontsize=12)
+        plt.gca().invert_yaxis()
+        plt.xlim(0, max_freq)
+        for bar in bars:
+            plt.text(bar.get_width(), bar.get_y() + bar.get_height()/2, f' {bar.get_width()}', va='center', ha='left')
+        plt.tight_layout()
+        filename = out_dir / f"{idx:03d}.png"
+        plt.savefig(filename, bbox_inches='tight')
+        plt.close()
+        filenames.append(filename)
+    images = [imageio.imread(filename) for filename in filenames]
+    imageio.mimsave(out_dir / "legacy.gif", images, duration=FRAME_DURATION_MS, loop=0)
+    return out_dir / "legacy.gif"
+
+
+def encode(frames, output_filename):
+    if output_filename.suffix == ".mp4":
+        writer = imageio.get_writer(output_filename, mode="I", fps=1000 / FRAME_DURATION_MS)
+    else:
+        writer = imageio.get_writer(output_filename, mode="I", duration=FRAME_DURATION_MS, loop=0)
+    with writer:
+        for frame in frames:
+            writer.append_data(frame)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--years", type=int, nargs="+", default=[5, 50])
+    parser.add_argument("--formats", nargs="+", default=["gif", "webp", "mp4"])
+    args = parser.parse_args()
+
+    print(f"{'path':<16}{'frames':>7}{'render s':>10}{'encode s':>10}{'total s':>9}{'size KB':>9}{'temp files':>11}")
+    for n_years in args.years:
+        all_data = top_words_by_year(synthetic_word_freq_year(n_years))
+        with tempfile.TemporaryDirectory() as tmp:
+            out_dir = Path(tmp)
+
+            start = time.perf_counter()
+            output = legacy_gif(all_data, out_dir)
+            total = time.perf_counter() - start
+            leftovers = len(list(out_dir.glob("*.png")))
+            print(f"{'legacy gif':<16}{n_years:>7}{'-':>10}{'-':>10}{total:>9.2f}"
+                  f"{output.stat().st_size / 1024:>9.0f}{leftovers:>11}")
+
+            max_freq = frequency_axis_limit(all_data)
+            start = time.perf_counter()
+            frames = [render_frame(year, words, freqs, max_freq) for year, words, freqs in all_data]
+            render_time = time.perf_counter() - start
+            for image_format in args.formats:
+                output = out_dir / f"stream.{image_format}"
+                start = time.perf_counter()
+                try:
+                    encode(frames, output)
+                except ValueError as e:
+                    # mp4 needs the optional imageio[ffmpeg] backend
+                    print(f"{'stream ' + image_format:<16} skipped: {str(e).splitlines()[0]}")
+                    continue
+                encode_time = time.perf_counter() - start
+                print(f"{'stream ' + image_format:<16}{len(frames):>7}{render_time:>10.2f}{encode_time:>10.2f}"
+                      f"{render_time + encode_time:>9.2f}{output.stat().st_size / 1024:>9.0f}{0:>11}")
+
+            start = time.perf_counter()
+            fig = build_word_frq_animation(all_data)
+            build_time = time.perf_counter() - start
+            start = time.perf_counter()
+            fig.write_json(out_dir / "animation.json")
+            write_time = time.perf_counter() - start
+            print(f"{'plotly json':<16}{len(fig.frames):>7}{build_time:>10.2f}{write_time:>10.2f}"
+                  f"{build_time + write_time:>9.2f}{(out_dir / 'animation.json').stat().st_size / 1024:>9.0f}{0:>11}")
+
+
+if __name__ == "__main__":
+    main()
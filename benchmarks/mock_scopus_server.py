@@ -0,0 +1,304 @@
+"""
+Local stand-in for the Scopus search and affiliation APIs, to test and benchmark the fetch layer offline.
+
+    python -m benchmarks.mock_scopus_server --port 8765 --latency 0.05 --throttle-rate 0.05 --quota 2000
+    SCOPUS_BASE_URL=http://127.0.0.1:8765 SCOPUS_PAGE_DELAY=0 API_KEYS=k1,k2 \\
+        python -m src.batch_search "machine learning" --skip-cleaning
+
+Implements what keyword_search.py and affiliation_state_match.py use:
+    GET /content/search/scopus                      query (TITLE-ABS-KEY(...) AND PUBYEAR = y, or EID(..) OR ..),
+                                                    cursor pagination, count, sort=-citedby-count,
+                                                    view=STANDARD (200 per page, field=) or COMPLETE (25 per page)
+    GET /content/affiliation/affiliation_id/{afid}  the state of an affiliation
+
+The papers come from benchmarks/synthetic_corpus.py: every year has papers_per_year papers and a
+keyword matches a deterministic share of them, so different keywords share papers.
+
+Injected trouble:
+    latency / jitter   seconds added to every response
+    throttle_rate      share of requests answered 429 with Retry-After (the per-second throttle)
+    error_rate         share of requests answered 503
+    rate_limit         requests per second per key; more get a 429 with Retry-After
+    quota              requests per key and endpoint; then 429 with X-RateLimit-Remaining: 0 until the reset
+Every response carries X-RateLimit-Limit / -Remaining / -Reset when a quota is set.
+"""
+import argparse
+import base64
+import json
+import random
+import re
+import threading
+import time
+import zlib
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+import numpy as np
+from benchmarks.synthetic_corpus import generate_entries, build_affiliations, build_vocabulary
+
+# Page sizes Scopus allows per view
+MAX_COUNT = {"STANDARD": 200, "COMPLETE": 25}
+STANDARD_FIELDS = [
+    "eid", "dc:identifier", "dc:title", "dc:creator", "prism:publicationName", "prism:coverDate",
+    "prism:doi", "citedby-count", "affiliation", "subtype", "subtypeDescription",
+]
+YEAR_PATTERN = re.compile(r"PUBYEAR\s*=\s*(\d{4})")
+KEYWORD_PATTERN = re.compile(r"TITLE-ABS-KEY\((.*?)\)")
+EID_PATTERN = re.compile(r"EID\(([^)]+)\)")
+
+
+def encode_cursor(offset):
+    return base64.urlsafe_b64encode(f"offset:{offset}".encode("ascii")).decode("ascii")
+
+
+def decode_cursor(cursor):
+    if cursor in (None, "*"):
+        return 0
+    return int(base64.urlsafe_b64decode(cursor.encode("ascii")).decode("ascii").split(":")[1])
+
+
+class MockScopusServer:
+    """
+    The mock API on a local port (0 picks a free one). Use as a context manager, or start() / close().
+    `stats` counts the responses by (endpoint, status); `max_in_flight` is the highest number of
+    requests served at the same time.
+    """
+
+    def __init__(self, papers_per_year=2000, match_share=0.25, latency=0.0, jitter=0.0, throttle_rate=0.0,
+                 error_rate=0.0, retry_after=1, rate_limit=None, quota=None, quota_reset=3600, seed=0,
+                 host="127.0.0.1", port=0):
+        self.papers_per_year = papers_per_year
+        self.match_share = match_share
+        self.latency = latency
+        self.jitter = jitter
+        self.throttle_rate = throttle_rate
+        self.error_rate = error_rate
+        self.retry_after = retry_after
+        self.rate_limit = rate_limit
+        self.quota = quota
+        self.quota_reset = quota_reset
+        self.seed = seed
+        self.stats = Counter()
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._corpus_lock = threading.Lock()
+        self._corpus = {}        # year -> entries, most cited first
+        self._by_eid = {}
+        self._matches = {}       # (keyword, year) -> entries
+        self._used = Counter()   # (api key, endpoint) -> requests
+        self._recent = {}        # api key -> request times of the last second
+        self._started = time.time()
+        n_affiliations = max(100, papers_per_year // 20)
+        self.affiliations = build_affiliations(n_affiliations, seed)
+        self._states = dict(zip(self.affiliations["afid"], self.affiliations["state"]))
+        self._vocabulary = build_vocabulary(seed=seed)
+        self._server = ThreadingHTTPServer((host, port), self._handler_class())
+        self.url = f"http://{host}:{self._server.server_port}"
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def start(self):
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def close(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    # The corpus
+    def papers(self, year):
+        with self._corpus_lock:
+            if year not in self._corpus:
+                entries = list(generate_entries(self.papers_per_year, year, self.seed, affiliations=self.affiliations,
+                                                vocabulary=self._vocabulary))
+                entries.sort(key=lambda entry: -int(entry["citedby-count"]))
+                self._corpus[year] = entries
+                self._by_eid.update((entry["eid"], entry) for entry in entries)
+            return self._corpus[year]
+
+    def search_results(self, keyword, year):
+        """
+        The entries a keyword search of a year returns, most cited first.
+        """
+        key = (keyword.lower(), year)
+        entries = self.papers(year)
+        with self._corpus_lock:
+            if key not in self._matches:
+                rng = np.random.default_rng([zlib.crc32(key[0].encode("utf-8")), year])
+                selected = rng.random(len(entries)) < self.match_share
+                self._matches[key] = [entry for entry, keep in zip(entries, selected) if keep]
+            return self._matches[key]
+
+    def _query_entries(self, query):
+        eids = EID_PATTERN.findall(query)
+        if eids:
+            # An EID query can name papers of any year: make sure they are generated
+            for year in {int(eid[7:11]) for eid in eids if eid[7:11].isdigit()}:
+                self.papers(year)
+            return [self._by_eid[eid] for eid in eids if eid in self._by_eid]
+        year = YEAR_PATTERN.search(query)
+        keyword = KEYWORD_PATTERN.search(query)
+        if not year or not keyword:
+            return None
+        return self.search_results(keyword.group(1), int(year.group(1)))
+
+    # Throttling and quotas
+    def _limit(self, api_key, endpoint):
+        """
+        Returns (status, headers) of a refused request, or (None, headers) for a served one.
+        """
+        headers = {}
+        now = time.time()
+        with self._lock:
+            if self.quota is not None:
+                reset = int(self._started + self.quota_reset)
+                remaining = self.quota - self._used[(api_key, endpoint)]
+                headers = {"X-RateLimit-Limit": str(self.quota), "X-RateLimit-Reset": str(reset)}
+                if remaining <= 0:
+                    headers["X-RateLimit-Remaining"] = "0"
+                    return 429, headers
+                self._used[(api_key, endpoint)] += 1
+                headers["X-RateLimit-Remaining"] = str(remaining - 1)
+            if self.rate_limit is not None:
+                recent = [t for t in self._recent.get(api_key, []) if now - t < 1.0]
+                if len(recent) >= self.rate_limit:
+                    self._recent[api_key] = recent
+                    return 429, {**headers, "Retry-After": str(self.retry_after)}
+                recent.append(now)
+                self._recent[api_key] = recent
+            draw = self._rng.random()
+        if draw < self.throttle_rate:
+            return 429, {**headers, "Retry-After": str(self.retry_after)}
+        if draw < self.throttle_rate + self.error_rate:
+            return 503, headers
+        return None, headers
+
+    # The endpoints
+    def search(self, params):
+        query = params.get("query", "")
+        view = params.get("view", "STANDARD").upper()
+        try:
+            count = int(params.get("count", 25))
+            offset = decode_cursor(params.get("cursor"))
+        except (ValueError, IndexError):
+            return 400, {"service-error": {"status": {"statusText": "Invalid cursor or count"}}}
+        if view not in MAX_COUNT or count > MAX_COUNT[view]:
+            return 400, {"service-error": {"status": {"statusText": "Exceeds the maximum number allowed for the service level"}}}
+        entries = self._query_entries(query)
+        if entries is None:
+            return 400, {"service-error": {"status": {"statusText": f"Error translating query {query!r}"}}}
+
+        page = entries[offset:offset + count]
+        if view == "STANDARD":
+            fields = params["field"].split(",") if params.get("field") else STANDARD_FIELDS
+            fields = [field for field in fields if field in STANDARD_FIELDS]
+            page = [{field: entry[field] for field in fields if field in entry} for entry in page]
+        # Like Scopus, an exhausted result set answers a single entry holding an error
+        body_entries = page or [{"@_fa": "true", "error": "Result set was empty"}]
+        return 200, {"search-results": {
+            "opensearch:totalResults": str(len(entries)),
+            "opensearch:startIndex": str(offset),
+            "opensearch:itemsPerPage": str(len(page)),
+            "cursor": {"@current": params.get("cursor", "*"), "@next": encode_cursor(offset + len(page))},
+            "entry": body_entries,
+        }}
+
+    def affiliation(self, afid):
+        if afid not in self._states:
+            return 404, {"service-error": {"status": {"statusText": "The resource specified cannot be found."}}}
+        address = {}
+        if self._states[afid] != "NA":
+            address["state"] = self._states[afid]
+        return 200, {"affiliation-retrieval-response": {"institution-profile": {"address": address}}}
+
+    def _handler_class(self):
+        mock = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                with mock._lock:
+                    mock.in_flight += 1
+                    mock.max_in_flight = max(mock.max_in_flight, mock.in_flight)
+                try:
+                    self._serve()
+                finally:
+                    with mock._lock:
+                        mock.in_flight -= 1
+
+            def _serve(self):
+                url = urlparse(self.path)
+                params = {key: values[0] for key, values in parse_qs(url.query).items()}
+                if url.path.startswith("/content/affiliation/affiliation_id/"):
+                    endpoint = "affiliation"
+                elif url.path == "/content/search/scopus":
+                    endpoint = "search"
+                else:
+                    return self._send(endpoint=None, status=404, headers={}, body={"error": "Unknown resource"})
+                if mock.latency or mock.jitter:
+                    time.sleep(mock.latency + random.uniform(0, mock.jitter))
+                api_key = self.headers.get("X-ELS-APIKey") or params.get("apiKey")
+                if not api_key:
+                    return self._send(endpoint, 401, {}, {"service-error": {"status": {"statusText": "Invalid API Key"}}})
+                status, headers = mock._limit(api_key, endpoint)
+                if status is not None:
+                    return self._send(endpoint, status, headers, {"service-error": {"status": {"statusCode": str(status)}}})
+                if endpoint == "search":
+                    status, body = mock.search(params)
+                else:
+                    status, body = mock.affiliation(url.path.rsplit("/", 1)[-1])
+                self._send(endpoint, status, headers, body)
+
+            def _send(self, endpoint, status, headers, body):
+                with mock._lock:
+                    mock.stats[(endpoint, status)] += 1
+                payload = json.dumps(body).encode("utf-8")
+                self.send_response(status)
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--papers-per-year", type=int, default=2000)
+    parser.add_argument("--match-share", type=float, default=0.25)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--throttle-rate", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--rate-limit", type=int, default=None, help="Requests per second per key")
+    parser.add_argument("--quota", type=int, default=None, help="Requests per key and endpoint")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    server = MockScopusServer(args.papers_per_year, args.match_share, args.latency, args.jitter, args.throttle_rate,
+                              args.error_rate, rate_limit=args.rate_limit, quota=args.quota, seed=args.seed,
+                              port=args.port)
+    print(f"🧪 Mock Scopus API on {server.url} (Ctrl+C to stop)")
+    try:
+        server._server.serve_forever()
+    except KeyboardInterrupt:
+        print(dict(server.stats))
+    finally:
+        server._server.server_close()
+
+
+if __name__ == "__main__":
+    main()
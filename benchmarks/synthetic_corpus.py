@@ -0,0 +1,221 @@
+"""
+Deterministic generator of raw Scopus-shaped search results, to run the pipeline at production scale.
+
+    python -m benchmarks.synthetic_corpus --papers 1000000 --years 2020 2024 --output data/synthetic
+
+writes {output}/raw_api_data/{keyword}_{year}_raw.json (the format of keyword_search.save_results) and
+{output}/afid_state_dataset.json (the format of affiliation_state_match.save_state_dict). The same seed
+always gives the same corpus. The files are streamed chunk by chunk, so 10M papers do not need 10M
+entries in memory.
+
+What is realistic about it:
+    - citations are heavy tailed (a discrete lognormal: most papers have a few, some thousands)
+    - affiliations are drawn from the states of code_country.csv, a few of them producing most papers
+      (Zipf over a random ranking), and about 15% have no state ("NA"), as the affiliation API returns;
+      their city is then sometimes the name of a region of provinces_area.json, as for capitals
+    - titles and abstracts use a Zipfian vocabulary (s ~ 1.07), with the search keyword in the text
+    - 1 to 50 authors per paper, each with one or two affiliations
+"""
+import argparse
+import json
+from pathlib import Path
+import numpy as np
+import pandas as pd
+
+CODE_COUNTRY_PATH = "data/raw_data/code_country.csv"
+PROVINCES_AREA_PATH = "data/raw_data/provinces_area.json"
+DEFAULT_KEYWORD = "synthetic research"
+CHUNK_SIZE = 10_000
+VOCAB_SIZE = 20_000
+ZIPF_EXPONENT = 1.07
+NA_STATE_SHARE = 0.15
+SYLLABLES = ["ba", "co", "de", "fi", "gu", "ha", "jo", "ki", "lu", "ma", "ne", "po", "qui", "ra", "si", "to",
+             "un", "ve", "wa", "xi", "yo", "ze", "tion", "ing", "al", "ic", "er", "ous", "ment", "ity"]
+
+
+def build_vocabulary(vocab_size=VOCAB_SIZE, seed=0):
+    """
+    Returns (words, probabilities): distinct made-up words and their Zipfian frequencies by rank.
+    """
+    rng = np.random.default_rng(seed)
+    words = []
+    seen = set()
+    while len(words) < vocab_size:
+        word = "".join(rng.choice(SYLLABLES, size=rng.integers(2, 5)))
+        if word not in seen:
+            seen.add(word)
+            words.append(word)
+    weights = 1.0 / np.arange(1, vocab_size + 1) ** ZIPF_EXPONENT
+    return np.array(words, dtype=object), weights / weights.sum()
+
+
+def build_affiliations(n_affiliations, seed=0, code_path=CODE_COUNTRY_PATH, area_path=PROVINCES_AREA_PATH):
+    """
+    Returns a dataframe of n_affiliations affiliations (afid, affilname, affiliation-city,
+    affiliation-country, state, weight), the state being a code_country.csv code or "NA".
+    """
+    rng = np.random.default_rng(seed)
+    codes = pd.read_csv(code_path).dropna(subset=["state_code", "country_name"]).reset_index(drop=True)
+    with open(area_path, "r", encoding="utf-8") as f:
+        region_names = [region["name"] for region in json.load(f) if region.get("name")]
+
+    # A few states host most institutions: weight ~ 1 / rank over a random ranking of the states
+    state_weights = 1.0 / rng.permutation(np.arange(1, len(codes) + 1))
+    picks = rng.choice(len(codes), size=n_affiliations, p=state_weights / state_weights.sum())
+    state = codes["state_code"].to_numpy(dtype=object)[picks]
+    city = codes["state_name"].to_numpy(dtype=object)[picks].copy()
+    no_state = rng.random(n_affiliations) < NA_STATE_SHARE
+    state[no_state] = "NA"
+    # Without a state, the city is sometimes enough to place the institution (capital regions)
+    capital = no_state & (rng.random(n_affiliations) < 0.5)
+    city[capital] = np.array(region_names, dtype=object)[rng.integers(0, len(region_names), capital.sum())]
+
+    afids = np.arange(60_000_000, 60_000_000 + n_affiliations).astype(str)
+    return pd.DataFrame({
+        "afid": afids,
+        "affilname": [f"Institute {i} of {c}" for i, c in zip(range(n_affiliations), city)],
+        "affiliation-city": city,
+        "affiliation-country": codes["country_name"].to_numpy(dtype=object)[picks],
+        "state": state,
+        # Paper output of institutions is skewed too
+        "weight": rng.pareto(1.2, size=n_affiliations) + 1,
+    })
+
+
+def _texts(rng, words, probabilities, lengths, keyword_words):
+    draws = rng.choice(len(words), size=int(lengths.sum()), p=probabilities)
+    tokens = words[draws]
+    texts = []
+    start = 0
+    for length in lengths:
+        text = tokens[start:start + length].tolist()
+        start += length
+        # The search keyword appears in most texts, as it would in TITLE-ABS-KEY results
+        if rng.random() < 0.8:
+            text.insert(int(rng.integers(0, len(text) + 1)), keyword_words)
+        texts.append(" ".join(text))
+    return texts
+
+
+def generate_entries(n_papers, year, seed=0, keyword=DEFAULT_KEYWORD, n_affiliations=None,
+                     chunk_size=CHUNK_SIZE, affiliations=None, vocabulary=None):
+    """
+    Yields n_papers raw Scopus search entries (COMPLETE view) of one year, chunk by chunk.
+    """
+    if n_affiliations is None:
+        n_affiliations = int(min(200_000, max(100, n_papers // 20)))
+    if affiliations is None:
+        affiliations = build_affiliations(n_affiliations, seed)
+    words, probabilities = vocabulary if vocabulary is not None else build_vocabulary(seed=seed)
+    affiliation_p = affiliations["weight"].to_numpy() / affiliations["weight"].sum()
+    affiliation_rows = affiliations[["afid", "affilname", "affiliation-city", "affiliation-country"]].to_dict("records")
+    rng = np.random.default_rng([seed, year])
+
+    for chunk_start in range(0, n_papers, chunk_size):
+        n = min(chunk_size, n_papers - chunk_start)
+        citations = np.floor(np.exp(rng.normal(1.2, 1.5, size=n))).astype(int) - 1
+        citations = np.clip(citations, 0, None)
+        months = rng.integers(1, 13, size=n)
+        days = rng.integers(1, 29, size=n)
+        n_authors = np.clip(rng.poisson(3.0, size=n) + 1, 1, 50)
+        # Every author has one affiliation, one in five a second one
+        n_afids = n_authors + rng.binomial(n_authors, 0.2)
+        afid_draws = rng.choice(len(affiliation_rows), size=int(n_afids.sum()), p=affiliation_p)
+        titles = _texts(rng, words, probabilities, rng.integers(6, 16, size=n), keyword)
+        abstracts = _texts(rng, words, probabilities, rng.integers(80, 220, size=n), keyword)
+        keywords = _texts(rng, words, probabilities, rng.integers(3, 7, size=n), keyword)
+
+        cursor = 0
+        for i in range(n):
+            paper_number = chunk_start + i
+            picks = afid_draws[cursor:cursor + n_afids[i]]
+            cursor += n_afids[i]
+            authors = []
+            extra = n_afids[i] - n_authors[i]
+            for seq in range(n_authors[i]):
+                afids = [picks[seq]] + ([picks[n_authors[i] + seq]] if seq < extra else [])
+                author_id = f"5{(paper_number * 7 + seq * 104729) % 90_000_000:09d}"
+                authors.append({
+                    "@seq": str(seq + 1),
+                    "authid": author_id,
+                    "authname": f"Author {author_id[-5:]}",
+                    "afid": [{"$": affiliation_rows[pick]["afid"]} for pick in afids],
+                })
+            listed = list(dict.fromkeys(picks.tolist()))
+            yield {
+                "eid": f"2-s2.0-{year}{paper_number:010d}",
+                "dc:identifier": f"SCOPUS_ID:{year}{paper_number:010d}",
+                "dc:title": titles[i],
+                "dc:creator": authors[0]["authname"],
+                "prism:publicationName": f"Journal of {words[paper_number % 500].capitalize()}",
+                "prism:coverDate": f"{year}-{months[i]:02d}-{days[i]:02d}",
+                "prism:doi": f"10.5555/synthetic.{year}.{paper_number}",
+                "citedby-count": str(citations[i]),
+                "dc:description": abstracts[i],
+                "authkeywords": " | ".join(keywords[i].split()[:5]),
+                "affiliation": [affiliation_rows[pick] for pick in listed],
+                "author": authors,
+            }
+
+
+def afid_states(affiliations):
+    """
+    Returns the afid -> state dictionary of the affiliations, as built by affiliation_state_match.py.
+    """
+    return dict(zip(affiliations["afid"], affiliations["state"]))
+
+
+def write_raw_json(entries, filename):
+    """
+    Streams entries into a JSON array file. Returns the number of entries written.
+    """
+    filename = Path(filename)
+    filename.parent.mkdir(parents=True, exist_ok=True)
+    n = 0
+    with open(filename, "w", encoding="utf-8") as f:
+        f.write("[")
+        for entry in entries:
+            f.write(",\n" if n else "\n")
+            f.write(json.dumps(entry, ensure_ascii=False))
+            n += 1
+        f.write("\n]")
+    return n
+
+
+def write_corpus(output_dir, n_papers, years, keyword=DEFAULT_KEYWORD, seed=0):
+    """
+    Writes a synthetic corpus of n_papers per year, in the layout of data/raw_data.
+
+    Returns:
+        {year: raw file path}
+    """
+    output_dir = Path(output_dir)
+    n_affiliations = int(min(200_000, max(100, n_papers // 20)))
+    affiliations = build_affiliations(n_affiliations, seed)
+    vocabulary = build_vocabulary(seed=seed)
+    keyword_lower = keyword.lower().replace(" ", "")
+    files = {}
+    for year in years:
+        filename = output_dir / "raw_api_data" / f"{keyword_lower}_{year}_raw.json"
+        write_raw_json(generate_entries(n_papers, year, seed, keyword, affiliations=affiliations,
+                                        vocabulary=vocabulary), filename)
+        files[year] = filename
+        print(f"📂 {n_papers} synthetic papers saved to {filename}")
+    with open(output_dir / "afid_state_dataset.json", "w", encoding="utf-8") as f:
+        json.dump(afid_states(affiliations), f, indent=4)
+    return files
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--papers", type=int, default=1000, help="Papers per year")
+    parser.add_argument("--years", type=int, nargs=2, default=[2023, 2023], metavar=("START", "END"))
+    parser.add_argument("--keyword", default=DEFAULT_KEYWORD)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default="data/synthetic")
+    args = parser.parse_args()
+    write_corpus(args.output, args.papers, range(args.years[0], args.years[1] + 1), args.keyword, args.seed)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+"""
+Benchmarks of the pipeline stages on a synthetic corpus (benchmarks/synthetic_corpus.py), with
+regression thresholds. Needs pytest-benchmark (skipped without it):
+
+    pip install pytest-benchmark
+    BENCH_PAPERS=100000 python -m pytest benchmarks/test_pipeline_benchmarks.py --benchmark-autosave
+
+Each stage must stay under its THRESHOLDS budget (seconds per 1000 papers, times BENCH_PAPERS / 1000,
+times BENCH_THRESHOLD_FACTOR for slower machines). To compare against a saved run instead:
+
+    python -m pytest benchmarks/test_pipeline_benchmarks.py --benchmark-compare --benchmark-compare-fail=mean:20%
+"""
+import json
+import os
+import pytest
+
+pytest.importorskip("pytest_benchmark")
+
+import plotly.graph_objects as go
+from benchmarks.synthetic_corpus import generate_entries, build_affiliations, build_vocabulary, afid_states, write_raw_json
+from src.batch_search import load_api_module
+
+BENCH_PAPERS = int(os.environ.get("BENCH_PAPERS", "1000"))
+THRESHOLD_FACTOR = float(os.environ.get("BENCH_THRESHOLD_FACTOR", "1"))
+YEAR = 2023
+KEYWORD = "synthetic research"
+# Seconds per 1000 papers each stage may take (a few times what it takes on a laptop)
+THRESHOLDS = {
+    "build_paper_json": 0.5,
+    "building_state_df": 0.5,
+    "calculate_crdi": 0.2,
+    "building_wordfrq_dict": 2.0,
+    "get_feature": 40.0,
+    "main_heatmap": 2.0,
+}
+# Fixed costs (e.g. the first plot) that do not grow with the corpus
+BASE_SECONDS = 1.0
+# fit_top_features builds a dense papers x title n-grams matrix (about 11 GiB at 10k papers),
+# so get_feature is only benchmarked up to this size
+GET_FEATURE_MAX_PAPERS = 5000
+
+
+def check_threshold(benchmark, name):
+    budget = (BASE_SECONDS + THRESHOLDS[name] * BENCH_PAPERS / 1000) * THRESHOLD_FACTOR
+    mean = benchmark.stats.stats.mean
+    assert mean < budget, f"{name} took {mean:.2f}s on {BENCH_PAPERS} papers, over its {budget:.2f}s budget"
+
+
+@pytest.fixture(scope="module")
+def api_modules():
+    os.environ.setdefault("API_KEY", "benchmark")
+    return load_api_module("keyword_search"), load_api_module("affiliation_state_match")
+
+
+@pytest.fixture(scope="module")
+def corpus(tmp_path_factory, api_modules):
+    """
+    The raw file and the paper records with their states (what the cleaning step reads).
+    """
+    keyword_search, affiliation_state_match = api_modules
+    tmp = tmp_path_factory.mktemp("corpus")
+    affiliations = build_affiliations(int(min(200_000, max(100, BENCH_PAPERS // 20))))
+    raw_file = tmp / "raw.json"
+    write_raw_json(generate_entries(BENCH_PAPERS, YEAR, affiliations=affiliations, vocabulary=build_vocabulary()),
+                   raw_file)
+    paper_file = tmp / "paper.json"
+    keyword_search.build_paper_json(raw_file, paper_file)
+    with open(paper_file, "r", encoding="utf-8") as f:
+        records = affiliation_state_match.attach_states(json.load(f), afid_states(affiliations))
+    return {"tmp": tmp, "raw_file": raw_file, "records": records}
+
+
+@pytest.fixture(scope="module")
+def state_df(corpus):
+    from src.cleaning.clean_data import building_state_df
+    return building_state_df(corpus["records"], corpus["tmp"] / "state_paper.csv")
+
+
+def test_build_paper_json(benchmark, corpus, api_modules):
+    keyword_search, _ = api_modules
+    output = corpus["tmp"] / "paper_bench.json"
+    benchmark.pedantic(keyword_search.build_paper_json, args=(corpus["raw_file"], output), rounds=3)
+    check_threshold(benchmark, "build_paper_json")
+
+
+def test_building_state_df(benchmark, corpus):
+    from src.cleaning.clean_data import building_state_df
+    result = benchmark.pedantic(building_state_df, args=(corpus["records"], corpus["tmp"] / "state_bench.csv"), rounds=3)
+    # Most synthetic affiliations are placed on the map, as real ones are
+    assert result["state_name"].notna().mean() > 0.5
+    check_threshold(benchmark, "building_state_df")
+
+
+def test_calculate_crdi(benchmark, corpus, state_df):
+    from src.cleaning.clean_data import calculate_crdi
+    result = benchmark.pedantic(calculate_crdi, args=(state_df, corpus["tmp"] / "crdi.csv", YEAR), rounds=3)
+    assert len(result) > 0
+    check_threshold(benchmark, "calculate_crdi")
+
+
+def test_building_wordfrq_dict(benchmark, corpus):
+    from src.cleaning.clean_data import building_wordfrq_dict
+    word_freq = benchmark.pedantic(building_wordfrq_dict, args=(corpus["records"],),
+                                   kwargs={"keywords": KEYWORD.replace(" ", "")}, rounds=3)
+    assert len(word_freq) > 100
+    check_threshold(benchmark, "building_wordfrq_dict")
+
+
+@pytest.mark.skipif(BENCH_PAPERS > GET_FEATURE_MAX_PAPERS, reason="get_feature's dense feature matrix does not fit in memory")
+def test_get_feature(benchmark, corpus):
+    from src.cleaning.feature_selecting import get_feature
+    benchmark.pedantic(get_feature, args=(corpus["records"], corpus["tmp"] / "features.png"),
+                       kwargs={"dpi": 100}, rounds=1)
+    check_threshold(benchmark, "get_feature")
+
+
+def test_main_heatmap(benchmark, corpus, state_df, monkeypatch):
+    from src.cleaning.clean_data import calculate_crdi
+    import src.visualization.heatmap as heatmap
+
+    crdi_df = calculate_crdi(state_df, corpus["tmp"] / "crdi_map.csv", YEAR)
+    # One square per region stands in for the provinces GeoJSON, which is not in the repository
+    geojson_data = {"type": "FeatureCollection", "features": [
+        {"type": "Feature", "properties": {"name": name, "clean_name": name},
+         "geometry": {"type": "Polygon", "coordinates": [[[i % 360 - 180, i // 360 - 80], [i % 360 - 179, i // 360 - 80],
+                                                          [i % 360 - 179, i // 360 - 79], [i % 360 - 180, i // 360 - 80]]]}}
+        for i, name in enumerate(crdi_df["state_name"])
+    ]}
+    monkeypatch.setattr(heatmap, "load_csv", lambda keywords, year: crdi_df.copy())
+    monkeypatch.setattr(heatmap, "load_crdi_summary", lambda keywords: None)
+    monkeypatch.setattr(heatmap, "load_region_flows", lambda keywords, year: None)
+    fig = benchmark.pedantic(heatmap.main_heatmap, args=("synthetic", YEAR, geojson_data), rounds=3)
+    assert isinstance(fig, go.Figure)
+    check_threshold(benchmark, "main_heatmap")
@@ -1,13 +1,17 @@
 import os
 import base64
+import plotly.io
 import requests
 import subprocess
+import time
 import streamlit as st   
 
 
 years = [2020, 2021, 2022, 2023, 2024]
 # Import the new visualisation function in heatmap.py under the visualization branch.
-from src.visualization.heatmap import combined_heatmaps_vertical_with_left_timeline
+from src.visualization.heatmap import cached_combined_heatmaps
+from src.visualization.cache_utils import load_thumbnail, clear_keyword_caches
+from src.quota_scheduler import load_quota_summary
 LOGO = "./doc/pics/mapademic-logo.png"
 LOGO_SMALL = "./doc/pics/mapademic-logo-small.png"
 st.set_page_config(page_title="Mapademic",
@@ -67,6 +71,12 @@ st.sidebar.markdown("""
 - **API Key**: Keep an eye on the call limit; the project defaults to 100 requests per year.  
 - **Geospatial Matching**: If you notice strange mismatches on the map, please report them on GitHub.
 """)
+# The quota left is known once the API has been called (saved by src/quota_scheduler.py)
+quota_summary = load_quota_summary()
+if quota_summary is not None:
+    remaining, reset = quota_summary
+    reset_text = f", resets {time.strftime('%Y-%m-%d %H:%M', time.localtime(reset))}" if reset else ""
+    st.sidebar.caption(f"Search API quota left: {remaining:,}{reset_text}")
 
 # 6. Learn More
 st.sidebar.header("Learn More")
@@ -93,6 +103,37 @@ st.sidebar.markdown(
     unsafe_allow_html=True
 )
 
+# The pipeline renders its images as PNG by default, or in the format set by RENDER_IMAGE_FORMAT
+OUTPUT_IMAGE_EXTENSIONS = (".png", ".webp", ".jpeg")
+
+def find_output_image(image_root):
+    """
+    Returns the path of an output image whatever its format, or None if it was not rendered.
+    """
+    for extension in OUTPUT_IMAGE_EXTENSIONS:
+        if os.path.exists(f"{image_root}{extension}"):
+            return f"{image_root}{extension}"
+    return None
+
+def show_output_image(image_root, caption, missing_message, key):
+    """
+    Shows a downscaled preview of an output image, and the full-resolution file only on demand.
+    """
+    image_path = find_output_image(image_root)
+    if image_path is None:
+        st.warning(missing_message)
+        return
+    if st.toggle("Full resolution", key=f"{key}_full_res"):
+        st.image(image_path, caption=caption)
+        return
+    # Use the low-dpi preview rendered by the pipeline if there is one, otherwise downscale here
+    root, ext = os.path.splitext(image_path)
+    preview_path = f"{root}_preview{ext}"
+    if os.path.exists(preview_path):
+        st.image(preview_path, caption=caption)
+    else:
+        st.image(load_thumbnail(image_path, os.path.getmtime(image_path)), caption=caption)
+
 # 1) Initialise Session State
 if "search_completed" not in st.session_state:
     st.session_state.search_completed = False
@@ -165,6 +206,9 @@ if api_key:
                 subprocess.run(["python", "-m", "src.cleaning.clean_data"])
                 subprocess.run(["python", "-m", "src.cleaning.feature_selecting"])
 
+                # Outputs for this keyword were just rewritten, so drop any figure and file cached from an earlier run
+                cached_combined_heatmaps.clear()
+                clear_keyword_caches()
                 st.session_state.search_completed = True
 
                 st.success("Search completed. Please click on the SEARCH button and we'll start making visualizations!")
@@ -174,51 +218,55 @@ if api_key:
         st.write("### The search and data processing is completed. Displaying visualisation results:")
         key_word = st.session_state.global_keyword.lower().replace(" ", "")
         #Display of combined heat maps for multiple years
+        # The figure is cached on (keyword, years), so reruns triggered by the widgets below reuse it
+        binned = st.toggle("Quantile color bins", key="binned_colors",
+                           help="Color regions by equal-frequency bins of the research density instead of a linear scale.")
         try:
-            fig = combined_heatmaps_vertical_with_left_timeline(
-                keywords=key_word,
-                years=years
-            )
+            fig = cached_combined_heatmaps(key_word, tuple(years), binned)
             st.plotly_chart(fig, use_container_width=True)
         except Exception as e:
             st.error(f"Error generating the visualisation chart: {e}")
 
         st.write("## Additional Visual Insights")
 
-        # Addtional visulization 
+        # Addtional visulization
+        # Each section is only loaded once it is opened, and only for the selected year,
+        # instead of reading every 300-dpi image on every rerun
         # 1) Top Features
         st.subheader("Top Features")
-        # Dynamically generate multiple tabs based on year
-        tabs1 = st.tabs([f"{yr}" for yr in years])
-
-        # Bind each label to the corresponding year
-        for i, yr in enumerate(years):
-            with tabs1[i]:
-                features_path = f"data/output_data/features/{key_word}_{yr}_features.png"
-                if os.path.exists(features_path):
-                    st.image(features_path, caption=f"Top features for {yr}")
-                else:
-                    st.warning(f"No features image found for year {yr}.")
+        if st.toggle("Show top features", key="show_features"):
+            yr = st.segmented_control("Year", years, default=years[0], key="features_year")
+            if yr is not None:
+                features_path = f"data/output_data/features/{key_word}_{yr}_features"
+                show_output_image(features_path, f"Top features for {yr}",
+                                  f"No features image found for year {yr}.", key="features")
 
         # 2) Word Cloud
         st.subheader("Word Cloud")
-        tabs2 = st.tabs([f"{yr}" for yr in years])
-        for i, yr in enumerate(years):
-            with tabs2[i]:
-                wordcloud_path = f"data/output_data/wordcloud/{key_word}_{yr}_word_cloud.png"
-                if os.path.exists(wordcloud_path):
-                    st.image(wordcloud_path, caption=f"Word cloud for {yr}")
-                else:
-                    st.warning(f"No word cloud image found for year {yr}.")
+        if st.toggle("Show word clouds", key="show_wordcloud"):
+            yr = st.segmented_control("Year", years, default=years[0], key="wordcloud_year")
+            if yr is not None:
+                wordcloud_path = f"data/output_data/wordcloud/{key_word}_{yr}_word_cloud"
+                show_output_image(wordcloud_path, f"Word cloud for {yr}",
+                                  f"No word cloud image found for year {yr}.", key="wordcloud")
 
         # 3) Dynamic Word Frequency
         st.write("## Dynamic Word Frequency")
-        gif_path = f"data/output_data/dynamic_wordfrq/{key_word}_dynamic_wordfreq.gif"
-
-        if os.path.exists(gif_path):
-            st.image(gif_path)
-        else:
-            st.warning("No dynamic word frequency image found.")
+        if st.toggle("Show dynamic word frequency", key="show_gif"):
+            # The pipeline writes a GIF by default, or WebP/MP4/an interactive Plotly animation
+            # depending on WORDFRQ_ANIMATION_FORMAT
+            animation_root = f"data/output_data/dynamic_wordfrq/{key_word}_dynamic_wordfreq"
+
+            if os.path.exists(f"{animation_root}.json"):
+                st.plotly_chart(plotly.io.read_json(f"{animation_root}.json"), use_container_width=True)
+            elif os.path.exists(f"{animation_root}.gif"):
+                st.image(f"{animation_root}.gif")
+            elif os.path.exists(f"{animation_root}.webp"):
+                st.image(f"{animation_root}.webp")
+            elif os.path.exists(f"{animation_root}.mp4"):
+                st.video(f"{animation_root}.mp4", loop=True)
+            else:
+                st.warning("No dynamic word frequency image found.")
         
         # Try a new search 
         if st.button("Try a new search", key="new_search_btn"):
@@ -1,8 +1,19 @@
 import json
 import requests
 import os
+import sys
+from pathlib import Path
 import streamlit as st
 
+# This file runs as a script, so make the repository root importable for the shared paper store
+sys.path.append(str(Path(__file__).resolve().parents[2]))
+from src.storage.paper_store import PaperStore
+from src.storage.raw_archive import find_records, read_records, write_records
+from src.quota_scheduler import get_scheduler, api_keys_from_env, QuotaExhaustedError
+from src.scopus_client import BASE_URL, RETRY_STATUSES, CircuitOpenError
+from src.scopus_records import loads
+from src.instrumentation import instrument, write_metrics
+
 KEYWORDS = os.environ.get("SEARCH_KEYWORD", "default_keyword_if_none")
 
 def generate_filenames(keyword, start_year, end_year):
@@ -19,28 +30,29 @@ FILENAME_LST = generate_filenames(keywords, 2020, 2024)
 SEARCH_RESULT = set()
 STATE_DICT = {}
 
-try:
-    API_KEY = os.environ["API_KEY"]
-except KeyError:
+if not api_keys_from_env():
     raise Exception(
         "Make sure that you have set the API Key environment variable as "
         "described in the README."
     )
 
 # Scopus API Configuration for affiliation search function
-AFFILIATION_URL = "https://api.elsevier.com/content/affiliation"
-HEADERS = {
-    "Accept": "application/json",
-    "X-ELS-APIKey": API_KEY
-}
+AFFILIATION_URL = f"{BASE_URL}/content/affiliation"
+STATE_DATASET = "data/raw_data/afid_state_dataset.json"
 
+@instrument()
 def affiliation_state(afid):
+    # Returns the state of an affiliation ("NA" when the API has none), or None when the lookup failed
+    # for now (429/5xx after the retries, connection errors), so the affiliation is looked up again next run.
+    # CircuitOpenError and QuotaExhaustedError are raised: every following lookup would fail as well.
     affiliation_url = f"{AFFILIATION_URL}/affiliation_id/{afid}"
     try:
-        response = requests.get(affiliation_url, headers=HEADERS)
+        # The scheduler picks the key with the most affiliation quota left; its client retries
+        # 429/5xx with backoff and stops calling while the API keeps failing
+        response = get_scheduler().get(affiliation_url, endpoint="affiliation", label="affiliation")
         response.raise_for_status()  # Raise error for bad HTTP response
 
-        data = response.json()
+        data = loads(response.content)
 
         # Initialize state_info with default value
         state_info = "NA"
@@ -55,58 +67,86 @@ def affiliation_state(afid):
         
         return state_info
 
+    except (CircuitOpenError, QuotaExhaustedError):
+        raise
+
     # Using try..except.. here to make sure even if the building dict meets problem, the program can keep running
     # At the same time, the problem can easily been seen and fixed, majorly due to too many API calling
-    except requests.exceptions.RequestException as e: 
+    except requests.exceptions.HTTPError as e:
         print(f"Error fetching affiliation data for {afid}: {e}")
+        if e.response is not None and e.response.status_code in RETRY_STATUSES:
+            return None
         return "NA"
+    except requests.exceptions.RequestException as e:
+        print(f"Error fetching affiliation data for {afid}: {e}")
+        return None
 
 def generate_state_date(filename):
-    with open (filename, "r") as resource:
-        raw_data = json.load(resource)
-        for each_search in raw_data:
-            SEARCH_RESULT.add(each_search.get("affiliation_id"))
+    # The paper file may be kept as JSON or as an archive (see src/storage/raw_archive.py)
+    for each_search in read_records(filename):
+        SEARCH_RESULT.add(each_search.get("affiliation_id"))
     
     return SEARCH_RESULT
 
-# Using magic number [0:5] here and bolew showing 5 elements (5 years through 2020-2024)
-for filename in FILENAME_LST[0:5]:
-    generate_state_date(filename[1])
+def load_state_dict(file_path=STATE_DATASET):
+    # Keeping updating the JSON(dict), without covering anything written before
+    if os.path.exists(file_path):
+        try:
+            with open(file_path, "r") as base_dataset:
+                return json.load(base_dataset)
+        except json.JSONDecodeError:  # Handle empty or broken JSON file
+            return {}
+    return {}
+
+def update_state_dict(afids, state_dict):
+    # Only the affiliations never looked up before cost an API call, so each affiliation is matched once
+    # print statement in this loop, is to let users know the program is actually working, since large amount of searching results cost time.
+    # A failed lookup is not stored, so the affiliation is looked up again by the next run
+    for each_ID in afids:
+        if each_ID in state_dict:
+            print(f"{each_ID} already here") 
+            continue
+        try:
+            state_info = affiliation_state(each_ID)
+        except (CircuitOpenError, QuotaExhaustedError) as e:
+            print(f"⚠️ {e}: the remaining affiliations are left for the next run.")
+            break
+        if state_info is None:
+            print(f"Skipped {each_ID}, it will be looked up again next run")
+            continue
+        print(f"Added {each_ID}")
+        state_dict[each_ID] = state_info
+    get_scheduler().save()  # The quotas seen, once for all the affiliations
+    return state_dict
 
-# print(FILENAME_LST[0:5])
-print(len(SEARCH_RESULT))
+def save_state_dict(state_dict, file_path=STATE_DATASET):
+    with open (file_path, "w") as base_dataset:
+        json.dump(state_dict, base_dataset, ensure_ascii=False, indent=4)
 
-file_path = "data/raw_data/afid_state_dataset.json"
+def attach_states(paper_data, state_dict):
+    for each_paper in paper_data:
+        each_paper["affiliation_state"] = state_dict.get(each_paper["affiliation_id"], "NA")
+    return paper_data
 
-if os.path.exists(file_path):
-    # Keeping updating the JSON(dict), without covering anything written before
-    try:
-        with open(file_path, "r") as base_dataset:
-            STATE_DICT = json.load(base_dataset)
-    except json.JSONDecodeError:  # Handle empty or broken JSON file
-        STATE_DICT = {}  
-else:
-    STATE_DICT = {}
-
-# print statement in this loop, is to let users know the program is actually working, since large amount of searching results cost time.
-for each_ID in SEARCH_RESULT:
-    if each_ID in STATE_DICT:
-        print(f"{each_ID} already here") 
-        continue
-    else:
-        print(f"Added {each_ID}")
-        STATE_DICT[each_ID] = affiliation_state(each_ID)
-    
-with open ("data/raw_data/afid_state_dataset.json", "w") as base_dataset:
-    json.dump(STATE_DICT, base_dataset, ensure_ascii=False, indent=4)
+if __name__ == "__main__":
+    # Using magic number [0:5] here and bolew showing 5 elements (5 years through 2020-2024)
+    for filename in FILENAME_LST[0:5]:
+        generate_state_date(filename[1])
+
+    # print(FILENAME_LST[0:5])
+    print(len(SEARCH_RESULT))
+
+    STATE_DICT = update_state_dict(SEARCH_RESULT, load_state_dict())
+    save_state_dict(STATE_DICT)
+    with PaperStore() as store:
+        store.update_states(STATE_DICT)
 
     for filename in FILENAME_LST[0:5]:
         # Since the each element's struction in FILENAME_LST is (year, filename), filename[1] below indicates the file name
-        with open(filename[1], "r") as resource:
-            paper_data = json.load(resource)
+        paper_file = find_records(filename[1])
+        paper_data = read_records(paper_file)
 
-        for each_paper in paper_data:
-            each_paper["affiliation_state"] = STATE_DICT.get(each_paper["affiliation_id"], "NA")
+        attach_states(paper_data, STATE_DICT)
         
-        with open(filename[1], "w") as resource:
-            json.dump(paper_data, resource, ensure_ascii=False, indent=4)
\ No newline at end of file
+        write_records(paper_data, paper_file)
+    write_metrics("affiliation_state_match")
@@ -1,104 +1,168 @@
 import requests
-import json
 import time
 import os
+import sys
+from collections import Counter
+from pathlib import Path
 import streamlit as st
 
+# This file runs as a script, so make the repository root importable for the shared paper store
+sys.path.append(str(Path(__file__).resolve().parents[2]))
+from src.storage.paper_store import PaperStore
+from src.storage.search_index import SearchIndex
+from src.storage.raw_archive import ARCHIVE_SUFFIX, find_records, is_archive, iter_blocks, read_records, records_exist, write_records
+from src.quota_scheduler import get_scheduler, api_keys_from_env
+from src.scopus_client import BASE_URL
+from src.scopus_records import decode_paper_records, entry_record, loads
+from src.instrumentation import instrument, count_file_written, span, write_metrics
+
 # Remember to use the command 'export API_KEY="your API Key"' at the every beginning
-try:
-    API_KEY = os.environ["API_KEY"]
-except KeyError:
+# (or 'export API_KEYS="key1,key2"' to spread the calls over several keys)
+API_KEYS = api_keys_from_env()
+if not API_KEYS:
     raise Exception(
         "Make sure that you have set the API Key environment variable as "
         "described in the README."
     )
+API_KEY = API_KEYS[0]
 
 KEYWORDS = os.environ.get("SEARCH_KEYWORD", "default_keyword_if_none")
 
 # Scopus API Configuration for keyword search function
-SEARCH_URL = "https://api.elsevier.com/content/search/scopus"
-HEADERS = {
-    "Accept": "application/json",
-    "X-ELS-APIKey": API_KEY
-}
+SEARCH_URL = f"{BASE_URL}/content/search/scopus"
+# Pause between two pages of a search; the shared client handles 429s, so this only spreads the load
+PAGE_DELAY = float(os.environ.get("SCOPUS_PAGE_DELAY", "0.5"))
 
 PAGE_SIZE = 25 # When set the parameter "view" as "COMPLETE", MAXIMUM be 25 !!!
                # when set the parameter "view" as "STANDARD", Maximum could be 200
+STANDARD_PAGE_SIZE = 200
 
-def get_total_results(keywords, year):
-    # Fetch total number of search results to check how many exist.
-    # Reason: for every search, api would response the total number of the searching results 
-    params = {
-        "query": f"TITLE-ABS-KEY({keywords}) AND PUBYEAR = {year}",
-        "httpAccept": "application/json",
-        "count": 1  # Only fetch metadata
-    }
-
-    response = requests.get(SEARCH_URL, headers=HEADERS, params=params)
-
-    if response.status_code == 200:
-        data = response.json()
-        total_results = int(data["search-results"]["opensearch:totalResults"])
-        print(f"Total available results: {total_results}")
-        return total_results
-    else:
-        print(f"❌ Error fetching total results: {response.status_code}")
-        return 0
-    
-def fetch_results_with_cursor(keywords, year):
-    # Fetch results using cursor-based pagination and save to JSON
-    total_available = get_total_results(keywords, year)  # Check total results
-
-    if total_available == 0:
-        print("⚠️ No results found. Exiting.")
-        return
-
-    results = []
-    cursor = "*"  # First request starts with cursor="*"
-    retrieved_count = 0
-    MAX_RESULTS = 100 # Using for demo
-    # MAX_RESULTS = total_available # Number of results to fetch
-
-    while retrieved_count < min(MAX_RESULTS, total_available):
+# Fields the "STANDARD" view returns. Anything else (abstract, author list with affiliation ids,
+# author keywords) needs "COMPLETE", which only allows PAGE_SIZE results per request.
+STANDARD_FIELDS = {
+    "eid", "dc:identifier", "dc:title", "dc:creator", "prism:publicationName", "prism:coverDate",
+    "prism:doi", "citedby-count", "affiliation", "subtype", "subtypeDescription",
+}
+# Fields build_paper_record and the search index read
+PAPER_FIELDS = [
+    "eid", "dc:title", "prism:publicationName", "citedby-count", "prism:coverDate", "dc:description",
+    "prism:doi", "author", "affiliation", "authkeywords",
+]
+ID_FIELDS = ["eid", "prism:doi"]
+
+# Number of requests sent to the API, per keyword (or query), to check quota use
+REQUEST_COUNTS = Counter()
+
+# Results fetched per keyword and year. 100 is the demo default; SCOPUS_MAX_RESULTS=0 lifts the cap,
+# and the quota scheduler then decides how much of each search the keys can afford.
+MAX_RESULTS = int(os.environ.get("SCOPUS_MAX_RESULTS", "100")) or None
+# opensearch:totalResults of every (keywords, year) search sent, read from the first page
+TOTAL_RESULTS = {}
+
+class QueryPlan:
+    """
+    How one search is fetched: the cheapest view that returns the needed fields, the page size that
+    view allows, and how many results to fetch. The number of results available is read from the
+    first page (opensearch:totalResults), so no separate probe request is sent.
+    """
+
+    def __init__(self, query, fields, max_results, sort="-citedby-count", label=None):
+        self.query = query
+        self.fields = list(fields)
+        self.view = "STANDARD" if set(self.fields) <= STANDARD_FIELDS else "COMPLETE"
+        self.page_size = STANDARD_PAGE_SIZE if self.view == "STANDARD" else PAGE_SIZE
+        self.max_results = max_results
+        self.sort = sort
+        self.label = label or query
+        self.total_results = None  # Known after the first page
+
+    def target(self):
+        # max_results=None means every result (as far as the quota allows)
+        if self.total_results is None:
+            return self.page_size if self.max_results is None else self.max_results
+        if self.max_results is None:
+            return self.total_results
+        return min(self.max_results, self.total_results)
+
+    def expected_requests(self):
+        # Pages needed to reach the target (ceiling division)
+        return -(-self.target() // self.page_size)
+
+    def params(self, cursor, retrieved_count):
         params = {
-            "query": f"TITLE-ABS-KEY({keywords}) AND PUBYEAR = {year}",
+            "query": self.query,
             "httpAccept": "application/json",
-            "count": PAGE_SIZE,  # Max results per request
-            "sort": "-citedby-count", # Sort the search result by the cited amout ("-" in front means descending)
+            # The last page only asks for what is still missing
+            "count": min(self.page_size, self.target() - retrieved_count),
             "cursor": cursor,  # Cursor-based pagination
-            "view": "COMPLETE" # The "COMPLETE" option can only be used through school network, comfired by scopus support team
-                                # Again! Important, under "COMPLETE", PAGE_SIZE can maximum be set as 25
+            "view": self.view,
         }
+        if self.sort:
+            params["sort"] = self.sort  # Sort the search result (e.g. "-citedby-count": most cited first)
+        if self.view == "STANDARD":
+            # Only the listed fields are sent back, which keeps the id listings small
+            params["field"] = ",".join(self.fields)
+        return params
+
+def scopus_get(params, label):
+    # The scheduler picks the key with the most quota left (src/quota_scheduler.py);
+    # retries, backoff and the circuit breaker live in the shared client (src/scopus_client.py)
+    REQUEST_COUNTS[label] += 1
+    return get_scheduler().get(SEARCH_URL, params=params, endpoint="search", label=label)
+
+def fetch_pages(plan):
+    # Fetch the entries of a QueryPlan page by page using cursor-based pagination
+    results = []
+    cursor = "*"  # First request starts with cursor="*"
+    retrieved_count = 0
 
-        response = requests.get(SEARCH_URL, headers=HEADERS, params=params)
+    while retrieved_count < plan.target():
+        try:
+            response = scopus_get(plan.params(cursor, retrieved_count), plan.label)
+        except requests.exceptions.RequestException as e:
+            # Connection errors the client could not retry, or the circuit breaker is open
+            print(f"❌ Request failed: {e}")
+            break
 
         if response.status_code == 200:
-            data = response.json()
-            entries = data.get("search-results", {}).get("entry", [])
-
-            if not entries:
+            data = loads(response.content)
+            search_results = data.get("search-results", {})
+            if plan.total_results is None:
+                # The first page tells how many results exist, which sizes the rest of the fetch
+                plan.total_results = int(search_results.get("opensearch:totalResults", 0) or 0)
+                # Fetch the rest only as far as this keyword's share of the quota goes
+                wanted = plan.expected_requests() - 1
+                granted = get_scheduler().grant(plan.label, wanted)
+                if granted < wanted:
+                    plan.max_results = plan.page_size * (granted + 1)
+                    print(f"⚠️ Quota share reached: fetching {plan.target()} of {plan.total_results} results.")
+                print(f"Total available results: {plan.total_results}, fetching {plan.target()} "
+                      f"in {plan.expected_requests()} request(s) ({plan.view} view)")
+            entries = search_results.get("entry", [])
+
+            # When nothing matches, Scopus returns a single entry that only holds an "error" message
+            if not entries or "error" in entries[0]:
                 print("⚠️ No more results found. Stopping pagination.")
                 break  # Stop if no more results
 
             results.extend(entries)
             retrieved_count += len(entries)
-            print(f"✅ Retrieved {retrieved_count}/{min(MAX_RESULTS, total_available)} results...")
+            print(f"✅ Retrieved {retrieved_count}/{plan.target()} results...")
 
             # Extract next cursor
-            next_cursor = data["search-results"].get("cursor", {}).get("@next", None)
+            next_cursor = search_results.get("cursor", {}).get("@next", None)
 
             # Debugging for the cursor
             # print(f"Next Cursor: {next_cursor}")
 
-            if not next_cursor:
-                print("No further cursor available. Ending fetch.")
-                break  # Stop if cursor is missing
+            if not next_cursor or retrieved_count >= plan.target():
+                break  # Stop if cursor is missing, or nothing more is needed
 
             # Update cursor for next request
             cursor = next_cursor
 
             # Avoid hitting API rate limits
-            time.sleep(0.5)
+            time.sleep(PAGE_DELAY)
 
         # Major error type presented in the offical documentation. (400 majorly due to cursor; 429 is about api limit)
         elif response.status_code == 400:
@@ -107,6 +171,7 @@ def fetch_results_with_cursor(keywords, year):
 
         elif response.status_code == 401:
             print("❌ Error 401: Access Denied - Missing/invalid credentials.")
+            break
 
         elif response.status_code == 403:
             print("❌ Error 403: Access Denied - Check API Key Permissions.")
@@ -125,99 +190,156 @@ def fetch_results_with_cursor(keywords, year):
             break
 
         elif response.status_code == 429:
-            print("⚠️ API Quota Exceeded! Waiting before retrying...")
-            time.sleep(10)  # Wait 10 seconds before retrying
-            continue
+            # The client already waited and retried as long as the rate limit headers and the retry budget allowed
+            print("⚠️ API Quota Exceeded! Stopping with the results fetched so far.")
+            break
 
         else:
             print(f"❌ Error {response.status_code}: {response.text}")
             break
 
-    # Save results as JSON
-    save_results(results)
+    return results[:plan.target()]
+
+def search_query(keywords, year):
+    return f"TITLE-ABS-KEY({keywords}) AND PUBYEAR = {year}"
+
+@instrument()
+def fetch_results_with_cursor(keywords, year, max_results=MAX_RESULTS):
+    # Fetch the complete records of the top cited results using cursor-based pagination
+    # The first page tells how many exist, so fewer are requested when fewer exist
+    plan = QueryPlan(search_query(keywords, year), PAPER_FIELDS, max_results, label=keywords)
+    results = fetch_pages(plan)
+    TOTAL_RESULTS[(keywords, year)] = plan.total_results
+    get_scheduler().save()  # The quotas seen, once per search
+    return results
+
+@instrument()
+def fetch_paper_ids(keywords, year, max_results=MAX_RESULTS):
+    # Fetch only the identifiers of the top cited results. The "STANDARD" view allows 200 results per page,
+    # so listing ids costs a fraction of the requests of fetching the complete records.
+    plan = QueryPlan(search_query(keywords, year), ID_FIELDS, max_results, label=keywords)
+    results = fetch_pages(plan)
+    TOTAL_RESULTS[(keywords, year)] = plan.total_results
+    get_scheduler().save()  # The quotas seen, once per search
+    return results
+
+@instrument()
+def fetch_papers_by_eid(eids, label=None):
+    # Fetch the complete records of the given papers, PAGE_SIZE papers per request
+    results = []
+    for start in range(0, len(eids), PAGE_SIZE):
+        batch = eids[start:start + PAGE_SIZE]
+        query = " OR ".join(f"EID({eid})" for eid in batch)
+        plan = QueryPlan(query, PAPER_FIELDS, len(batch), sort=None, label=label or query)
+        results.extend(fetch_pages(plan))
+    get_scheduler().save()
+    return results
 
 def generate_filenames(keyword, start_year, end_year):
     year_filenames = []
     keyword_lower = keyword.lower().replace(" ","")
     for year in range(start_year, end_year + 1):
-        filename = f"data/raw_data/raw_api_data/{keyword_lower}_{year}_raw.json"
+        # Compressed JSON Lines; a *_raw.json file fetched before is read as well (see src/storage/raw_archive.py)
+        filename = f"data/raw_data/raw_api_data/{keyword_lower}_{year}_raw{ARCHIVE_SUFFIX}"
         year_filenames.append((year, filename))
     return year_filenames
 
-def save_results(results):
-    # Save results to a JSON file
-    with open(FILENAME, "w", encoding="utf-8") as f:
-        # ensure_ascii=False here and below is necessary to encoding some "hard-to-read" code in the result
-        json.dump(results, f, ensure_ascii=False, indent=4)
-
-    print(f"Results saved to {FILENAME}")
+def save_results(results, filename):
+    # Save results to a raw archive (or a JSON file, by the suffix of filename)
+    write_records(results, filename)
+    count_file_written(filename, "raw_api_data")
+
+    print(f"Results saved to {filename}")
+
+def local_results(store, keywords, year, max_results=MAX_RESULTS):
+    # A search that only narrows one fetched completely before is answered from the paper store
+    # (src/storage/search_index.py), without calling the API. Returns the raw entries, or None to call the API.
+    if not store.has_fts:
+        return None
+    index = SearchIndex(store)
+    covering = index.covering_query(keywords, year)
+    if covering is None:
+        return None
+    keys = index.search(keywords, year, max_results)
+    entries = store.raw_entries(keys)
+    if len(entries) < len(keys):
+        return None  # Papers imported from paper files have no raw entry to save
+    print(f"🔎 {keywords} {year}: {len(keys)} papers found locally (narrows '{covering}'), no API call.")
+    return [entries[key] for key in keys]
+
+def fetch_keyword_years(keywords, filename_lst, store):
+    # Writes the raw file of every year of a keyword, from the paper store when it covers the search
+    # and from the API otherwise. Returns {year: number of results} of the searches sent to the API.
+    api_searches = {}
+    for year, filename in filename_lst:
+        if records_exist(filename):  # Check if the file exists, in either format
+            print(f"File already exists: {filename}, skipping fetch.")
+            continue
+        results = local_results(store, keywords, year)
+        if results is None:
+            print(f"Fetching data for {year}...")
+            results = fetch_results_with_cursor(keywords, year)
+            api_searches[year] = len(results)
+        save_results(results, filename)
+    return api_searches
 
 if __name__ == "__main__":
     FILENAME_LST = generate_filenames(KEYWORDS, 2020, 2024)
 
-    for each_year_result in FILENAME_LST:
-        year, FILENAME = each_year_result[0], each_year_result[1]
-
-        if os.path.exists(FILENAME):  # Check if the file exists
-            print(f"File already exists: {FILENAME}, skipping fetch.")
-        else:
-            print(f"Fetching data for {year}...")
-            fetch_results_with_cursor(KEYWORDS, year)
+    with PaperStore() as store:
+        API_SEARCHES = fetch_keyword_years(KEYWORDS, FILENAME_LST, store)
+    print(f"📨 {REQUEST_COUNTS[KEYWORDS]} request(s) sent for {KEYWORDS}")
     
+def paper_key(each_search):
+    # Identify a paper across keywords: the Scopus EID, or the DOI when the EID is missing
+    eid = each_search.get("eid")
+    if eid:
+        return eid
+    doi = each_search.get("prism:doi")
+    return f"doi:{doi.lower()}" if doi else None
+
+def build_paper_record(each_search):
+    # The first author and its affiliation; missing parts of the info are "NA" (see src/scopus_records.py)
+    return entry_record(each_search)
+
+@instrument()
 def build_paper_json(FILENAME,filename_filtered):
-    with open (filename_filtered,"w") as f:
-        with open (FILENAME, "r") as resource:
-            keyword_result = []
-            raw_data = json.load(resource)
-            for each_search in raw_data:
-                # Important!! Using dict.get is necessary and safe, since there exsists missing part of the imfo          
-                search_result = {
-                    "paper_title": each_search.get("dc:title","NA"),
-                    # "paper_author": each_search.get("dc:creator","NA"),
-                    "publication": each_search.get("prism:publicationName","NA"),
-                    "citied_by": each_search.get("citedby-count","NA"),
-                    "cover_date" : each_search.get("prism:coverDate","NA"),
-                    "Abstract": each_search.get("dc:description","NA"),
-                    "DOI": each_search.get("prism:doi","NA")
-                }
-
-                author = each_search.get("author",[])
-                if author and isinstance(author, list) and len(author) > 0:
-                    search_result["paper_author"] = author[0].get("authname", "NA")
-
-                    author_afid = author[0].get("afid", [])
-                    if isinstance(author_afid, list) and len(author_afid) > 0:
-                        author_afid = author_afid[0].get("$", "NA") 
-                    else:
-                        author_afid = "NA"
-                else:
-                    search_result["paper_author"] = "NA"
-                    author_afid = "NA"
-
-                affiliation = each_search.get("affiliation", [])
-
-                search_result["affiliation_name"] = "NA"
-                search_result["affiliation_city"] = "NA"
-                search_result["affiliation_country"] = "NA"
-                search_result["affiliation_id"] = "NA"
-
-                if affiliation and isinstance(affiliation, list) and len(affiliation) > 0:
-                    for each_affiliation in affiliation:
-                        if each_affiliation.get("afid") == author_afid:
-                            search_result["affiliation_name"] = each_affiliation.get("affilname", "NA")
-                            search_result["affiliation_city"] = each_affiliation.get("affiliation-city", "NA")
-                            search_result["affiliation_country"] = each_affiliation.get("affiliation-country", "NA")
-                            search_result["affiliation_id"] =  each_affiliation.get("afid","NA")
-                            break
-
-                keyword_result.append(search_result)
-            json.dump(keyword_result, f, ensure_ascii=False, indent=4)
+    # With msgspec installed, only the fields of the paper records are decoded from the raw file
+    FILENAME = find_records(FILENAME) or FILENAME
+    if is_archive(FILENAME):
+        keyword_result = []
+        for _, block in iter_blocks(FILENAME):
+            keyword_result.extend(decode_paper_records(block, lines=True))
+    else:
+        with open (FILENAME, "rb") as resource:
+            keyword_result = decode_paper_records(resource.read())
+    write_records(keyword_result, filename_filtered)
+    count_file_written(filename_filtered, "paper_json")
 
     print(f"📂 Results saved to {filename_filtered}")
 
+def update_paper_store(store, keywords, filename_lst, api_searches):
+    # Keep the shared paper store up to date as well: each paper is stored once whichever keywords find it.
+    # The searches sent to the API are logged, so the narrower ones can later be answered locally.
+    for year, filename in filename_lst:
+        raw_data = read_records(filename)
+        papers = [(paper_key(each_search), build_paper_record(each_search), each_search)
+                  for each_search in raw_data if paper_key(each_search) is not None]
+        store.add_papers(papers, year)
+        store.set_keyword_papers(keywords, year, [key for key, _, _ in papers])
+        if year in api_searches and store.has_fts:
+            # Complete when every result of the search came back and each of them could be stored
+            total = TOTAL_RESULTS.get((keywords, year))
+            complete = total is not None and api_searches[year] >= total and len(papers) == len(raw_data)
+            SearchIndex(store).log_query(keywords, year, len(papers), complete=complete)
+
 if __name__ == "__main__":
     for each_year_result in FILENAME_LST:
         year, FILENAME = each_year_result[0], each_year_result[1]
         keyword_lower = KEYWORDS.lower().replace(" ","")
-        filename_filtered = f"data/raw_data/{keyword_lower}_{year}_paper.json"
+        filename_filtered = f"data/raw_data/{keyword_lower}_{year}_paper{ARCHIVE_SUFFIX}"
         build_paper_json(FILENAME,filename_filtered)
+
+    with span("paper_store_update"), PaperStore() as store:
+        update_paper_store(store, KEYWORDS, FILENAME_LST, API_SEARCHES)
+    write_metrics("keyword_search")
@@ -0,0 +1,208 @@
+"""
+Batch mode: runs the whole pipeline (search, affiliation matching, cleaning) for many keywords at once.
+
+    python -m src.batch_search "machine learning and policy" "quantum computing" --years 2020 2024
+    python -m src.batch_search --keywords-file keywords.txt
+
+Compared to running the single-keyword scripts once per keyword:
+    - Papers are identified by EID (DOI when missing) and kept once in the paper store
+      (src/storage/paper_store.py). For every keyword/year only the ids of the top cited papers are
+      listed (200 per request); the complete records are fetched once per paper, so a paper found by
+      several keywords (or an earlier run) is not downloaded again.
+    - A keyword that only narrows a keyword whose results were all fetched before is answered from the
+      local full-text index (src/storage/search_index.py) without calling the API; --offline answers
+      every keyword locally.
+    - The affiliations of all the keywords are collected first and each one is matched to its state once.
+    - The reference tables used by the cleaning step are loaded once for all the keywords.
+
+The run's stage timings and counters are saved to data/output_data/metrics/batch_metrics.json/.prom
+(see src/instrumentation.py; MAPADEMIC_PROFILE=cprofile profiles the whole run).
+"""
+import argparse
+import importlib.util
+from pathlib import Path
+from src.storage.paper_store import PaperStore, DEFAULT_PATH, keyword_filename
+from src.storage.search_index import SearchIndex
+from src.storage.raw_archive import records_exist, read_records
+from src.instrumentation import span, profiled, write_metrics
+
+API_CALLING_DIR = Path(__file__).resolve().parent / "api-calling"
+
+
+def load_api_module(module_name):
+    """
+    Loads a script of src/api-calling as a module (the "-" in the folder name rules out a normal import).
+    """
+    path_spec = importlib.util.spec_from_file_location(module_name, API_CALLING_DIR / f"{module_name}.py")
+    module = importlib.util.module_from_spec(path_spec)
+    path_spec.loader.exec_module(module)
+    return module
+
+
+def collect_papers(keyword_search, store, keywords, years, max_results=100, refresh=False, offline=False):
+    """
+    Fills the shared paper store with the results of every keyword/year.
+
+    A keyword/year already in the store is skipped (unless refresh), and a raw file left by the
+    single-keyword script is imported instead of fetched. A search covered by the local index (or any
+    search when offline) is answered from the papers already stored. Otherwise only the ids of the
+    results are listed and the complete records are fetched for the papers the store does not have yet.
+
+    Returns:
+        A dictionary (keyword, year) -> number of papers newly fetched.
+    """
+    index = SearchIndex(store) if store.has_fts else None
+    if offline and index is None:
+        raise RuntimeError("Offline mode needs the full-text index, which this Python's sqlite3 cannot build")
+    fetched = {}
+    for keyword in keywords:
+        for year in years:
+            if not refresh and store.has_keyword(keyword, year):
+                print(f"{keyword} {year} already in the paper store, skipping fetch.")
+                fetched[(keyword, year)] = 0
+                continue
+
+            _, raw_filename = keyword_search.generate_filenames(keyword, year, year)[0]
+            if not refresh and records_exist(raw_filename):
+                # Already fetched by the single-keyword script
+                print(f"File already exists: {raw_filename}, importing it.")
+                entries = read_records(raw_filename)
+                keys = add_entries(keyword_search, store, entries, year)
+                store.set_keyword_papers(keyword, year, keys)
+                fetched[(keyword, year)] = 0
+                continue
+
+            covering = index.covering_query(keyword, year) if index is not None else None
+            if covering is not None or offline:
+                keys = index.search(keyword, year, max_results)
+                store.set_keyword_papers(keyword, year, keys)
+                source = f"narrows '{covering}'" if covering is not None else "offline"
+                print(f"🔎 {keyword} {year}: {len(keys)} papers found locally ({source}), no API call.")
+                fetched[(keyword, year)] = 0
+                continue
+
+            print(f"Listing papers of {keyword} in {year}...")
+            ids = keyword_search.fetch_paper_ids(keyword, year, max_results)
+            keys = [key for key in map(keyword_search.paper_key, ids) if key is not None]
+            keys = list(dict.fromkeys(keys))
+
+            known = store.has_papers(keys)
+            # Papers without an EID can only be fetched through a normal search, which these ids do not allow
+            missing_eids = [key for key in keys if key not in known and not key.startswith("doi:")]
+            print(f"{len(known)} papers already in the store, fetching {len(missing_eids)} new ones...")
+            add_entries(keyword_search, store, keyword_search.fetch_papers_by_eid(missing_eids, label=keyword), year)
+
+            known = store.has_papers(keys)
+            store.set_keyword_papers(keyword, year, [key for key in keys if key in known])
+            if index is not None:
+                # Every result of the search is stored when as many ids came back as the API has, and each
+                # of them reached the store (DOI-only papers and failed fetches leave it incomplete)
+                total = keyword_search.TOTAL_RESULTS.get((keyword, year))
+                complete = total is not None and len(ids) >= total and len(known) == len(keys)
+                index.log_query(keyword, year, len(known), complete=complete)
+            fetched[(keyword, year)] = len(missing_eids)
+    return fetched
+
+
+def add_entries(keyword_search, store, entries, year):
+    """
+    Parses raw Scopus entries once and adds them to the store.
+
+    Returns:
+        The paper keys of the entries, in order.
+    """
+    papers = []
+    for entry in entries:
+        key = keyword_search.paper_key(entry)
+        if key is not None:
+            papers.append((key, keyword_search.build_paper_record(entry), entry))
+    store.add_papers(papers, year)
+    return [key for key, _, _ in papers]
+
+
+def match_affiliations(affiliation_state_match, store, keywords):
+    """
+    Collects the affiliations of all the keywords; every affiliation is looked up at most once,
+    and the states are written to the store.
+
+    Returns:
+        The afid -> state dictionary.
+    """
+    afids = set()
+    for keyword in keywords:
+        afids.update(record["affiliation_id"] for record in store.papers(keyword, columns=["affiliation_id"]))
+    print(f"{len(afids)} unique affiliations over all the keywords")
+    state_dict = affiliation_state_match.update_state_dict(afids, affiliation_state_match.load_state_dict())
+    affiliation_state_match.save_state_dict(state_dict)
+    store.update_states(state_dict)
+    return state_dict
+
+
+def run_batch(keywords, years, max_results=100, skip_cleaning=False, refresh=False, offline=False,
+              store_path=DEFAULT_PATH):
+    keyword_search = load_api_module("keyword_search")
+    affiliation_state_match = load_api_module("affiliation_state_match")
+
+    with PaperStore(store_path) as store:
+        with span("collect_papers"):
+            fetched = collect_papers(keyword_search, store, keywords, years, max_results, refresh, offline)
+        print(f"✅ Fetched {sum(fetched.values())} new papers for {len(fetched)} keyword/year searches")
+        print_request_counts(keyword_search.REQUEST_COUNTS)
+        if not offline:
+            with span("match_affiliations"):
+                match_affiliations(affiliation_state_match, store, keywords)
+
+    if skip_cleaning:
+        return fetched
+    # Imported here so that fetching alone does not load the cleaning reference tables
+    from src.cleaning.clean_data import run_cleaning
+    from src.cleaning.feature_selecting import run_feature_selection
+    for keyword in keywords:
+        print(f"🧹 Cleaning {keyword}...")
+        run_cleaning(keyword_filename(keyword), years)
+        run_feature_selection(keyword_filename(keyword), years)
+    return fetched
+
+
+def print_request_counts(request_counts):
+    """
+    Prints the number of API requests sent per keyword, to check the quota used.
+    """
+    for label, n_requests in request_counts.most_common():
+        print(f"📨 {n_requests:5d} request(s)  {label}")
+    print(f"📨 {sum(request_counts.values()):5d} request(s) in total")
+
+
+def read_keywords(args):
+    keywords = list(args.keywords)
+    if args.keywords_file:
+        with open(args.keywords_file, "r", encoding="utf-8") as f:
+            keywords.extend(line.strip() for line in f if line.strip() and not line.startswith("#"))
+    # Keep the first spelling of keywords that map to the same files
+    unique = {}
+    for keyword in keywords:
+        unique.setdefault(keyword_filename(keyword), keyword)
+    return list(unique.values())
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the Mapademic pipeline for several keywords at once.")
+    parser.add_argument("keywords", nargs="*", help="Search keywords, e.g. \"machine learning and policy\"")
+    parser.add_argument("--keywords-file", help="A text file with one keyword per line")
+    parser.add_argument("--years", nargs=2, type=int, default=[2020, 2024], metavar=("START", "END"))
+    parser.add_argument("--max-results", type=int, default=100,
+                        help="Top cited papers per keyword and year (0: all, as far as the API quota allows)")
+    parser.add_argument("--skip-cleaning", action="store_true", help="Only fetch and match the papers")
+    parser.add_argument("--refresh", action="store_true",
+                        help="List the results again even if the store has them (only new papers are fetched)")
+    parser.add_argument("--offline", action="store_true",
+                        help="Answer every keyword from the papers already fetched, without calling the API")
+    args = parser.parse_args()
+
+    keywords = read_keywords(args)
+    if not keywords:
+        parser.error("Give at least one keyword or a --keywords-file")
+    with profiled("batch"):
+        run_batch(keywords, list(range(args.years[0], args.years[1] + 1)), args.max_results or None,
+                  args.skip_cleaning, args.refresh, args.offline)
+    write_metrics("batch")
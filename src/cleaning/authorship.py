@@ -0,0 +1,184 @@
+import json
+import os
+from pathlib import Path
+import numpy as np
+import pandas as pd
+
+# Parquet needs pyarrow (installed with streamlit); without it the tables are written as csv
+try:
+    import pyarrow
+except ImportError:
+    pyarrow = None
+
+AFID_STATE_PATH = "data/raw_data/afid_state_dataset.json"
+# Id used in the edge list for an author without affiliation (or a paper without author list)
+MISSING_ID = -1
+
+
+def _flatten(entries):
+    """
+    The only pass in Python: turns the nested author/affiliation arrays of the raw Scopus entries
+    into flat lists. Everything after this is done on whole columns.
+    """
+    papers, edges, affiliations = [], [], []
+    for paper_idx, (key, entry) in enumerate(entries):
+        papers.append((key, entry.get("dc:title"), entry.get("prism:coverDate"), entry.get("citedby-count")))
+        for affiliation in entry.get("affiliation") or []:
+            affiliations.append((affiliation.get("afid"), affiliation.get("affilname"),
+                                 affiliation.get("affiliation-city"), affiliation.get("affiliation-country")))
+        authors = entry.get("author") or []
+        if not authors:
+            # No author list (e.g. the STANDARD view): the paper is shared by its listed affiliations
+            for affiliation in entry.get("affiliation") or [{}]:
+                edges.append((paper_idx, None, None, None, affiliation.get("afid")))
+            continue
+        for author in authors:
+            afids = [afid.get("$") for afid in author.get("afid") or []] or [None]
+            for afid in afids:
+                edges.append((paper_idx, author.get("@seq"), author.get("authid"), author.get("authname"), afid))
+    return papers, edges, affiliations
+
+
+def normalize_entries(entries):
+    """
+    This function inputs the raw Scopus entries of some papers, as (paper_key, entry) pairs.
+
+    Returns:
+        A dict of four dataframes with integer keys:
+            papers        paper_id, paper_key, paper_title, cover_date, citied_by
+            authors       author_id, authid, authname
+            affiliations  affiliation_id, afid, affiliation_name, affiliation_city, affiliation_country
+            authorship    the edge list: paper_id, author_id, affiliation_id, author_position
+                          (one row per author and affiliation of a paper; -1 where unknown)
+    """
+    paper_rows, edge_rows, affiliation_rows = _flatten(entries)
+
+    papers = pd.DataFrame(paper_rows, columns=["paper_key", "paper_title", "cover_date", "citied_by"])
+    papers.insert(0, "paper_id", np.arange(len(papers), dtype=np.int32))
+    papers["citied_by"] = pd.to_numeric(papers["citied_by"], errors="coerce").fillna(0).astype(np.int32)
+
+    edges = pd.DataFrame(edge_rows, columns=["paper_id", "seq", "authid", "authname", "afid"])
+    # An author is its Scopus author id, or its name when the id is missing
+    author_key = edges["authid"].fillna(edges["authname"])
+    author_codes, author_keys = pd.factorize(author_key)
+    # factorize numbers authors in order of appearance, so np.unique finds each one's first row in id order
+    _, first_author_row = np.unique(author_codes[author_codes != MISSING_ID], return_index=True)
+    first_author_row = np.flatnonzero(author_codes != MISSING_ID)[first_author_row]
+    authors = pd.DataFrame({
+        "author_id": np.arange(len(author_keys), dtype=np.int32),
+        "authid": edges["authid"].to_numpy()[first_author_row],
+        "authname": edges["authname"].to_numpy()[first_author_row],
+    })
+
+    affiliations = pd.DataFrame(affiliation_rows, columns=["afid", "affiliation_name", "affiliation_city", "affiliation_country"])
+    affiliations = affiliations.dropna(subset=["afid"]).drop_duplicates(subset="afid").reset_index(drop=True)
+    # An author can list an afid the paper's affiliation array does not describe; it still gets an id
+    extra = pd.Index(edges["afid"].dropna().unique()).difference(affiliations["afid"])
+    affiliations = pd.concat([affiliations, pd.DataFrame({"afid": extra})], ignore_index=True)
+    affiliations.insert(0, "affiliation_id", np.arange(len(affiliations), dtype=np.int32))
+
+    authorship = pd.DataFrame({
+        "paper_id": edges["paper_id"].astype(np.int32),
+        "author_id": author_codes.astype(np.int32),  # factorize gives -1 for a missing author
+        "affiliation_id": pd.Categorical(edges["afid"], categories=affiliations["afid"]).codes.astype(np.int32),
+        "author_position": pd.to_numeric(edges["seq"], errors="coerce").fillna(0).astype(np.int16),
+    })
+    return {"papers": papers, "authors": authors, "affiliations": affiliations, "authorship": authorship}
+
+
+def fractional_counts(tables, afid_states=None):
+    """
+    This function inputs the normalized tables of normalize_entries.
+
+    Every paper counts 1, split equally between its authors, and each author's share split equally
+    between the author's affiliations (a paper without author list is split between its affiliations).
+
+    Returns:
+        One row per affiliation with
+            full_paper_num          papers with at least one author from the affiliation
+            fractional_paper_num    the affiliation's share of the papers (sums to the number of papers)
+            fractional_cited_num    the same share of the citations
+        plus affiliation_state from the afid -> state dictionary when it is given.
+    """
+    edges = tables["authorship"]
+    if edges.empty:
+        return pd.DataFrame(columns=["affiliation_id", "afid", "affiliation_name", "affiliation_city", "affiliation_country",
+                                     "full_paper_num", "fractional_paper_num", "fractional_cited_num"])
+    # Papers without authors have author_id -1 on all their rows: each row is then its own "author"
+    author = edges["author_id"].where(edges["author_id"] != MISSING_ID, -1 - np.arange(len(edges)))
+    n_authors = author.groupby(edges["paper_id"]).transform("nunique")
+    n_affiliations = edges.groupby([edges["paper_id"], author])["paper_id"].transform("size")
+    weight = 1.0 / (n_authors * n_affiliations)
+    citations = tables["papers"]["citied_by"].to_numpy()[edges["paper_id"].to_numpy()]
+
+    weighted = pd.DataFrame({
+        "affiliation_id": edges["affiliation_id"],
+        "paper_id": edges["paper_id"],
+        "weight": weight,
+        "cited": weight * citations,
+    })
+    # The share of an author without affiliation is not credited to any institution
+    weighted = weighted[weighted["affiliation_id"] != MISSING_ID]
+    counts = weighted.groupby("affiliation_id").agg(
+        full_paper_num=("paper_id", "nunique"),
+        fractional_paper_num=("weight", "sum"),
+        fractional_cited_num=("cited", "sum"),
+    ).reset_index()
+    counts = counts.merge(tables["affiliations"], on="affiliation_id", how="left")
+    if afid_states is not None:
+        counts["affiliation_state"] = counts["afid"].map(afid_states).fillna("NA")
+    columns = ["affiliation_id", "afid", "affiliation_name", "affiliation_city", "affiliation_country"]
+    columns += ["affiliation_state"] if afid_states is not None else []
+    columns += ["full_paper_num", "fractional_paper_num", "fractional_cited_num"]
+    return counts[columns].sort_values("fractional_paper_num", ascending=False, ignore_index=True)
+
+
+def load_afid_states(path=AFID_STATE_PATH):
+    """
+    Returns the afid -> state dictionary built by affiliation_state_match.py, or an empty one.
+    """
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, "r") as f:
+            return json.load(f)
+    except json.JSONDecodeError:
+        return {}
+
+
+def save_tables(tables, output_prefix):
+    """
+    Saves the normalized tables as {output_prefix}_{table}.parquet (columnar, compressed),
+    or as csv when pyarrow is not installed.
+
+    Returns:
+        The list of written paths.
+    """
+    output_prefix = Path(output_prefix)
+    output_prefix.parent.mkdir(parents=True, exist_ok=True)
+    paths = []
+    for name, df in tables.items():
+        if pyarrow is not None:
+            path = output_prefix.with_name(f"{output_prefix.name}_{name}.parquet")
+            df.to_parquet(path, index=False, compression="zstd")
+        else:
+            path = output_prefix.with_name(f"{output_prefix.name}_{name}.csv")
+            df.to_csv(path, index=False, sep=';', encoding='utf-8')
+        paths.append(path)
+    return paths
+
+
+def load_tables(output_prefix, tables=("papers", "authors", "affiliations", "authorship")):
+    """
+    Loads the tables written by save_tables.
+    """
+    output_prefix = Path(output_prefix)
+    loaded = {}
+    for name in tables:
+        parquet = output_prefix.with_name(f"{output_prefix.name}_{name}.parquet")
+        if parquet.exists():
+            loaded[name] = pd.read_parquet(parquet)
+        else:
+            loaded[name] = pd.read_csv(output_prefix.with_name(f"{output_prefix.name}_{name}.csv"), sep=';',
+                                       dtype={"afid": str, "authid": str, "paper_key": str})
+    return loaded
@@ -4,14 +4,29 @@ import numpy as np
 from collections import Counter
 from pathlib import Path
 from .utils import remove, ignore, process_word_list
-from wordcloud import WordCloud
-import matplotlib.pyplot as plt
-from .visualize_words_yr import generate_word_frq_yearlygif
-from unidecode import unidecode
+from .render import render_word_cloud, render_batch, PREVIEW_DPI, IMAGE_FORMAT
+from .visualize_words_yr import generate_word_frq_yearlygif, dynamic_wordfrq_filename
+from .word_store import WordFreqStore
+from .index_engine import build_aggregate_table, evaluate_indices, calculate_index_variants, CRDI_INDICES
+from .authorship import normalize_entries, fractional_counts, save_tables, load_afid_states
+from .collaboration import build_collaboration
+from .normalization import normalize_column, get_normalization_cache
+from .gazetteer import get_gazetteer
+from .geocode import get_province_index
+from .fuzzy_match import get_state_matcher
+from .schema import apply_paper_schema
+from ..storage.paper_store import load_papers, load_raw_entries
+from ..instrumentation import instrument, span, profiled, count_file_written, write_metrics
 
 import os
 KEY_WORDS = os.environ.get("SEARCH_KEYWORD", "default_keyword_if_none").lower().replace(" ","")
 YEARS = [2020,2021,2022,2023,2024]
+CRDI_QUANTILES = [0.05, 0.1, 0.25, 0.5, 0.75, 0.9, 0.95, 0.99]
+# The map uses 7 colors, so the quantile-binned scale has 7 equal-frequency bins
+N_COLOR_BINS = 7
+# The paper fields this step reads, only these are loaded from the paper store
+CLEANING_COLUMNS = ["affiliation_name", "affiliation_state", "affiliation_city", "affiliation_country",
+                    "citied_by", "cover_date", "Abstract"]
 
 
 def clean_columns(df, columns):
@@ -21,13 +36,13 @@ def clean_columns(df, columns):
     2. Converting text to lowercase.
     3. Removing all whitespace.
     4. Converting accented characters to ASCII.
-    
+    Each distinct value is normalized once (see normalization.normalize_column), through a cache kept across runs.
     
     Returns:
-        a cleaned-version dataframe.
+        a cleaned-version dataframe, the cleaned columns as categoricals.
     """
     for column in columns:
-        df[column] = df[column].fillna("").str.lower().str.replace(r'\s+', '', regex=True).apply(unidecode)
+        df[column] = normalize_column(df[column])
     return df
 
 # Here I load the provinces_area data and set as a global variable
@@ -42,10 +57,11 @@ AREA_DF = clean_columns(AREA_DF, ["state_name", "country_name"])
 state_name_counts = AREA_DF['state_name'].value_counts()
 DUPLICATE_STATES  = state_name_counts[state_name_counts > 1].index.tolist()
 DUPLICATE_STATES = set(filter(None, DUPLICATE_STATES))
+AREA_NAMES = set(AREA_DF['state_name'].astype(object))
 CODE_DF = pd.read_csv('data/raw_data/code_country.csv')
 CODE_DF = clean_columns(CODE_DF, ['state_code', 'state_name', 'country_name'])
 
-def clean_duplicates(duplicate_final_df):
+def clean_duplicates(duplicate_final_df, matcher=None):
     """
     This function inputs a dataframe whose "statename" is a duplicated one.
     (i.e. different countries have the same states)
@@ -53,17 +69,20 @@ def clean_duplicates(duplicate_final_df):
     Returns:
         I will check which country this state/province is really in and return a re-matched dataframe. 
     """
-    
-    duplicate_merged_df = duplicate_final_df.merge(
+    if matcher is None:
+        matcher = get_state_matcher(AREA_DF)
+    # Scopus names some countries differently ("russianfederation"), so the country is matched first
+    area_country = matcher.match_countries(duplicate_final_df['affiliation_country'])
+    duplicate_merged_df = duplicate_final_df.assign(area_country=area_country).merge(
         AREA_DF,
-        left_on=['state_name', 'affiliation_country'], 
+        left_on=['state_name', 'area_country'], 
         right_on=['state_name', 'country_name'],
         how='left'
     )
     selected_columns = ["state_name","affiliation_state", "affiliation_country", "affiliation_name","citied_by", "cover_date","area_km2"]
     return duplicate_merged_df[selected_columns]
 
-def match_na_state(state_na):
+def match_na_state(state_na, gazetteer=None):
     """
     This function inputs a dataframe where some samples' "affiliation_state" is "NA" (a string not nan)
     
@@ -74,9 +93,15 @@ def match_na_state(state_na):
     
     # For some "NA" data, they are the capital city in the country
     # So we may match directly using "affiliation_city" and 
-    matched_df = state_na.merge(
+    # The other cities are looked up in the offline gazetteer (see gazetteer.py), no API call needed
+    if gazetteer is None:
+        gazetteer = get_gazetteer()
+    city = state_na["affiliation_city"].astype(object)
+    region = gazetteer.resolve(state_na["affiliation_city"], state_na["affiliation_country"])
+    match_key = city.where(city.isin(AREA_NAMES) | region.isna(), region)
+    matched_df = state_na.assign(match_key=match_key).merge(
         AREA_DF,
-        left_on= "affiliation_city",
+        left_on= "match_key",
         right_on= "state_name",
         how="left",
         indicator=True
@@ -84,7 +109,49 @@ def match_na_state(state_na):
     selected_columns = ["state_name","affiliation_state", "affiliation_country", "affiliation_name","citied_by", "cover_date","area_km2"]
     return matched_df[selected_columns]
 
-def match_nocode_state(unmatched_df):
+def locate_papers(paper_df, province_index=None, gazetteer=None):
+    """
+    This function inputs the cleaned paper dataframe. Papers with coordinates (affiliation_lat and
+    affiliation_lon, or the gazetteer coordinates of their city) are placed in the province polygon
+    containing them (see geocode.py).
+
+    Returns:
+        (located_df, rest_df): the located papers with the state_name, country_name and area_km2 of their
+        polygon, and the other papers, left to the matching by name.
+    """
+    if gazetteer is None:
+        gazetteer = get_gazetteer()
+    lats, lons = gazetteer.resolve_coordinates(paper_df["affiliation_city"], paper_df["affiliation_country"])
+    # Coordinates in the records come first
+    if "affiliation_lat" in paper_df and "affiliation_lon" in paper_df:
+        record_lats = pd.to_numeric(paper_df["affiliation_lat"], errors="coerce").to_numpy(dtype=float)
+        record_lons = pd.to_numeric(paper_df["affiliation_lon"], errors="coerce").to_numpy(dtype=float)
+        from_record = np.isfinite(record_lats) & np.isfinite(record_lons)
+        lats = np.where(from_record, record_lats, lats)
+        lons = np.where(from_record, record_lons, lons)
+    if not np.isfinite(lats).any():
+        return paper_df.iloc[:0], paper_df
+    if province_index is None:
+        province_index = get_province_index()
+    if province_index is None:
+        return paper_df.iloc[:0], paper_df
+
+    features = province_index.locate(lats, lons)
+    located = features >= 0
+    located_df = paper_df[located].assign(
+        state_name=province_index.names[features[located]],
+        country_name=province_index.countries[features[located]],
+    )
+    located_df = located_df.merge(
+        AREA_DF[["state_name", "country_name", "area_km2"]].astype({"state_name": object, "country_name": object})
+            .drop_duplicates(subset=["state_name", "country_name"]),
+        on=["state_name", "country_name"],
+        how="left"
+    )
+    selected_columns = ["state_name", "affiliation_state", "affiliation_country", "affiliation_name","citied_by", "cover_date","country_name","area_km2"]
+    return located_df[selected_columns], paper_df[~located]
+
+def match_nocode_state(unmatched_df, matcher=None):
     """
     This function inputs a dataframe where some samples' "affiliation_state" is not a code like "CA", "IL"
     Instead, it just gives us the state/province full name
@@ -92,9 +159,16 @@ def match_nocode_state(unmatched_df):
     Returns:
         New dataframe after match.
     """
-    unmatched_df = unmatched_df.merge(
+    if matcher is None:
+        matcher = get_state_matcher(AREA_DF)
+    # Names that are not exactly a province name are matched fuzzily within their country (see fuzzy_match.py)
+    state = unmatched_df['affiliation_state'].astype(object)
+    inexact = ~state.isin(AREA_NAMES)
+    fuzzy = pd.Series(None, index=state.index, dtype=object)
+    fuzzy[inexact] = matcher.match_states(state[inexact], unmatched_df['affiliation_country'][inexact])
+    unmatched_df = unmatched_df.assign(match_key=state.where(fuzzy.isna(), fuzzy)).merge(
             AREA_DF,
-            left_on= 'affiliation_state',
+            left_on= 'match_key',
             right_on = "state_name",
             how="left"
         )
@@ -103,6 +177,7 @@ def match_nocode_state(unmatched_df):
     unmatched_df = unmatched_df[selected_columns]
     return unmatched_df
     
+@instrument()
 def building_state_df(data,output_filename):
     """
     This function inputs a json file consists of the information for each paper
@@ -111,10 +186,13 @@ def building_state_df(data,output_filename):
         The return is a csv file map the affiliation state to its area.
         We also do some calculations to construct an index of the academic power within the state
         Each piece of data is a state with its area square kilometers included.
+        With output_filename None, the dataframe is only returned.
     """
-    output_filename = Path(output_filename)
-    paper_df = pd.DataFrame(data)
+    paper_df = apply_paper_schema(pd.DataFrame(data))
     paper_df = clean_columns(paper_df, ["affiliation_name", "affiliation_state","affiliation_city","affiliation_country"])
+
+    # Papers with coordinates are placed in their province polygon, the others are matched by name below
+    located_df, paper_df = locate_papers(paper_df)
     state_na = paper_df[paper_df["affiliation_state"] == "na"]
     
     # First I matched the data with "NA" in "affiliation_state"
@@ -160,67 +238,141 @@ def building_state_df(data,output_filename):
     
     # Merge the re-matched duplicate dataframe with the no-duplicate dataframe
     no_duplicate_df = cleaned_df[~cleaned_df['state_name'].isin(DUPLICATE_STATES)]
-    final_df = pd.concat([no_duplicate_df, duplicate_final_df], ignore_index=True)
-    final_df["citied_by"] = pd.to_numeric(final_df["citied_by"], errors="coerce")
-    final_df.to_csv(output_filename, index=False, sep=';', encoding='utf-8')
+    final_df = pd.concat([no_duplicate_df, duplicate_final_df] + ([located_df] if len(located_df) else []), ignore_index=True)
+    # The merges above turn some columns back into strings
+    final_df = apply_paper_schema(final_df)
+    if output_filename is not None:
+        final_df.to_csv(output_filename, index=False, sep=';', encoding='utf-8')
+        count_file_written(output_filename, "state_paper")
     return final_df
 
-def calculate_crdi(final_df, output_filename, year):
+def affiliation_regions(affiliations, afid_states):
+    """
+    This function inputs the affiliations table of the authorship tables and the afid -> state dictionary.
+
+    Returns:
+        A Series afid -> state_name, matched like the papers in building_state_df, so the regions are
+        the ones of the map. Affiliations that can't be matched are left out.
+    """
+    # The afid stands in for the affiliation name, so each matched row can be traced back to its affiliation
+    data = pd.DataFrame({
+        "affiliation_name": affiliations["afid"],
+        "affiliation_state": affiliations["afid"].map(afid_states).fillna("NA"),
+        "affiliation_city": affiliations["affiliation_city"],
+        "affiliation_country": affiliations["affiliation_country"],
+        "citied_by": 0,
+        "cover_date": "",
+    })
+    matched = building_state_df(data, None).dropna(subset=["state_name"])
+    matched = matched[matched["state_name"] != ""].drop_duplicates(subset="affiliation_name")
+    return matched.set_index("affiliation_name")["state_name"]
+
+def city_regions(papers):
+    """
+    This function inputs a dataframe of paper records (affiliation_city, affiliation_country, affiliation_state).
+
+    Returns:
+        A dataframe of affiliation_city, affiliation_country and state_name for the papers whose state is
+        known and matched to a region like in building_state_df, which the gazetteer is built from.
+    """
+    papers = papers[papers["affiliation_state"].astype(object).fillna("NA") != "NA"].reset_index(drop=True)
+    # The row number stands in for the affiliation name, so each matched row can be traced back to its city
+    data = pd.DataFrame({
+        "affiliation_name": papers.index.astype(str),
+        "affiliation_state": papers["affiliation_state"],
+        "affiliation_city": papers["affiliation_city"],
+        "affiliation_country": papers["affiliation_country"],
+        "citied_by": 0,
+        "cover_date": "",
+    })
+    matched = building_state_df(data, None).dropna(subset=["state_name"])
+    matched = matched[matched["state_name"] != ""].drop_duplicates(subset="affiliation_name")
+    rows = matched["affiliation_name"].astype(str).astype(int).to_numpy()
+    return pd.DataFrame({
+        "affiliation_city": papers["affiliation_city"].to_numpy()[rows],
+        "affiliation_country": papers["affiliation_country"].to_numpy()[rows],
+        "state_name": matched["state_name"].astype(object).to_numpy(),
+    })
+
+@instrument()
+def calculate_crdi(final_df, output_filename, year, aggregate_df=None):
     """
     This function inputs a dataframe of the cleaned/matched paper data.
+    If the aggregate table of those papers was already built (build_aggregate_table), pass it as aggregate_df.
     
     Returns:
         We will use total_paper_num, total_cited_num within the state to conduct a research index crdi for each state.
     """
-    final_df = final_df.dropna(subset=["state_name","affiliation_country","area_km2",])
-    final_df = final_df.assign(
+    # One pass over the papers gives the per-state frame directly; the CRDI model is then
+    # evaluated on it as vectorized expressions (see index_engine.CRDI_INDICES)
+    if aggregate_df is None:
+        aggregate_df = build_aggregate_table(final_df)
+    state_df = evaluate_indices(aggregate_df, CRDI_INDICES)
+    state_df = state_df.assign(
         year=year,
-        month=final_df["cover_date"].str.extract(r"-(\d{2})-").astype(int)
-    )   
-
-    # Calculate_total num of papers for a state/province
-    paper_counts = final_df.groupby(["state_name","affiliation_country"]).size().reset_index(name="total_paper_num")
-    
-    # Calculate_total num of total citations for a city
-    citied_counts = final_df.groupby(["state_name","affiliation_country"])["citied_by"].sum().reset_index(name="total_cited_num")
-    
-    # Conduct CRDI model and calculate the academic index for each state/province
-    final_df = final_df.merge(paper_counts[["state_name","total_paper_num"]], on="state_name", how="left")
-    final_df = final_df.merge(citied_counts[["state_name","total_cited_num"]], on="state_name", how="left")
-    final_df["paper_num_density"] = final_df["total_paper_num"] / np.log(final_df["area_km2"] + 1)
-    final_df["citation_density"] = final_df["total_cited_num"] / np.log(final_df["area_km2"] + 1)
-    final_df["academic_index"] = final_df["total_cited_num"] / (final_df["total_paper_num"] + 1)
-    final_df["crdi_index"] = (final_df["paper_num_density"] + final_df["citation_density"] + final_df["academic_index"]) / 3
-    final_df = final_df[(final_df["state_name"] != "") & (final_df["affiliation_country"] != "")]
+        month=state_df["cover_date"].dt.month.astype("int16"),
+    )
 
     selected_columns = ["state_name", "affiliation_state", "affiliation_country", "total_paper_num","total_cited_num", "area_km2", "paper_num_density", "citation_density", "academic_index", "crdi_index","year","month"]
-    final_df = final_df[selected_columns]
-    final_df = final_df[selected_columns].drop_duplicates(subset=["state_name", "affiliation_country"], keep="first")
-    final_df = final_df.sort_values(by="crdi_index", ascending=False)
+    state_df = state_df[selected_columns]
+    state_df = state_df.sort_values(by="crdi_index", ascending=False)
 
     # Output the file
-    final_df.to_csv(output_filename, index=False, sep=';', encoding='utf-8')
-    return final_df
+    state_df.to_csv(output_filename, index=False, sep=';', encoding='utf-8')
+    count_file_written(output_filename, "state_crdi")
+    return state_df
     
+def summarize_crdi(crdi_by_year, output_filename):
+    """
+    This function inputs a dictionary. Keys are the years and values are the crdi dataframes from calculate_crdi.
+    
+    Returns:
+        A json file with the summary statistics of crdi_index over all the years (min, max, quantiles and
+        equal-frequency color bin edges) and per year (min, max), so the map can set a shared color scale
+        without reading every year's csv first.
+    """
+    all_crdi = pd.concat([df["crdi_index"] for df in crdi_by_year.values()], ignore_index=True).dropna()
+    if all_crdi.empty:
+        summary = {"years": sorted(crdi_by_year), "count": 0}
+    else:
+        quantile_levels = np.linspace(0, 1, N_COLOR_BINS + 1)
+        summary = {
+            "years": sorted(crdi_by_year),
+            "count": int(all_crdi.size),
+            "min": float(all_crdi.min()),
+            "max": float(all_crdi.max()),
+            "quantiles": {str(q): float(all_crdi.quantile(q)) for q in CRDI_QUANTILES},
+            "color_bins": all_crdi.quantile(quantile_levels).tolist(),
+            "per_year": {
+                str(year): {"min": float(df["crdi_index"].min()), "max": float(df["crdi_index"].max())}
+                for year, df in sorted(crdi_by_year.items()) if not df.empty
+            },
+        }
+    with open(output_filename, "w", encoding="utf-8") as f:
+        json.dump(summary, f, indent=4)
+    return summary
+
 def get_top_citations(final_df, output_filename):
     """
     This function inputs a dataframe and outputs a csv file with all the institutions with affiliation numbers
     from high to low
     """
-    final_df["citied_by"] = pd.to_numeric(final_df["citied_by"], errors="coerce")
-    grouped_df = final_df.groupby(['affiliation_name', 'state_name','affiliation_country'], as_index=False)['citied_by'].sum()
+    final_df = apply_paper_schema(final_df)
+    grouped_df = final_df.groupby(['affiliation_name', 'state_name','affiliation_country'], as_index=False, observed=True)['citied_by'].sum()
     grouped_df = grouped_df.sort_values(by='citied_by', ascending=False)
     grouped_df.to_csv( output_filename, index=False,  sep=';', encoding='utf-8')
 
-def building_wordfrq_dict(data, output_filename: Path):
+@instrument()
+def building_wordfrq_dict(data, output_filename: Path = None, keywords=KEY_WORDS):
     """
     This function deals with the text data of the papers. 
-    The input is the json data we get from api calling.
+    The input is the json data we get from api calling, and the (lowercase, no space) search keyword
+    whose own words are left out of the counts.
     
     Returns:
-        The return is a csv file consists of the word frequency for each year.
+        The word frequency Counter of the year. If output_filename is given, the full
+        vocabulary is also written to a csv file (the pipeline keeps it in a WordFreqStore instead).
     """
-    output_filename = Path(output_filename)
     paper_df = pd.DataFrame(data)
     abstract_list = paper_df["Abstract"].tolist()
     full_text = ignore(remove(" ".join(abstract_list).lower().split()))
@@ -228,51 +380,81 @@ def building_wordfrq_dict(data, output_filename: Path):
     filtered_list = []
     for word in processed_list:
         is_keyword_substring = False
-        if word in KEY_WORDS:
+        if word in keywords:
             is_keyword_substring  = True
         # We don't want to include the words already in the keywords for word frequency
         if not is_keyword_substring:
             filtered_list.append(word)
 
     word_freq = Counter(filtered_list)
-    word_freq_df = pd.DataFrame(word_freq.items(), columns=["word", "frequency"])
-    word_freq_df.to_csv(output_filename, index=False, encoding="utf-8")
+    if output_filename is not None:
+        word_freq_df = pd.DataFrame(word_freq.items(), columns=["word", "frequency"])
+        word_freq_df.to_csv(Path(output_filename), index=False, encoding="utf-8")
     return word_freq
 
-def plot_word_cloud(word_freq, output_filename: Path):
-    wordcloud = WordCloud(background_color='white').generate_from_frequencies(word_freq)
-    plt.figure(figsize=(10, 8))
-    plt.imshow(wordcloud, interpolation='bilinear')
-    plt.axis('off')
-    plt.savefig(output_filename, format='png', dpi=300)
+def plot_word_cloud(word_freq, output_filename: Path, dpi=300, image_format="png"):
+    """
+    Renders the word cloud of one year. Use render_batch to render several years at once.
+    """
+    return render_word_cloud(word_freq, output_filename, dpi, image_format)
 
-if __name__ == "__main__":
+@instrument()
+def run_cleaning(keyword, years=YEARS):
+    """
+    Runs the whole cleaning & processing step for one keyword (lowercase, no space).
+    The papers are read from the paper store, or from data/raw_data/{keyword}_{year}_paper.json.
+    """
     yearly_wordfrq_dict = {}
-    for year in YEARS:
-        data_file_name = f"data/raw_data/{KEY_WORDS}_{year}_paper.json"
-        with open(data_file_name, 'r', encoding='utf-8') as f:
-            data = json.load(f)
+    crdi_by_year = {}
+    word_cloud_jobs = []
+    afid_states = load_afid_states()
+    for year in years:
+        data = load_papers(keyword, year, CLEANING_COLUMNS)
         # Get the geography data for papers
-        state_df = building_state_df(data,f"data/output_data/paper/{KEY_WORDS}_{year}_state_paper.csv")
+        state_df = building_state_df(data,f"data/output_data/paper/{keyword}_{year}_state_paper.csv")
         print(f"✅Finished {year} building state dataframe! 😊")
-        get_top_citations(state_df, f"data/output_data/institutions/{KEY_WORDS}_{year}_institution_citation.csv" )
-        
+        get_top_citations(state_df, f"data/output_data/institutions/{keyword}_{year}_institution_citation.csv" )
+        # With the raw entries, every author and affiliation of a paper is counted (fractionally)
+        raw_entries = load_raw_entries(keyword, year)
+        if raw_entries:
+            with span("normalize_entries"):
+                authorship_tables = normalize_entries(raw_entries)
+            save_tables(authorship_tables, f"data/output_data/authorship/{keyword}_{year}")
+            fractional_counts(authorship_tables, afid_states).to_csv(
+                f"data/output_data/institutions/{keyword}_{year}_fractional_counts.csv", index=False, encoding='utf-8')
+            print(f"✅Finished {year} authorship tables! 🧑‍🔬")
+            # Links between institutions, and between the regions of the map
+            with span("build_collaboration"):
+                regions = affiliation_regions(authorship_tables["affiliations"], afid_states)
+                build_collaboration(authorship_tables, regions, f"data/output_data/collaboration/{keyword}_{year}")
+            print(f"✅Finished {year} collaboration network! 🤝")
+
         # Build crdi index to take the sqaure meteres of a state/ province into consideration
-        calculate_crdi(state_df,f"data/output_data/state_crdi/{KEY_WORDS}_{year}_state_crdi.csv",year)
-        word_freq = building_wordfrq_dict(data, f"data/output_data/word_frq/{KEY_WORDS}_{year}_word_frequency.csv")
+        # The papers are grouped once; the crdi and all the index variants are computed from the same table
+        aggregate_df = build_aggregate_table(state_df)
+        crdi_by_year[year] = calculate_crdi(state_df,f"data/output_data/state_crdi/{keyword}_{year}_state_crdi.csv",year, aggregate_df)
+        calculate_index_variants(aggregate_df, f"data/output_data/state_indices/{keyword}_{year}_state_indices.csv", year)
+        word_freq = building_wordfrq_dict(data, keywords=keyword)
         yearly_wordfrq_dict[year] = word_freq
-        plot_word_cloud(word_freq, f"data/output_data/wordcloud/{KEY_WORDS}_{year}_word_cloud.png")
-        print(f"✅Finished {year} word visualizations!      😆") 
-    generate_word_frq_yearlygif(yearly_wordfrq_dict)
+        word_cloud_jobs.append((render_word_cloud, word_freq, f"data/output_data/wordcloud/{keyword}_{year}_word_cloud.png"))
+        print(f"✅Finished {year} word frequency!      😆") 
+    # The affiliation values normalized and the state names matched in this run are reused by the next ones
+    get_normalization_cache().save()
+    get_state_matcher(AREA_DF).save()
+    summarize_crdi(crdi_by_year, f"data/output_data/state_crdi/{keyword}_crdi_summary.json")
+    # Render all the years' word clouds in parallel, together with low-resolution previews
+    with span("render_word_clouds"):
+        render_batch(word_cloud_jobs, image_format=IMAGE_FORMAT, preview_dpi=PREVIEW_DPI)
+    print("✅Finished word visualizations!      😆")
+    # One compact file per keyword with every year's counts and precomputed top words
+    word_store = WordFreqStore.from_yearly(yearly_wordfrq_dict)
+    word_store.save(f"data/output_data/word_frq/{keyword}_word_frequency.npz")
+    generate_word_frq_yearlygif(word_store, output_filename=dynamic_wordfrq_filename(keyword))
     print("✅Finished all data cleaning & processing!🤩")
+
+if __name__ == "__main__":
+    with profiled("cleaning"):
+        run_cleaning(KEY_WORDS)
+    write_metrics("cleaning")
     print()
     print("✅🎉 Now let's go to map visualizations.....")
-
-
-
-    
-   
-   
-
-
-
@@ -0,0 +1,157 @@
+import numpy as np
+import pandas as pd
+from pathlib import Path
+from scipy import sparse
+
+# Power iteration settings of the centralities
+MAX_ITERATIONS = 200
+TOLERANCE = 1e-10
+DAMPING = 0.85
+
+
+def incidence_matrix(tables):
+    """
+    This function inputs the normalized authorship tables (see authorship.normalize_entries).
+
+    Returns:
+        A papers x affiliations CSR matrix with a 1 where the paper has an author from the affiliation.
+    """
+    edges = tables["authorship"]
+    edges = edges[edges["affiliation_id"] >= 0]
+    shape = (len(tables["papers"]), len(tables["affiliations"]))
+    incidence = sparse.csr_matrix(
+        (np.ones(len(edges), dtype=np.float64), (edges["paper_id"].to_numpy(), edges["affiliation_id"].to_numpy())),
+        shape=shape,
+    )
+    # An affiliation listed by several authors of a paper still takes part in the paper once
+    incidence.data[:] = 1.0
+    return incidence
+
+
+def coauthorship_matrix(tables):
+    """
+    Builds the affiliation x affiliation co-authorship matrix A = B^T W B, with B the paper incidence.
+
+    Every paper with k > 1 affiliations gives each pair of them 1 / (k - 1) (Newman's weighting), so
+    each affiliation gets a total weight of 1 per co-authored paper, however many partners it had.
+    Papers with a single affiliation add nothing; the diagonal is dropped.
+
+    Returns:
+        A symmetric CSR matrix; its size only grows with the number of co-authoring pairs.
+    """
+    incidence = incidence_matrix(tables)
+    k = np.asarray(incidence.sum(axis=1)).ravel()
+    weights = np.divide(1.0, k - 1, out=np.zeros_like(k), where=k > 1)
+    matrix = (incidence.T @ sparse.diags(weights) @ incidence).tocsr()
+    matrix.setdiag(0)
+    matrix.eliminate_zeros()
+    return matrix
+
+
+def region_matrix(affiliations, afid_regions):
+    """
+    This function inputs the affiliations table and a Series mapping afid -> region (the state_name of the map).
+
+    Returns:
+        (R, regions): an affiliations x regions CSR indicator matrix and the region names of its columns.
+        Affiliations without a region have an empty row.
+    """
+    region = affiliations["afid"].map(afid_regions)
+    codes, regions = pd.factorize(region)
+    rows = np.flatnonzero(codes >= 0)
+    indicator = sparse.csr_matrix(
+        (np.ones(len(rows)), (rows, codes[rows])), shape=(len(affiliations), len(regions))
+    )
+    return indicator, regions
+
+
+def region_flows(matrix, indicator, regions):
+    """
+    Aggregates the co-authorship matrix to regions: F = R^T A R.
+
+    Returns:
+        One row per pair of regions that collaborate, source_region <= target_region, with the
+        collaboration weight; rows with source_region == target_region are collaborations within a region.
+    """
+    flows = sparse.triu(indicator.T @ matrix @ indicator).tocoo()
+    regions = np.asarray(regions, dtype=object)
+    # Off-diagonal pairs appear twice in the symmetric matrix, the diagonal once per direction of each pair
+    weight = np.where(flows.row == flows.col, flows.data / 2, flows.data)
+    names = np.stack([regions[flows.row], regions[flows.col]])
+    names.sort(axis=0)
+    flows_df = pd.DataFrame({"source_region": names[0], "target_region": names[1], "weight": weight})
+    return flows_df.sort_values("weight", ascending=False, ignore_index=True)
+
+
+def _power_iteration(step, n):
+    vector = np.full(n, 1.0 / n)
+    for _ in range(MAX_ITERATIONS):
+        updated = step(vector)
+        if np.abs(updated - vector).sum() < TOLERANCE:
+            return updated
+        vector = updated
+    return vector
+
+
+def centralities(matrix):
+    """
+    Computes the centralities of every affiliation of the co-authorship matrix with sparse products only.
+
+    Returns:
+        A dataframe indexed by affiliation_id with
+            degree        number of distinct partner affiliations
+            strength      total collaboration weight
+            eigenvector   eigenvector centrality (power iteration on A + I), scaled to max 1
+            pagerank      PageRank with damping DAMPING
+    """
+    n = matrix.shape[0]
+    if n == 0:
+        return pd.DataFrame(columns=["degree", "strength", "eigenvector", "pagerank"])
+    degree = np.diff(matrix.indptr)
+    strength = np.asarray(matrix.sum(axis=1)).ravel()
+
+    # Adding the identity keeps the power iteration from oscillating on bipartite-like graphs
+    shifted = matrix + sparse.identity(n, format="csr")
+    def eigen_step(vector):
+        updated = shifted @ vector
+        return updated / np.abs(updated).sum()
+    eigenvector = _power_iteration(eigen_step, n)
+    eigenvector = eigenvector / eigenvector.max()
+
+    # Row-normalized transition matrix; affiliations without partners spread their rank evenly
+    inverse_strength = np.divide(1.0, strength, out=np.zeros_like(strength), where=strength > 0)
+    transition_t = (sparse.diags(inverse_strength) @ matrix).T.tocsr()
+    dangling = strength == 0
+    def pagerank_step(vector):
+        return DAMPING * (transition_t @ vector + vector[dangling].sum() / n) + (1 - DAMPING) / n
+    pagerank = _power_iteration(pagerank_step, n)
+
+    result = pd.DataFrame({"degree": degree, "strength": strength, "eigenvector": eigenvector, "pagerank": pagerank})
+    result.index.name = "affiliation_id"
+    return result
+
+
+def build_collaboration(tables, afid_regions, output_prefix=None):
+    """
+    This function inputs the normalized authorship tables of one keyword/year and a Series afid -> region.
+
+    Returns:
+        A dict with the co-authorship matrix, the region flows and the affiliation centralities.
+        With output_prefix, they are saved as {output_prefix}_coauthorship.npz, _region_flows.csv
+        and _centrality.csv.
+    """
+    matrix = coauthorship_matrix(tables)
+    indicator, regions = region_matrix(tables["affiliations"], afid_regions)
+    flows = region_flows(matrix, indicator, regions)
+    centrality = centralities(matrix).join(
+        tables["affiliations"].set_index("affiliation_id")[["afid", "affiliation_name"]]
+    )
+    centrality["region"] = centrality["afid"].map(afid_regions)
+    centrality = centrality.sort_values("pagerank", ascending=False)
+    if output_prefix is not None:
+        output_prefix = Path(output_prefix)
+        output_prefix.parent.mkdir(parents=True, exist_ok=True)
+        sparse.save_npz(output_prefix.with_name(f"{output_prefix.name}_coauthorship.npz"), matrix)
+        flows.to_csv(output_prefix.with_name(f"{output_prefix.name}_region_flows.csv"), index=False, sep=';', encoding='utf-8')
+        centrality.to_csv(output_prefix.with_name(f"{output_prefix.name}_centrality.csv"), sep=';', encoding='utf-8')
+    return {"matrix": matrix, "flows": flows, "centrality": centrality}
@@ -7,11 +7,15 @@ from sklearn.linear_model import Lasso
 from pathlib import Path
 from sklearn.feature_extraction.text import CountVectorizer
 from .utils import remove,ignore
-import matplotlib.pyplot as plt
+from .render import render_feature_coefs, render_batch, PREVIEW_DPI, IMAGE_FORMAT
+from ..storage.paper_store import load_papers
+from ..instrumentation import instrument, span, profiled, write_metrics
 import os
 
 KEY_WORDS = os.environ.get("SEARCH_KEYWORD", "default_keyword_if_none").lower().replace(" ","")
 YEARS = [2020,2021,2022,2023,2024]
+# The paper fields the model uses, only these are loaded from the paper store
+FEATURE_COLUMNS = ["paper_title", "paper_author", "citied_by"]
 
 def preprocess_title(title):
     title = title.lower()
@@ -20,15 +24,18 @@ def preprocess_title(title):
     words = ignore(remove(words))
     return ' '.join(words)
 
-def get_feature(data_filename, output_filename: Path):
+@instrument()
+def fit_top_features(data):
     """
-    This function inputs a json file consists of the information for each paper. It will build a Lasso
-    Model to select the top features with high absolute value for the num_of_citations.
+    This function inputs a json file consists of the information for each paper (or its loaded records).
+    It will build a Lasso Model to select the top features with high absolute value for the num_of_citations.
     
-    It will plot the coefficients for the top 30 features.
+    Returns:
+        A series with the coefficients of the top 30 features.
     """
-    with open(data_filename, 'r', encoding='utf-8') as f:
-        data = json.load(f)
+    if isinstance(data, (str, Path)):
+        with open(data, 'r', encoding='utf-8') as f:
+            data = json.load(f)
     paper_df = pd.DataFrame(data)
     paper_df["cleaned_title"] = paper_df["paper_title"].apply(preprocess_title)
     
@@ -58,19 +65,29 @@ def get_feature(data_filename, output_filename: Path):
     coef_series = pd.Series(lasso.coef_, index=X.columns)
     non_zero_coefs = coef_series[coef_series != 0].sort_values(key=abs, ascending=False)
     top_30_features = non_zero_coefs.head(30)
-    inverse_top_30_features = top_30_features.iloc[::-1]
-    
-    # I used red to display the positive value and blue for the negative
-    colors = ['red' if coef > 0 else 'blue' for coef in inverse_top_30_features.values]
-    plt.figure(figsize=(10, 6))
-    bars = plt.barh(inverse_top_30_features.index, inverse_top_30_features.values, color=colors, alpha=0.7)
-    plt.axvline(0, color='black', linestyle='--', linewidth=1)
-    plt.xlabel("Coefficient Value")
-    plt.ylabel("Variables")
-    plt.title("Top 30 Lasso Regression Coefficients")
-    plt.savefig(output_filename, format='png', dpi=300)
+    return top_30_features
+
+@instrument()
+def get_feature(data_filename, output_filename: Path, dpi=300, image_format="png"):
+    """
+    Fits the Lasso model for one year and plots the coefficients for the top 30 features.
+    """
+    top_30_features = fit_top_features(data_filename)
+    return render_feature_coefs(top_30_features, output_filename, dpi, image_format)
+
+def run_feature_selection(keyword, years=YEARS):
+    """
+    Fits the Lasso model of every year for one keyword (lowercase, no space) and renders the coefficients.
+    """
+    feature_jobs = []
+    for year in years:
+        top_30_features = fit_top_features(load_papers(keyword, year, FEATURE_COLUMNS))
+        feature_jobs.append((render_feature_coefs, top_30_features, f"data/output_data/features/{keyword}_{year}_features.png"))
+    # The fits are cheap, the 300-dpi plots are not: render all the years in parallel
+    with span("render_features"):
+        return render_batch(feature_jobs, image_format=IMAGE_FORMAT, preview_dpi=PREVIEW_DPI)
 
 if __name__ == "__main__":
-    for year in YEARS:
-        data_file_name = f"data/raw_data/{KEY_WORDS}_{year}_paper.json"  
-        get_feature(data_file_name, f"data/output_data/features/{KEY_WORDS}_{year}_features.png")
+    with profiled("feature_selection"):
+        run_feature_selection(KEY_WORDS)
+    write_metrics("feature_selection")
@@ -0,0 +1,223 @@
+"""
+Fuzzy matching of the state/province and country names that are not exactly a name of provinces_area.json.
+
+match_nocode_state and clean_duplicates merged on equal (normalized) names, so spelling variants
+("sindh" for "sind", "stockholms" for "stockholm", "tunapuna-piarco" for "tunapuna/piarco") and the Scopus
+country names ("russianfederation" for "russia") were left unmatched. StateMatcher resolves a name within
+its country:
+    1. STATE_ALIASES, the English and local names trigrams can't relate ("bavaria" for "bayern"), then the
+       alias table: every name resolved before, or set by hand;
+    2. the name with the same letters and digits, punctuation aside;
+    3. the closest name by the Dice similarity of their character trigrams, found through an inverted
+       trigram index of the country's names; it is kept from FUZZY_THRESHOLD and if no other name is as close.
+Each distinct (name, country) pair is resolved once per batch, and the outcome, a match or no match, is added
+to the alias table saved in data/raw_data/state_aliases.json, so later runs only look it up.
+"""
+import json
+import re
+from pathlib import Path
+import numpy as np
+import pandas as pd
+from .normalization import map_pairs
+
+ALIAS_TABLE_PATH = "data/raw_data/state_aliases.json"
+# From 0.72: "lisbon"/"lisboa" (0.71) is as close as "westyorkshire"/"westberkshire", so such pairs go to STATE_ALIASES
+FUZZY_THRESHOLD = 0.72
+# Shorter names (state codes like "mi", "ts") are only matched exactly
+MIN_FUZZY_LENGTH = 4
+# Scopus country names -> provinces_area.json country names, both normalized, where they differ
+COUNTRY_ALIASES = {
+    "russianfederation": "russia",
+    "serbia": "republicofserbia",
+    "turkiye": "turkey",
+    "coted'ivoire": "ivorycoast",
+    "hongkong": "hongkongs.a.r.",
+    "macao": "macaus.a.r",
+    "macau": "macaus.a.r",
+    "bruneidarussalam": "brunei",
+    "syrianarabrepublic": "syria",
+    "tanzania": "unitedrepublicoftanzania",
+    "bahamas": "thebahamas",
+    "congo": "republicofthecongo",
+    "democraticrepubliccongo": "democraticrepublicofthecongo",
+    "libyanarabjamahiriya": "libya",
+    "timor-leste": "easttimor",
+    "caboverde": "capeverde",
+    "eswatini": "swaziland",
+    "northmacedonia": "macedonia",
+    "laopeople'sdemocraticrepublic": "laos",
+}
+# Names in use in the affiliations -> provinces_area.json names, per provinces country, all normalized
+STATE_ALIASES = {
+    "austria": {"vienna": "wien", "styria": "steiermark", "tyrol": "tirol", "carinthia": "karnten",
+                "upperaustria": "oberosterreich", "loweraustria": "niederosterreich"},
+    "czechrepublic": {"southmoravianregion": "jihomoravsky"},
+    "germany": {"bavaria": "bayern", "lowersaxony": "niedersachsen", "northrhine-westphalia": "nordrhein-westfalen",
+                "saxony": "sachsen", "saxony-anhalt": "sachsen-anhalt", "hesse": "hessen", "thuringia": "thuringen",
+                "rhineland-palatinate": "rheinland-pfalz"},
+    "greece": {"attica": "attiki", "centralmacedonia": "kentrikimakedonia", "crete": "kriti",
+               "easternmacedoniaandthrace": "anatolikimakedoniakaithraki", "westerngreece": "dytikiellada"},
+    "italy": {"rome": "roma", "milan": "milano", "naples": "napoli", "florence": "firenze", "venice": "venezia",
+              "genoa": "genova", "padua": "padova"},
+    "mexico": {"mexico,d.f": "distritofederal", "mexico,d.f.": "distritofederal", "mexicocity": "distritofederal",
+               "ciudaddemexico": "distritofederal"},
+    "portugal": {"lisbon": "lisboa"},
+    "spain": {"biscay": "bizkaia", "seville": "sevilla", "navarre": "navarra"},
+}
+NON_ALPHANUMERIC = re.compile(r"[^a-z0-9]")
+
+
+def _key(name):
+    return NON_ALPHANUMERIC.sub("", name)
+
+
+def _trigrams(key):
+    padded = f"  {key} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class NameIndex:
+    """
+    The names of one country (or the country names), indexed by their letters and digits and by trigram.
+    """
+
+    def __init__(self, names):
+        self.names = sorted(set(names))
+        self.name_set = set(self.names)
+        # Names that only differ by punctuation share a key, which then matches none of them
+        self.by_key = {}
+        for name in self.names:
+            key = _key(name)
+            self.by_key[key] = None if key in self.by_key else name
+        postings = {}
+        self.sizes = np.zeros(len(self.names), dtype=np.int64)
+        for i, name in enumerate(self.names):
+            grams = _trigrams(_key(name))
+            self.sizes[i] = len(grams)
+            for gram in grams:
+                postings.setdefault(gram, []).append(i)
+        self.postings = {gram: np.array(ids, dtype=np.int64) for gram, ids in postings.items()}
+
+    def closest(self, name, threshold=FUZZY_THRESHOLD):
+        """
+        Returns the indexed name matching name, or None: the same name, the one with the same letters and
+        digits, or the single closest one by trigram similarity from threshold.
+        """
+        if name in self.name_set:
+            return name
+        key = _key(name)
+        if key in self.by_key:
+            return self.by_key[key]
+        if len(key) < MIN_FUZZY_LENGTH:
+            return None
+        grams = _trigrams(key)
+        ids = [self.postings[gram] for gram in grams if gram in self.postings]
+        if not ids:
+            return None
+        shared = np.bincount(np.concatenate(ids), minlength=len(self.names))
+        scores = 2 * shared / (len(grams) + self.sizes)
+        best = scores.max()
+        if best < threshold or np.count_nonzero(scores == best) > 1:
+            return None
+        return self.names[int(scores.argmax())]
+
+
+class StateMatcher:
+    """
+    Matches state and country names to the ones of a provinces dataframe (state_name, country_name, both
+    normalized), through the alias table of the names resolved before.
+    """
+
+    def __init__(self, area_df, path=ALIAS_TABLE_PATH, threshold=FUZZY_THRESHOLD):
+        self.path = Path(path)
+        self.threshold = threshold
+        self.aliases = {"countries": {}, "states": {}}
+        self.dirty = False
+        if self.path.exists():
+            with open(self.path, "r", encoding="utf-8") as f:
+                self.aliases.update(json.load(f))
+        states = area_df[["state_name", "country_name"]].astype(object).dropna().drop_duplicates()
+        states = states[states["state_name"] != ""]
+        self.indexes = {country: NameIndex(names) for country, names in states.groupby("country_name")["state_name"]}
+        self.country_index = NameIndex(self.indexes)
+
+    def _resolve(self, table, name, resolve):
+        if name in table:
+            return table[name]
+        result = resolve()
+        table[name] = result
+        self.dirty = True
+        return result
+
+    def match_country(self, country):
+        """
+        Returns the provinces' name of a (normalized) country, or None.
+        """
+        if not isinstance(country, str) or country == "":
+            return None
+        if country in self.indexes:
+            return country
+        if country in COUNTRY_ALIASES:
+            return COUNTRY_ALIASES[country]
+        return self._resolve(self.aliases["countries"], country,
+                             lambda: self.country_index.closest(country, self.threshold))
+
+    def match_state(self, name, country):
+        """
+        Returns the provinces' name of a (normalized) state within its country, or None.
+        """
+        area_country = self.match_country(country)
+        if not isinstance(name, str) or name == "" or area_country not in self.indexes:
+            return None
+        index = self.indexes[area_country]
+        if name in index.name_set:
+            return name
+        if name in STATE_ALIASES.get(area_country, {}):
+            return STATE_ALIASES[area_country][name]
+        return self._resolve(self.aliases["states"].setdefault(area_country, {}), name,
+                             lambda: index.closest(name, self.threshold))
+
+    def match_states(self, names, countries):
+        """
+        Matches each (state, country) pair of two aligned Series, once per distinct pair.
+
+        Returns:
+            A Series of matched state names with the index of names, None where there is no match.
+        """
+        return pd.Series(map_pairs(self.match_state, names, countries), index=names.index, dtype=object)
+
+    def match_countries(self, countries):
+        """
+        Matches each country of a Series, once per distinct country.
+
+        Returns:
+            A Series of provinces' country names with the index of countries, None where there is no match.
+        """
+        codes, uniques = pd.factorize(countries.astype(object), use_na_sentinel=False)
+        matched = np.empty(len(uniques), dtype=object)
+        matched[:] = [self.match_country(country) for country in uniques]
+        return pd.Series(matched[codes], index=countries.index, dtype=object)
+
+    def save(self):
+        """
+        Writes the alias table back to its file, if names were resolved.
+        """
+        if not self.dirty:
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.path, "w", encoding="utf-8") as f:
+            json.dump(self.aliases, f, ensure_ascii=False, indent=1, sort_keys=True)
+        self.dirty = False
+
+
+_MATCHER = None
+
+
+def get_state_matcher(area_df):
+    """
+    The state matcher of this process, built from area_df (AREA_DF) and ALIAS_TABLE_PATH on first use.
+    """
+    global _MATCHER
+    if _MATCHER is None:
+        _MATCHER = StateMatcher(area_df)
+    return _MATCHER
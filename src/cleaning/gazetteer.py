@@ -0,0 +1,202 @@
+"""
+Offline gazetteer of affiliation cities: (city, country) -> region, the state_name of provinces_area.json.
+
+Scopus leaves the state of many affiliations out ("NA"), and match_na_state could only place those papers
+when the city is itself a province name (capitals like Beijing). The gazetteer resolves the other cities
+with no API call. It is built from:
+    - the papers whose state is known: each city is mapped to the region its papers were matched to
+      (the most frequent one), so rebuilding it after new searches adds their cities;
+    - data/raw_data/city_gazetteer_seed.csv, a short hand-checked list of major research cities whose
+      region has another name (Moscow -> Moskva, Taipei -> Taipei City, ...). Cities split over several
+      regions (London, Hong Kong) are left out.
+
+The built index is a dict per normalized country of normalized city -> normalized region, saved to
+data/raw_data/city_gazetteer.json, so a lookup is two hash lookups. The seed cities also carry their
+coordinates, kept in a second dict of the same shape, which geocode.py places in the province polygons.
+
+    python -m src.cleaning.gazetteer            # rebuild the gazetteer from the paper records and the seed
+    python -m src.cleaning.gazetteer --report   # match rate on the "NA" state papers and lookup latency
+"""
+import argparse
+import json
+import time
+from pathlib import Path
+import numpy as np
+import pandas as pd
+from .normalization import normalize_text, map_pairs
+
+GAZETTEER_PATH = "data/raw_data/city_gazetteer.json"
+GAZETTEER_SEED_PATH = "data/raw_data/city_gazetteer_seed.csv"
+
+
+class Gazetteer:
+    """
+    The city -> region index, {normalized country: {normalized city: normalized region}}, and the
+    city -> [lat, lon] index of the cities whose coordinates are known, of the same shape.
+    """
+
+    def __init__(self, index=None, coordinates=None):
+        self.index = index or {}
+        self.coordinates = coordinates or {}
+
+    def __len__(self):
+        return sum(len(cities) for cities in self.index.values())
+
+    @classmethod
+    def load(cls, path=GAZETTEER_PATH):
+        """
+        Reads a built gazetteer. Without the file, the gazetteer is empty and resolves nothing.
+        """
+        path = Path(path)
+        if not path.exists():
+            return cls()
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        return cls(data["regions"], data.get("coordinates"))
+
+    def save(self, path=GAZETTEER_PATH):
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"regions": self.index, "coordinates": self.coordinates}, f,
+                      ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+
+    def lookup(self, city, country):
+        """
+        Returns the normalized region of a city, or None when the gazetteer doesn't know it.
+        """
+        return self.index.get(normalize_text(country), {}).get(normalize_text(city))
+
+    def lookup_coordinates(self, city, country):
+        """
+        Returns the (lat, lon) of a city, or None when the gazetteer doesn't know them.
+        """
+        coordinates = self.coordinates.get(normalize_text(country), {}).get(normalize_text(city))
+        return tuple(coordinates) if coordinates else None
+
+    def resolve(self, cities, countries):
+        """
+        Looks up the region of each (city, country) pair of two aligned Series, once per distinct pair.
+
+        Returns:
+            A Series of regions with the index of cities, None where the pair is unknown.
+        """
+        return pd.Series(map_pairs(self.lookup, cities, countries), index=cities.index, dtype=object)
+
+    def resolve_coordinates(self, cities, countries):
+        """
+        Looks up the coordinates of each (city, country) pair of two aligned Series, once per distinct pair.
+
+        Returns:
+            Two float arrays, the latitudes and longitudes, NaN where the pair is unknown.
+        """
+        found = map_pairs(self.lookup_coordinates, cities, countries)
+        lat_lon = np.array([pair if pair else (np.nan, np.nan) for pair in found], dtype=float).reshape(-1, 2)
+        return lat_lon[:, 0], lat_lon[:, 1]
+
+
+def build_gazetteer(observations, seed_path=GAZETTEER_SEED_PATH):
+    """
+    This function inputs a dataframe of affiliation_city, affiliation_country and state_name (the region
+    each paper was matched to), and the seed file.
+
+    Returns:
+        A Gazetteer mapping each city to the region most of its papers were matched to. Seed cities are
+        added where the papers don't place them, with their coordinates.
+    """
+    index = {}
+    coordinates = {}
+    observations = observations.dropna(subset=["affiliation_city", "affiliation_country", "state_name"])
+    keys = pd.DataFrame({
+        "country": observations["affiliation_country"].astype(object).map(normalize_text),
+        "city": observations["affiliation_city"].astype(object).map(normalize_text),
+        "region": observations["state_name"].astype(object).map(normalize_text),
+    })
+    keys = keys[(keys["city"] != "") & (keys["city"] != "na") & (keys["region"] != "")]
+    # The most frequent region of each city; ties go to the first in alphabetical order
+    counts = keys.value_counts().reset_index(name="n").sort_values(["n", "region"], ascending=[False, True])
+    for country, city, region in counts.drop_duplicates(["country", "city"])[["country", "city", "region"]].itertuples(index=False):
+        index.setdefault(country, {})[city] = region
+
+    if seed_path is not None and Path(seed_path).exists():
+        seed = pd.read_csv(seed_path, dtype={"city": str, "country": str, "state_name": str}, keep_default_na=False)
+        if "lat" not in seed:
+            seed = seed.assign(lat=np.nan, lon=np.nan)
+        for city, country, region, lat, lon in seed[["city", "country", "state_name", "lat", "lon"]].itertuples(index=False):
+            country, city = normalize_text(country), normalize_text(city)
+            index.setdefault(country, {}).setdefault(city, normalize_text(region))
+            if pd.notna(lat) and pd.notna(lon):
+                coordinates.setdefault(country, {})[city] = [float(lat), float(lon)]
+    return Gazetteer(index, coordinates)
+
+
+_GAZETTEER = None
+
+
+def get_gazetteer():
+    """
+    The gazetteer of this process, loaded from GAZETTEER_PATH on first use.
+    """
+    global _GAZETTEER
+    if _GAZETTEER is None:
+        _GAZETTEER = Gazetteer.load()
+    return _GAZETTEER
+
+
+def report(gazetteer, papers, area_names):
+    """
+    This function inputs a gazetteer, a dataframe of paper records and the normalized province names.
+
+    Returns:
+        A dict with the number of "NA" state papers, how many of them match a province by their city alone
+        (as before the gazetteer) and with the gazetteer, and the lookup latency in microseconds: per
+        lookup() call and per row of a resolve() over all of them.
+    """
+    na_papers = papers[papers["affiliation_state"].astype(object).fillna("NA") == "NA"]
+    cities = na_papers["affiliation_city"].astype(object).fillna("").map(normalize_text)
+    by_city = cities.isin(area_names)
+    resolved = gazetteer.resolve(na_papers["affiliation_city"], na_papers["affiliation_country"])
+
+    pairs = list(zip(na_papers["affiliation_city"], na_papers["affiliation_country"]))
+    start = time.perf_counter()
+    for city, country in pairs:
+        gazetteer.lookup(city, country)
+    lookup_time = time.perf_counter() - start
+    start = time.perf_counter()
+    gazetteer.resolve(na_papers["affiliation_city"], na_papers["affiliation_country"])
+    resolve_time = time.perf_counter() - start
+
+    n = max(len(na_papers), 1)
+    return {
+        "cities": len(gazetteer),
+        "na_papers": len(na_papers),
+        "matched_by_city": int(by_city.sum()),
+        "matched_with_gazetteer": int((by_city | resolved.notna()).sum()),
+        "lookup_us": lookup_time / n * 1e6,
+        "resolve_us_per_row": resolve_time / n * 1e6,
+    }
+
+
+if __name__ == "__main__":
+    from .clean_data import AREA_DF, city_regions
+    from ..storage.paper_store import load_all_papers
+
+    parser = argparse.ArgumentParser(description="Build the offline city gazetteer and report its match rate.")
+    parser.add_argument("--report", action="store_true", help="Only report on the gazetteer already built")
+    parser.add_argument("--directory", default="data/raw_data", help="Where the paper records are")
+    args = parser.parse_args()
+
+    papers = pd.DataFrame(load_all_papers(["affiliation_city", "affiliation_country", "affiliation_state"], args.directory),
+                          columns=["affiliation_city", "affiliation_country", "affiliation_state"])
+    if args.report:
+        gazetteer = Gazetteer.load()
+    else:
+        gazetteer = build_gazetteer(city_regions(papers))
+        gazetteer.save()
+        print(f"📍 {len(gazetteer)} cities saved to {GAZETTEER_PATH}")
+    stats = report(gazetteer, papers, set(AREA_DF["state_name"].astype(object)))
+    n = max(stats["na_papers"], 1)
+    print(f"🔍 {stats['na_papers']} papers without a state: {stats['matched_by_city']} "
+          f"({stats['matched_by_city'] / n:.0%}) matched by city name, {stats['matched_with_gazetteer']} "
+          f"({stats['matched_with_gazetteer'] / n:.0%}) with the gazetteer")
+    print(f"⏱️ {stats['lookup_us']:.2f} µs per lookup, {stats['resolve_us_per_row']:.2f} µs per row resolved in bulk")
@@ -0,0 +1,132 @@
+"""
+Point-in-polygon region assignment: affiliation coordinates -> the province of provinces_worldwide.json
+(the Natural Earth admin-1 polygons the map draws) that contains them.
+
+Matching by name (building_state_df) misses the regions spelled differently in Scopus, the code table and
+the polygons. A paper with coordinates (affiliation_lat/affiliation_lon in its record, or the gazetteer
+coordinates of its city, see gazetteer.py) is placed in its polygon instead and gets that polygon's own
+name and country; the name matching is left for the other papers.
+
+The polygons are indexed once per process:
+    - with shapely installed (pip install shapely): an STRtree, queried for all the points at once;
+    - otherwise: a grid of GRID_DEGREES cells listing the polygon parts whose bounding box overlaps each,
+      and matplotlib's Path.contains_points on the points of each cell.
+Without the GeoJSON file nothing is placed, and every paper is matched by name as before.
+"""
+import json
+from pathlib import Path
+import numpy as np
+from matplotlib.path import Path as MplPath
+from .normalization import normalize_text
+
+try:
+    import shapely
+except ImportError:
+    shapely = None
+
+PROVINCES_GEOJSON_PATH = "data/raw_data/provinces_worldwide.json"
+GRID_DEGREES = 1.0
+
+
+def _polygons(geometry):
+    """
+    The polygons of a GeoJSON geometry, each as a list of rings (exterior first, then holes).
+    """
+    if not geometry:
+        return []
+    if geometry["type"] == "Polygon":
+        return [geometry["coordinates"]]
+    if geometry["type"] == "MultiPolygon":
+        return geometry["coordinates"]
+    return []
+
+
+class ProvinceIndex:
+    """
+    A spatial index of the province polygons. names and countries hold the normalized name and country
+    (admin) of each feature, as in AREA_DF, so a located point reads its region by feature number.
+    """
+
+    def __init__(self, features, use_shapely=None):
+        self.names = np.array([normalize_text(f["properties"].get("name") or "") for f in features], dtype=object)
+        self.countries = np.array([normalize_text(f["properties"].get("admin") or "") for f in features], dtype=object)
+        self.use_shapely = shapely is not None if use_shapely is None else use_shapely
+        if self.use_shapely:
+            geometries, self.feature_of = [], []
+            for i, feature in enumerate(features):
+                if _polygons(feature.get("geometry")):
+                    geometries.append(shapely.geometry.shape(feature["geometry"]))
+                    self.feature_of.append(i)
+            self.feature_of = np.array(self.feature_of, dtype=np.int64)
+            self.tree = shapely.STRtree(geometries)
+            return
+
+        # One part per polygon: its feature, its exterior and holes as paths, and the grid cells it overlaps
+        self.parts = []
+        self.grid = {}
+        for i, feature in enumerate(features):
+            for rings in _polygons(feature.get("geometry")):
+                exterior = np.asarray(rings[0], dtype=float)[:, :2]
+                holes = [MplPath(np.asarray(ring, dtype=float)[:, :2]) for ring in rings[1:]]
+                part = len(self.parts)
+                self.parts.append((i, MplPath(exterior), holes))
+                (min_x, min_y), (max_x, max_y) = exterior.min(axis=0), exterior.max(axis=0)
+                for cell_x in range(int(np.floor(min_x / GRID_DEGREES)), int(np.floor(max_x / GRID_DEGREES)) + 1):
+                    for cell_y in range(int(np.floor(min_y / GRID_DEGREES)), int(np.floor(max_y / GRID_DEGREES)) + 1):
+                        self.grid.setdefault((cell_x, cell_y), []).append(part)
+
+    @classmethod
+    def from_geojson(cls, path=PROVINCES_GEOJSON_PATH, use_shapely=None):
+        with open(path, "r", encoding="utf-8") as f:
+            return cls(json.load(f)["features"], use_shapely)
+
+    def locate(self, lats, lons):
+        """
+        Returns the feature number of the polygon containing each point, -1 where no polygon contains it
+        (or the coordinates are missing).
+        """
+        lats = np.asarray(lats, dtype=float)
+        lons = np.asarray(lons, dtype=float)
+        result = np.full(len(lats), -1, dtype=np.int64)
+        valid = np.flatnonzero(np.isfinite(lats) & np.isfinite(lons))
+        if len(valid) == 0:
+            return result
+
+        if self.use_shapely:
+            point_numbers, geometry_numbers = self.tree.query(shapely.points(lons[valid], lats[valid]), predicate="within")
+            # A point on a shared border is inside neither polygon; inside two overlapping ones, the first is kept
+            located, first = np.unique(point_numbers, return_index=True)
+            result[valid[located]] = self.feature_of[geometry_numbers[first]]
+            return result
+
+        points = np.column_stack([lons[valid], lats[valid]])
+        cells = np.floor(points / GRID_DEGREES).astype(np.int64)
+        unique_cells, cell_of_point = np.unique(cells, axis=0, return_inverse=True)
+        order = np.argsort(cell_of_point.ravel(), kind="stable")
+        bounds = np.searchsorted(cell_of_point.ravel()[order], np.arange(len(unique_cells) + 1))
+        for c, (cell_x, cell_y) in enumerate(unique_cells):
+            in_cell = order[bounds[c]:bounds[c + 1]]
+            for part in self.grid.get((int(cell_x), int(cell_y)), ()):
+                pending = in_cell[result[valid[in_cell]] < 0]
+                if len(pending) == 0:
+                    break
+                feature, exterior, holes = self.parts[part]
+                inside = exterior.contains_points(points[pending])
+                for hole in holes:
+                    inside &= ~hole.contains_points(points[pending])
+                result[valid[pending[inside]]] = feature
+        return result
+
+
+_PROVINCE_INDEX = None
+
+
+def get_province_index():
+    """
+    The province index of this process, built from PROVINCES_GEOJSON_PATH on first use.
+    None when the GeoJSON file is not there.
+    """
+    global _PROVINCE_INDEX
+    if _PROVINCE_INDEX is None and Path(PROVINCES_GEOJSON_PATH).exists():
+        _PROVINCE_INDEX = ProvinceIndex.from_geojson()
+    return _PROVINCE_INDEX
@@ -0,0 +1,111 @@
+from pathlib import Path
+import pandas as pd
+from .schema import apply_paper_schema
+
+# Every index is a vectorized expression over the columns of the aggregate table (one row per
+# state/province in a country), evaluated with DataFrame.eval. Definitions are evaluated in order,
+# so an expression can use the indices defined before it.
+#
+# Aggregate columns available to the expressions:
+#   total_paper_num     papers in the state
+#   total_cited_num     citations of those papers
+#   area_km2            area of the state
+#   n_institutions      distinct affiliations publishing in the state
+#   max_cited           citations of the most cited paper
+#   h_index             largest h such that h papers have at least h citations each
+#   field_mean_cited    mean citations per paper over the whole year (the keyword is the "field")
+CRDI_INDICES = {
+    "paper_num_density": "total_paper_num / log(area_km2 + 1)",
+    "citation_density": "total_cited_num / log(area_km2 + 1)",
+    "academic_index": "total_cited_num / (total_paper_num + 1)",
+    "crdi_index": "(paper_num_density + citation_density + academic_index) / 3",
+}
+
+INDEX_VARIANTS = {
+    **CRDI_INDICES,
+    # h-index like: rewards regions with many well cited papers rather than one outlier
+    "h_index_density": "h_index / log(area_km2 + 1)",
+    "crdi_h_index": "(paper_num_density + h_index_density + h_index) / 3",
+    # Field normalized: citations relative to the average paper of the keyword in that year
+    "field_normalized_citation": "(total_cited_num / total_paper_num) / (field_mean_cited + 1e-9)",
+    "crdi_field_normalized": "(paper_num_density + citation_density / (field_mean_cited + 1e-9) + field_normalized_citation) / 3",
+    # Per institution: there is no population data, so the number of publishing institutions stands in for size
+    "papers_per_institution": "total_paper_num / n_institutions",
+    "citations_per_institution": "total_cited_num / n_institutions",
+    "crdi_per_institution": "(papers_per_institution + citations_per_institution + academic_index) / 3",
+}
+
+
+def register_index(name, expression, definitions=INDEX_VARIANTS):
+    """
+    Adds (or replaces) an index definition, e.g.
+        register_index("citations_per_km2", "total_cited_num / area_km2")
+    """
+    definitions[name] = expression
+    return definitions
+
+
+def build_aggregate_table(final_df):
+    """
+    This function inputs a dataframe of the cleaned/matched paper data.
+
+    Returns:
+        One row per state/province in a country with all the aggregates the index definitions use.
+        Papers are grouped once; every index is then computed from this table.
+    """
+    final_df = apply_paper_schema(final_df).dropna(subset=["state_name","affiliation_country","area_km2",])
+    final_df = final_df[(final_df["state_name"] != "") & (final_df["affiliation_country"] != "")]
+    keys = ["state_name", "affiliation_country"]
+
+    aggregate_df = final_df.groupby(keys, sort=False, observed=True).agg(
+        affiliation_state=("affiliation_state", "first"),
+        total_paper_num=("state_name", "size"),
+        total_cited_num=("citied_by", "sum"),
+        max_cited=("citied_by", "max"),
+        n_institutions=("affiliation_name", "nunique"),
+        area_km2=("area_km2", "first"),
+        cover_date=("cover_date", "first"),
+    ).reset_index()
+    # One row per state: the labels go back to plain strings, categoricals only pay off on the papers
+    labels = ["state_name", "affiliation_country", "affiliation_state"]
+    aggregate_df[labels] = aggregate_df[labels].astype(object)
+
+    # h-index without a per-group loop: rank the papers of each state by citations (1 = most cited);
+    # h is the largest rank whose paper still has at least that many citations
+    ranked = final_df[keys + ["citied_by"]].sort_values(keys + ["citied_by"], ascending=[True, True, False])
+    ranked["rank"] = ranked.groupby(keys, sort=False, observed=True).cumcount() + 1
+    h_index = ranked[ranked["citied_by"] >= ranked["rank"]].groupby(keys, observed=True)["rank"].max().rename("h_index")
+    aggregate_df = aggregate_df.merge(h_index, left_on=keys, right_index=True, how="left")
+    aggregate_df["h_index"] = aggregate_df["h_index"].fillna(0).astype(int)
+
+    total_papers = aggregate_df["total_paper_num"].sum()
+    aggregate_df["field_mean_cited"] = aggregate_df["total_cited_num"].sum() / total_papers if total_papers else 0.0
+    return aggregate_df
+
+
+def evaluate_indices(aggregate_df, definitions=INDEX_VARIANTS):
+    """
+    Evaluates all the index definitions in a single DataFrame.eval pass over the aggregate table.
+
+    Returns:
+        A copy of aggregate_df with one new column per definition.
+    """
+    if aggregate_df.empty:
+        return aggregate_df.assign(**{name: pd.Series(dtype=float) for name in definitions})
+    program = "\n".join(f"{name} = {expression}" for name, expression in definitions.items())
+    return aggregate_df.eval(program)
+
+
+def calculate_index_variants(aggregate_df, output_filename, year, definitions=INDEX_VARIANTS):
+    """
+    This function inputs the aggregate table of a year and computes every index variant from it.
+
+    Returns:
+        A csv file with one row per state/province and one column per index.
+    """
+    output_filename = Path(output_filename)
+    output_filename.parent.mkdir(parents=True, exist_ok=True)
+    index_df = evaluate_indices(aggregate_df, definitions).drop(columns=["cover_date"])
+    index_df = index_df.assign(year=year)
+    index_df.to_csv(output_filename, index=False, sep=';', encoding='utf-8')
+    return index_df
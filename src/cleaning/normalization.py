@@ -0,0 +1,109 @@
+import json
+import re
+from pathlib import Path
+import numpy as np
+import pandas as pd
+from unidecode import unidecode
+
+# Raw value -> normalized value, shared by every run and keyword
+NORMALIZATION_CACHE_PATH = "data/raw_data/normalization_cache.json"
+WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_text(value):
+    """
+    Lowercases a value, removes all its whitespace and converts accented characters to ASCII.
+    """
+    return unidecode(WHITESPACE.sub("", str(value).lower()))
+
+
+class NormalizationCache:
+    """
+    Normalized forms of the values already seen. Affiliation names, cities and countries repeat across
+    papers, years and keywords, so most values are looked up rather than normalized again.
+    """
+
+    def __init__(self, path=NORMALIZATION_CACHE_PATH):
+        self.path = Path(path)
+        self.values = {}
+        self.dirty = False
+        if self.path.exists():
+            with open(self.path, "r", encoding="utf-8") as f:
+                self.values = json.load(f)
+
+    def normalize(self, uniques):
+        """
+        Returns the normalized form of each of the unique values, normalizing only the ones not seen before.
+        """
+        normalized = []
+        for value in uniques:
+            result = self.values.get(value)
+            if result is None:
+                result = normalize_text(value)
+                if isinstance(value, str):
+                    self.values[value] = result
+                    self.dirty = True
+            normalized.append(result)
+        return normalized
+
+    def save(self):
+        """
+        Writes the cache back to its file, if new values were normalized.
+        """
+        if not self.dirty:
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.path, "w", encoding="utf-8") as f:
+            json.dump(self.values, f, ensure_ascii=False)
+        self.dirty = False
+
+
+_CACHE = None
+
+
+def get_normalization_cache():
+    """
+    The normalization cache of this process, loaded from NORMALIZATION_CACHE_PATH on first use.
+    """
+    global _CACHE
+    if _CACHE is None:
+        _CACHE = NormalizationCache()
+    return _CACHE
+
+
+def normalize_column(series, cache=None):
+    """
+    Normalizes a column value by value through its unique values: the column is factorized, the uniques
+    are normalized (through the cache) and the codes mapped onto the distinct normalized values.
+    A categorical column is normalized through its categories.
+
+    Returns:
+        A categorical Series with the index of series. Missing values become "".
+    """
+    cache = cache or get_normalization_cache()
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        codes, uniques = series.cat.codes.to_numpy(), series.cat.categories
+    else:
+        codes, uniques = pd.factorize(series, sort=False)
+    # Missing values have code -1, which picks the "" appended last
+    normalized = np.array(cache.normalize(uniques) + [""], dtype=object)
+    # Raw values that differ only by case, spaces or accents share one normalized category
+    categories, remap = np.unique(normalized, return_inverse=True)
+    return pd.Series(pd.Categorical.from_codes(remap[codes], categories), index=series.index, name=series.name)
+
+
+def map_pairs(function, first, second):
+    """
+    Calls function(a, b) once per distinct (a, b) pair of two aligned Series and spreads the results back
+    over the rows.
+
+    Returns:
+        An object array of the results, one per row.
+    """
+    first_codes, first_uniques = pd.factorize(first.astype(object), use_na_sentinel=False)
+    second_codes, second_uniques = pd.factorize(second.astype(object), use_na_sentinel=False)
+    codes, pairs = pd.factorize(first_codes * len(second_uniques) + second_codes)
+    results = np.empty(len(pairs), dtype=object)
+    results[:] = [function(first_uniques[pair // len(second_uniques)], second_uniques[pair % len(second_uniques)])
+                  for pair in pairs]
+    return results[codes]
@@ -0,0 +1,135 @@
+import os
+from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from wordcloud import WordCloud
+
+# Default output settings; previews are what the app shows before full resolution is requested
+DPI = 300
+PREVIEW_DPI = 72
+# The format of the word clouds and feature charts, e.g. RENDER_IMAGE_FORMAT=webp for smaller files
+IMAGE_FORMAT = os.environ.get("RENDER_IMAGE_FORMAT", "png").lower()
+SUPPORTED_FORMATS = {"png", "webp", "jpeg", "svg", "pdf"}
+
+
+@contextmanager
+def agg_figure(figsize, dpi=None):
+    """
+    Creates a figure bound directly to an Agg canvas, without going through pyplot.
+
+    pyplot keeps every figure alive in its global figure manager until plt.close is called,
+    which is why rendering year after year used to grow memory. A figure created here is only
+    referenced by the caller and is cleared as soon as the block exits.
+    """
+    fig = Figure(figsize=figsize, dpi=dpi)
+    canvas = FigureCanvasAgg(fig)
+    try:
+        yield fig
+    finally:
+        fig.clear()
+        # The figure and its canvas reference each other, so without this the cached
+        # full-resolution pixel buffer would only be released by the next cyclic GC pass
+        canvas.__dict__.pop("renderer", None)
+
+
+def save_figure(fig, output_filename, dpi=DPI, image_format=IMAGE_FORMAT):
+    """
+    Saves a figure with the requested resolution and format.
+
+    Returns:
+        The path that was written. Its suffix always matches image_format; the versions of the image
+        in the other formats are removed, so the app never shows an outdated one.
+    """
+    if image_format not in SUPPORTED_FORMATS:
+        raise ValueError(f"Unsupported image format {image_format!r}, choose from {sorted(SUPPORTED_FORMATS)}")
+    output_filename = Path(output_filename).with_suffix(f".{image_format}")
+    fig.savefig(output_filename, format=image_format, dpi=dpi)
+    for other_format in SUPPORTED_FORMATS - {image_format}:
+        output_filename.with_suffix(f".{other_format}").unlink(missing_ok=True)
+    return output_filename
+
+
+def preview_filename(output_filename):
+    """
+    Returns the path used for the low-resolution preview of an output image.
+    """
+    output_filename = Path(output_filename)
+    return output_filename.with_name(f"{output_filename.stem}_preview{output_filename.suffix}")
+
+
+def render_word_cloud(word_freq, output_filename, dpi=DPI, image_format=IMAGE_FORMAT):
+    """
+    This function inputs a word frequency dict and renders it as a word cloud image.
+
+    Returns:
+        The path of the saved image.
+    """
+    wordcloud = WordCloud(background_color='white').generate_from_frequencies(word_freq)
+    with agg_figure((10, 8)) as fig:
+        ax = fig.add_subplot()
+        ax.imshow(wordcloud, interpolation='bilinear')
+        ax.axis('off')
+        return save_figure(fig, output_filename, dpi, image_format)
+
+
+def render_feature_coefs(coefs, output_filename, dpi=DPI, image_format=IMAGE_FORMAT):
+    """
+    This function inputs a series of Lasso coefficients (index is the feature name)
+    and renders them as a horizontal bar chart.
+
+    Returns:
+        The path of the saved image.
+    """
+    # Draw the largest coefficient at the top
+    coefs = coefs.iloc[::-1]
+
+    # I used red to display the positive value and blue for the negative
+    colors = ['red' if coef > 0 else 'blue' for coef in coefs.values]
+    with agg_figure((10, 6)) as fig:
+        ax = fig.add_subplot()
+        ax.barh(coefs.index, coefs.values, color=colors, alpha=0.7)
+        ax.axvline(0, color='black', linestyle='--', linewidth=1)
+        ax.set_xlabel("Coefficient Value")
+        ax.set_ylabel("Variables")
+        ax.set_title("Top 30 Lasso Regression Coefficients")
+        return save_figure(fig, output_filename, dpi, image_format)
+
+
+def render_batch(jobs, dpi=DPI, image_format=IMAGE_FORMAT, preview_dpi=None, max_workers=None):
+    """
+    Renders many images in a process pool.
+
+    Parameters:
+        jobs (list): (render_function, data, output_filename) tuples, e.g. one per year.
+                     render_function must be a module-level function such as render_word_cloud.
+        dpi (int): Resolution of the full-size images.
+        image_format (str): Output format, e.g. "png" or "webp".
+        preview_dpi (int): If set, a low-resolution "_preview" image is rendered for each job as well.
+        max_workers (int): Size of the process pool, defaults to the number of CPUs.
+
+    Returns:
+        list: The written paths, in the order of jobs (each preview directly follows its full-size image).
+    """
+    tasks = []
+    for render_function, data, output_filename in jobs:
+        tasks.append((render_function, data, output_filename, dpi))
+        if preview_dpi is not None:
+            tasks.append((render_function, data, preview_filename(output_filename), preview_dpi))
+
+    if max_workers is None:
+        max_workers = min(len(tasks), os.cpu_count() or 1)
+    if max_workers <= 1:
+        return [render_function(data, output_filename, dpi, image_format)
+                for render_function, data, output_filename, dpi in tasks]
+
+    results = [None] * len(tasks)
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        future_to_idx = {
+            executor.submit(render_function, data, output_filename, dpi, image_format): idx
+            for idx, (render_function, data, output_filename, dpi) in enumerate(tasks)
+        }
+        for future in as_completed(future_to_idx):
+            results[future_to_idx[future]] = future.result()
+    return results
@@ -0,0 +1,36 @@
+import pandas as pd
+
+# The dtypes of the paper-level frames (one row per paper and first-author affiliation, see building_state_df).
+# Geographic and institution fields repeat across papers, so they are categoricals.
+CATEGORY_COLUMNS = ["state_name", "affiliation_state", "affiliation_city", "affiliation_country",
+                    "affiliation_name", "country_name"]
+PAPER_SCHEMA = {
+    **{column: "category" for column in CATEGORY_COLUMNS},
+    "citied_by": "int32",
+    "cover_date": "datetime64[ns]",
+    "area_km2": "float64",
+}
+
+
+def apply_paper_schema(df):
+    """
+    This function inputs a paper-level dataframe and casts the columns it has to PAPER_SCHEMA.
+    Columns already of their dtype are left as they are, so it is cheap to apply again.
+    Citations that are missing or not a number count as 0; dates that can't be parsed become NaT.
+
+    Returns:
+        A dataframe with the typed columns (the input is not modified).
+    """
+    typed = {}
+    for column, dtype in PAPER_SCHEMA.items():
+        if column not in df.columns or df[column].dtype == dtype:
+            continue
+        if column == "citied_by":
+            typed[column] = pd.to_numeric(df[column], errors="coerce").fillna(0).astype(dtype)
+        elif column == "cover_date":
+            typed[column] = pd.to_datetime(df[column], errors="coerce", format="ISO8601")
+        elif dtype == "category":
+            typed[column] = df[column].astype(dtype)
+        else:
+            typed[column] = pd.to_numeric(df[column], errors="coerce").astype(dtype)
+    return df.assign(**typed) if typed else df
@@ -1,23 +1,28 @@
-import matplotlib.pyplot as plt
-import imageio
+import imageio.v2 as imageio
+import numpy as np
+import plotly.graph_objects as go
 import os
+from .render import agg_figure
+from .word_store import WordFreqStore, top_k_items
 
 KEY_WORDS = os.environ.get("SEARCH_KEYWORD", "default_keyword_if_none").lower().replace(" ","")
 YEARS = [2020,2021,2022,2023,2024]
+ANIMATION_FORMAT = os.environ.get("WORDFRQ_ANIMATION_FORMAT", "gif")
+ANIMATION_FORMATS = {"gif", "webp", "mp4", "plotly"}
+FRAME_DURATION_MS = 1000
 
-def generate_word_frq_yearlygif(word_freq_year):
+def top_words_by_year(word_freq_year, k=10):
     """
     This function inputs a dictionary. Keys are the years and values are the word and frequency in that year.
-    
+
     Returns:
-        Generates the dynamic word frequency gif.
+        A list of (year, words, freqs) tuples with the top k words of every year, in year order.
     """
-    sorted_years = sorted(word_freq_year.keys())
     all_data = []
-    for year in sorted_years:
+    for year in sorted(word_freq_year.keys()):
         year_dict = word_freq_year[year]
-        # Sort the words by frequency per year and pick the top 10
-        sorted_items = sorted(year_dict.items(), key=lambda x: (-x[1], x[0]))[:10]
+        # Pick the top k words by frequency per year with a heap instead of sorting the whole vocabulary
+        sorted_items = top_k_items(year_dict, k)
         words = []
         freqs = []
         # Use a tuple to save year, word list, frequency list
@@ -25,35 +30,126 @@ def generate_word_frq_yearlygif(word_freq_year):
             words.append(item[0])
             freqs.append(item[1])
         all_data.append((year, words, freqs))
-    
+    return all_data
+
+def frequency_axis_limit(all_data):
+    """
+    Returns the shared x-axis limit so bars are comparable from one frame to the next.
+    """
     max_freq = 0
     for year, words, freqs in all_data:
-        yearly_max = max(freqs)
+        yearly_max = max(freqs, default=0)
         if yearly_max > max_freq:
-            max_freq = yearly_max        
-    max_freq = max_freq * 1.1
-
-    filenames = []
-    for idx, (year, words, freqs) in enumerate(all_data):
-        plt.figure(figsize=(12, 7))
-        bars = plt.barh(words, freqs, color='skyblue')
-        plt.title(f'Top 10 Keywords in {year}', fontsize=14)
-        plt.xlabel('Frequency', fontsize=12)
-        plt.ylabel('Keywords', fontsize=12)
-        plt.gca().invert_yaxis()
-        plt.xlim(0, max_freq)
+            max_freq = yearly_max
+    return max_freq * 1.1
+
+def render_frame(year, words, freqs, max_freq, dpi=100):
+    """
+    Draws the bar chart of one year and returns it as an RGB numpy array, without touching the disk.
+    """
+    with agg_figure((12, 7), dpi=dpi) as fig:
+        ax = fig.add_subplot()
+        bars = ax.barh(words, freqs, color='skyblue')
+        ax.set_title(f'Top {len(words)} Keywords in {year}', fontsize=14)
+        ax.set_xlabel('Frequency', fontsize=12)
+        ax.set_ylabel('Keywords', fontsize=12)
+        ax.invert_yaxis()
+        ax.set_xlim(0, max_freq)
         for bar in bars:
             width = bar.get_width()
-            plt.text(width, bar.get_y() + bar.get_height()/2,
-                     f' {width}',
-                     va='center', ha='left')
-        
-        plt.tight_layout()
-        filename = f'data/output_data/dynamic_wordfrq/{KEY_WORDS}_{idx:03d}.png'
-        plt.savefig(filename, bbox_inches='tight')
-        plt.close()
-        filenames.append(filename)
-    images = []
-    for filename in filenames:
-        images.append(imageio.imread(filename))
-    imageio.mimsave(f'data/output_data/dynamic_wordfrq/{KEY_WORDS}_dynamic_wordfreq.gif', images, duration=1000, loop = 0)
+            ax.text(width, bar.get_y() + bar.get_height()/2,
+                    f' {width}',
+                    va='center', ha='left')
+        # A fixed figure size (no bbox_inches='tight') keeps every frame the same shape
+        fig.tight_layout()
+        fig.canvas.draw()
+        return np.asarray(fig.canvas.buffer_rgba())[..., :3].copy()
+
+def write_animation(all_data, output_filename, dpi=100):
+    """
+    Renders the frames one by one and appends each to the animation writer as soon as it is drawn.
+    The format follows the suffix of output_filename (.gif, .webp or .mp4; mp4 needs imageio[ffmpeg]).
+
+    Returns:
+        The number of frames written.
+    """
+    max_freq = frequency_axis_limit(all_data)
+    if str(output_filename).endswith(".mp4"):
+        writer = imageio.get_writer(output_filename, mode="I", fps=1000 / FRAME_DURATION_MS)
+    else:
+        writer = imageio.get_writer(output_filename, mode="I", duration=FRAME_DURATION_MS, loop=0)
+    with writer:
+        for year, words, freqs in all_data:
+            writer.append_data(render_frame(year, words, freqs, max_freq, dpi))
+    return len(all_data)
+
+def build_word_frq_animation(all_data):
+    """
+    Builds an interactive Plotly animation (one frame per year, with a play button and a year slider)
+    from the same top-k data as the GIF.
+
+    Returns:
+        plotly.graph_objects.Figure
+    """
+    max_freq = frequency_axis_limit(all_data)
+    frames = []
+    for year, words, freqs in all_data:
+        frames.append(go.Frame(
+            name=str(year),
+            data=[go.Bar(x=freqs, y=words, orientation='h', marker_color='skyblue',
+                         text=freqs, textposition='outside')],
+            layout=go.Layout(title_text=f'Top {len(words)} Keywords in {year}')
+        ))
+
+    fig = go.Figure(data=frames[0].data if frames else [], frames=frames)
+    frame_args = {"frame": {"duration": FRAME_DURATION_MS, "redraw": True}, "mode": "immediate"}
+    fig.update_layout(
+        title_text=frames[0].layout.title.text if frames else "",
+        xaxis=dict(title='Frequency', range=[0, max_freq]),
+        yaxis=dict(title='Keywords', autorange='reversed'),
+        updatemenus=[dict(type="buttons", showactive=False, buttons=[
+            dict(label="Play", method="animate", args=[None, frame_args])
+        ])],
+        sliders=[dict(steps=[
+            dict(label=frame.name, method="animate", args=[[frame.name], frame_args])
+            for frame in frames
+        ])]
+    )
+    return fig
+
+def dynamic_wordfrq_filename(keyword=KEY_WORDS, output_format=ANIMATION_FORMAT):
+    """
+    Returns the path of the word frequency animation of a keyword (lowercase, no space).
+    """
+    extension = "json" if output_format == "plotly" else output_format
+    return f'data/output_data/dynamic_wordfrq/{keyword}_dynamic_wordfreq.{extension}'
+
+def generate_word_frq_yearlygif(word_freq_year, output_format=ANIMATION_FORMAT, output_filename=None):
+    """
+    This function inputs a dictionary (keys are the years and values are the word and frequency in that year)
+    or a WordFreqStore.
+
+    Returns:
+        Generates the dynamic word frequency animation ("gif", "webp" or "mp4"), or with output_format="plotly"
+        an interactive Plotly animation saved as figure JSON. The animations of the other formats left
+        next to it are removed, so the app never shows an outdated one. Returns the path written.
+    """
+    if output_format not in ANIMATION_FORMATS:
+        raise ValueError(f"Unknown animation format {output_format!r}, choose from {sorted(ANIMATION_FORMATS)}")
+    if isinstance(word_freq_year, WordFreqStore):
+        # The store already holds every year's top words, no need to scan the vocabularies
+        all_data = word_freq_year.top_k_by_year()
+    else:
+        all_data = top_words_by_year(word_freq_year)
+    if output_filename is None:
+        output_filename = dynamic_wordfrq_filename(KEY_WORDS, output_format)
+
+    if output_format == "plotly":
+        build_word_frq_animation(all_data).write_json(output_filename)
+    else:
+        write_animation(all_data, output_filename)
+    stem, extension = os.path.splitext(str(output_filename))
+    for other_extension in (".json", ".gif", ".webp", ".mp4"):
+        if other_extension != extension and os.path.exists(stem + other_extension):
+            os.remove(stem + other_extension)
+    return output_filename
@@ -0,0 +1,174 @@
+import heapq
+from pathlib import Path
+import numpy as np
+
+# How many words per year are precomputed and stored next to the counts
+TOP_K = 50
+
+
+def top_k_items(word_freq, k):
+    """
+    Returns the k most frequent (word, count) pairs of a dict, ties broken alphabetically.
+
+    heapq keeps only k candidates, so this is O(n log k) instead of sorting the whole vocabulary.
+    """
+    return heapq.nsmallest(k, word_freq.items(), key=lambda x: (-x[1], x[0]))
+
+
+def _top_k_indices(counts, k):
+    """
+    Returns the indices of the k largest values of a 1-d array, largest first.
+
+    np.argpartition does the selection in linear time; only the k survivors are sorted.
+    Ties are broken by index, which is alphabetical since the vocabulary is sorted.
+    """
+    k = min(k, len(counts))
+    if k == 0:
+        return np.array([], dtype=np.int64)
+    candidates = np.argpartition(-counts, k - 1)[:k]
+    return candidates[np.lexsort((candidates, -counts[candidates]))]
+
+
+class WordFreqStore:
+    """
+    Word counts of one keyword for every year, kept in a compact columnar layout:
+
+        words    sorted vocabulary shared by all years (saved as one newline-joined utf-8 blob,
+                 since a fixed-width string array would pad every word to the longest one)
+        years    the years, one row each
+        indptr   row i (year i) is indices/counts[indptr[i]:indptr[i+1]] (CSR layout)
+        indices  positions in words, sorted within a row
+        counts   int32 counts
+
+    plus the positions and counts of the top TOP_K words of every year, precomputed when the
+    store is built, so the usual queries (word clouds, the yearly animation) never scan a year.
+    """
+
+    def __init__(self, words, years, indptr, indices, counts, top_indices, top_counts):
+        self.words = words
+        self.years = years
+        self.indptr = indptr
+        self.indices = indices
+        self.counts = counts
+        self.top_indices = top_indices
+        self.top_counts = top_counts
+
+    @classmethod
+    def from_yearly(cls, word_freq_year, k=TOP_K):
+        """
+        Builds the store from a dictionary. Keys are the years and values are the word and frequency in that year.
+        """
+        years = sorted(word_freq_year.keys())
+        vocabulary = set()
+        for year in years:
+            vocabulary.update(word_freq_year[year].keys())
+        words = np.array(sorted(vocabulary), dtype=object)
+        position = {word: idx for idx, word in enumerate(words)}
+
+        indptr = [0]
+        indices, counts = [], []
+        top_indices = np.zeros((len(years), k), dtype=np.int32)
+        top_counts = np.zeros((len(years), k), dtype=np.int32)
+        for row, year in enumerate(years):
+            year_dict = word_freq_year[year]
+            row_indices = np.fromiter((position[word] for word in year_dict), dtype=np.int32, count=len(year_dict))
+            row_counts = np.fromiter(year_dict.values(), dtype=np.int32, count=len(year_dict))
+            order = np.argsort(row_indices)
+            indices.append(row_indices[order])
+            counts.append(row_counts[order])
+            indptr.append(indptr[-1] + len(year_dict))
+
+            top = top_k_items(year_dict, k)
+            top_indices[row, :len(top)] = [position[word] for word, _ in top]
+            top_counts[row, :len(top)] = [count for _, count in top]
+
+        return cls(
+            words=words,
+            years=np.array(years, dtype=np.int16),
+            indptr=np.array(indptr, dtype=np.int64),
+            indices=np.concatenate(indices) if indices else np.array([], dtype=np.int32),
+            counts=np.concatenate(counts) if counts else np.array([], dtype=np.int32),
+            top_indices=top_indices,
+            top_counts=top_counts,
+        )
+
+    def save(self, output_filename):
+        output_filename = Path(output_filename)
+        # Words come from whitespace splitting, so they never contain a newline
+        vocab = np.frombuffer("\n".join(self.words).encode("utf-8"), dtype=np.uint8)
+        np.savez_compressed(
+            output_filename,
+            vocab=vocab, years=self.years, indptr=self.indptr, indices=self.indices,
+            counts=self.counts, top_indices=self.top_indices, top_counts=self.top_counts,
+        )
+        return output_filename
+
+    @classmethod
+    def load(cls, filename):
+        with np.load(filename) as data:
+            arrays = {name: data[name] for name in data.files}
+        vocab = arrays.pop("vocab").tobytes().decode("utf-8")
+        words = np.array(vocab.split("\n") if vocab else [], dtype=object)
+        return cls(words=words, **arrays)
+
+    def _row(self, year):
+        matches = np.flatnonzero(self.years == year)
+        if len(matches) == 0:
+            raise KeyError(f"No word frequency stored for {year}")
+        return matches[0]
+
+    def year_counts(self, year):
+        """
+        Returns the dense count vector (aligned with self.words) of one year.
+        """
+        row = self._row(year)
+        start, end = self.indptr[row], self.indptr[row + 1]
+        dense = np.zeros(len(self.words), dtype=np.int64)
+        dense[self.indices[start:end]] = self.counts[start:end]
+        return dense
+
+    def word_freq(self, year):
+        """
+        Returns the {word: frequency} dict of one year, as building_wordfrq_dict produced it.
+        """
+        row = self._row(year)
+        start, end = self.indptr[row], self.indptr[row + 1]
+        return dict(zip(self.words[self.indices[start:end]].tolist(), self.counts[start:end].tolist()))
+
+    def top_k(self, year, k=10):
+        """
+        Returns the k most frequent (word, count) pairs of one year.
+        """
+        row = self._row(year)
+        if k <= self.top_indices.shape[1]:
+            n = int(np.count_nonzero(self.top_counts[row, :k]))
+            return list(zip(self.words[self.top_indices[row, :n]].tolist(), self.top_counts[row, :n].tolist()))
+        # More than was precomputed: partial selection over that year's row only
+        start, end = self.indptr[row], self.indptr[row + 1]
+        best = _top_k_indices(self.counts[start:end], k)
+        # Ties inside a row are already ordered alphabetically since the row indices are sorted
+        return list(zip(self.words[self.indices[start:end][best]].tolist(), self.counts[start:end][best].tolist()))
+
+    def top_k_by_year(self, k=10):
+        """
+        Returns a list of (year, words, freqs) tuples with the top k words of every year.
+        """
+        all_data = []
+        for year in self.years.tolist():
+            top = self.top_k(year, k)
+            all_data.append((year, [word for word, _ in top], [count for _, count in top]))
+        return all_data
+
+    def top_rising(self, start_year, end_year, k=10):
+        """
+        Returns the k words whose frequency grew the most between start_year and end_year,
+        as (word, start_count, end_count) tuples.
+
+        Only the two year rows are expanded; the growth and the selection are vectorized.
+        """
+        start_counts = self.year_counts(start_year)
+        end_counts = self.year_counts(end_year)
+        growth = end_counts - start_counts
+        best = _top_k_indices(growth, k)
+        best = best[growth[best] > 0]
+        return list(zip(self.words[best].tolist(), start_counts[best].tolist(), end_counts[best].tolist()))
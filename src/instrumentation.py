@@ -0,0 +1,268 @@
+"""
+Lightweight run metrics for the pipeline: where the time, the requests, the bytes and the memory go.
+
+    from src.instrumentation import span, instrument, count
+
+    @instrument("calculate_crdi")            # every call is timed under that name
+    def calculate_crdi(...): ...
+
+    with span("match_affiliations"):         # or any block
+        ...
+    count("scopus_requests", endpoint="search", status=200)
+    count("bytes_written", 1024, stage="paper_json")
+
+At the end of a run, write_metrics("batch") saves the spans and counters as
+data/output_data/metrics/batch_metrics.json and batch_metrics.prom (Prometheus text format).
+
+Opt-in, because they slow the code they measure:
+    MAPADEMIC_TRACE_MEMORY=1                  peak traced memory (tracemalloc) of every span
+    MAPADEMIC_PROFILE=cprofile|pyinstrument   a profile of every profiled() block, saved next to the metrics
+Spans run in worker processes (e.g. the yearly heatmaps) are not collected.
+"""
+import cProfile
+import functools
+import json
+import os
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from contextlib import contextmanager
+from pathlib import Path
+
+# resource only exists on Unix
+try:
+    import resource
+except ImportError:
+    resource = None
+
+# pyinstrument is an optional profiler; cProfile is used without it
+try:
+    import pyinstrument
+except ImportError:
+    pyinstrument = None
+
+METRICS_DIR = Path(os.environ.get("MAPADEMIC_METRICS_DIR", "data/output_data/metrics"))
+PROMETHEUS_PREFIX = "mapademic"
+
+
+class Metrics:
+    """
+    The spans and counters of one run. Spans are aggregated by name: calls, total, max and last
+    duration, and the peak traced memory when memory tracing is on.
+    """
+
+    def __init__(self, trace_memory=None):
+        if trace_memory is None:
+            trace_memory = os.environ.get("MAPADEMIC_TRACE_MEMORY", "") not in ("", "0")
+        self.trace_memory = trace_memory
+        self.spans = {}
+        self.counters = Counter()
+        self.started_at = time.time()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def reset(self):
+        with self._lock:
+            self.spans.clear()
+            self.counters.clear()
+            self.started_at = time.time()
+
+    def count(self, name, value=1, **labels):
+        key = (name, tuple(sorted((label, str(label_value)) for label, label_value in labels.items())))
+        with self._lock:
+            self.counters[key] += value
+
+    def _memory_stack(self):
+        if not hasattr(self._local, "frames"):
+            self._local.frames = []
+        return self._local.frames
+
+    @contextmanager
+    def span(self, name):
+        # Memory is traced on the main thread only: tracemalloc's peak is shared by the whole process
+        trace_memory = self.trace_memory and threading.current_thread() is threading.main_thread()
+        if trace_memory:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+            frames = self._memory_stack()
+            if frames:
+                frames[-1] = max(frames[-1], tracemalloc.get_traced_memory()[1])
+            tracemalloc.reset_peak()
+            frames.append(0)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            duration = time.perf_counter() - start
+            peak = None
+            if trace_memory:
+                frames = self._memory_stack()
+                peak = max(frames.pop(), tracemalloc.get_traced_memory()[1])
+                if frames:
+                    # The enclosing span's peak includes this one's
+                    frames[-1] = max(frames[-1], peak)
+                tracemalloc.reset_peak()
+            self._record(name, duration, peak)
+
+    def _record(self, name, duration, peak):
+        with self._lock:
+            stats = self.spans.setdefault(name, {"calls": 0, "total_s": 0.0, "max_s": 0.0, "last_s": 0.0})
+            stats["calls"] += 1
+            stats["total_s"] += duration
+            stats["max_s"] = max(stats["max_s"], duration)
+            stats["last_s"] = duration
+            if peak is not None:
+                stats["peak_traced_bytes"] = max(stats.get("peak_traced_bytes", 0), peak)
+
+    def report(self):
+        """
+        Returns the metrics of the run as a JSON-serializable dict.
+        """
+        with self._lock:
+            spans = {name: dict(stats) for name, stats in self.spans.items()}
+            counters = [{"name": name, "labels": dict(labels), "value": value}
+                        for (name, labels), value in sorted(self.counters.items())]
+        return {
+            "started_at": self.started_at,
+            "wall_s": time.time() - self.started_at,
+            "peak_rss_bytes": peak_rss_bytes(),
+            "spans": spans,
+            "counters": counters,
+        }
+
+    def to_prometheus(self):
+        """
+        Returns the metrics in the Prometheus text exposition format.
+        """
+        report = self.report()
+        lines = []
+
+        def metric(name, kind, help_text, samples):
+            lines.append(f"# HELP {PROMETHEUS_PREFIX}_{name} {help_text}")
+            lines.append(f"# TYPE {PROMETHEUS_PREFIX}_{name} {kind}")
+            for labels, value in samples:
+                label_text = ",".join(f'{label}="{_escape(label_value)}"' for label, label_value in labels.items())
+                lines.append(f"{PROMETHEUS_PREFIX}_{name}{{{label_text}}} {value}" if label_text
+                             else f"{PROMETHEUS_PREFIX}_{name} {value}")
+
+        spans = report["spans"]
+        metric("span_calls_total", "counter", "Calls of each pipeline stage.",
+               [({"span": name}, stats["calls"]) for name, stats in spans.items()])
+        metric("span_seconds_total", "counter", "Time spent in each pipeline stage.",
+               [({"span": name}, f"{stats['total_s']:.6f}") for name, stats in spans.items()])
+        metric("span_max_seconds", "gauge", "Longest single call of each pipeline stage.",
+               [({"span": name}, f"{stats['max_s']:.6f}") for name, stats in spans.items()])
+        traced = [({"span": name}, stats["peak_traced_bytes"]) for name, stats in spans.items()
+                  if "peak_traced_bytes" in stats]
+        if traced:
+            metric("span_peak_traced_bytes", "gauge", "Peak traced memory of each pipeline stage.", traced)
+        by_name = {}
+        for counter in report["counters"]:
+            by_name.setdefault(counter["name"], []).append((counter["labels"], counter["value"]))
+        for name, samples in by_name.items():
+            metric(f"{name}_total", "counter", f"Run total of {name}.", samples)
+        if report["peak_rss_bytes"] is not None:
+            metric("peak_rss_bytes", "gauge", "Peak resident memory of the process.", [({}, report["peak_rss_bytes"])])
+        metric("run_seconds", "gauge", "Wall time since the metrics were started.", [({}, f"{report['wall_s']:.3f}")])
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def peak_rss_bytes():
+    """
+    Peak resident memory of this process, or None where the resource module is missing.
+    """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak if os.uname().sysname == "Darwin" else peak * 1024
+
+
+METRICS = Metrics()
+
+
+def span(name):
+    return METRICS.span(name)
+
+
+def count(name, value=1, **labels):
+    METRICS.count(name, value, **labels)
+
+
+def count_file_written(path, stage):
+    """
+    Adds the size of a file just written to the bytes_written counter of a stage.
+    """
+    try:
+        METRICS.count("bytes_written", os.path.getsize(path), stage=stage)
+    except OSError:
+        pass
+
+
+def instrument(name=None):
+    """
+    Decorator timing every call of a function as a span (named after the function by default).
+    """
+    def decorator(function):
+        span_name = name or function.__name__
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with METRICS.span(span_name):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+@contextmanager
+def profiled(name, profiler=None, output_dir=None):
+    """
+    Profiles a block when MAPADEMIC_PROFILE (or profiler) is "cprofile" or "pyinstrument", and saves
+    the result as {output_dir}/{name}.prof (open with snakeviz or pstats) or {name}.html. Does nothing otherwise.
+    """
+    profiler = (profiler or os.environ.get("MAPADEMIC_PROFILE", "")).lower()
+    if profiler not in ("cprofile", "pyinstrument"):
+        yield
+        return
+    output_dir = Path(output_dir or METRICS_DIR)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    if profiler == "pyinstrument" and pyinstrument is not None:
+        session = pyinstrument.Profiler()
+        session.start()
+        try:
+            yield
+        finally:
+            session.stop()
+            (output_dir / f"{name}.html").write_text(session.output_html(), encoding="utf-8")
+        return
+    session = cProfile.Profile()
+    session.enable()
+    try:
+        yield
+    finally:
+        session.disable()
+        session.dump_stats(output_dir / f"{name}.prof")
+
+
+def write_metrics(run_name, output_dir=None, metrics=None):
+    """
+    Saves the metrics of the run as {run_name}_metrics.json and {run_name}_metrics.prom.
+
+    Returns:
+        The two paths.
+    """
+    metrics = metrics or METRICS
+    output_dir = Path(output_dir or METRICS_DIR)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    json_path = output_dir / f"{run_name}_metrics.json"
+    prom_path = output_dir / f"{run_name}_metrics.prom"
+    with open(json_path, "w", encoding="utf-8") as f:
+        json.dump(metrics.report(), f, indent=4)
+    prom_path.write_text(metrics.to_prometheus(), encoding="utf-8")
+    print(f"📊 Run metrics saved to {json_path}")
+    return json_path, prom_path
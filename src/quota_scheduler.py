@@ -0,0 +1,221 @@
+"""
+Spreads Scopus API calls over a pool of API keys, using the quota each key has left.
+
+    export API_KEYS="key1,key2,key3"    # falls back to API_KEY
+
+Every response's X-RateLimit-Limit / -Remaining / -Reset headers update the quota of the key that
+sent it (per endpoint, since Scopus counts search and affiliation retrieval separately). The quotas
+are saved to data/raw_data/api_quota.json (keys are stored as a short hash, never in clear) after each
+search and at exit, so the next run starts from what is known. Each request goes to the key with the
+most quota left; a key whose quota is used up is skipped until its reset time.
+
+A response without the headers only counts one request off the last known quota. Such an estimate
+is dropped after ESTIMATE_MAX_AGE, and a 429 without headers (a per-second throttle, not a used-up
+quota) only moves that request on to the next key.
+
+The scheduler also decides how much of a search to fetch: a keyword may use at most max_share of
+the quota left, so a keyword that fits gets all its results while a very large one is cut to its
+share instead of draining the keys.
+"""
+import atexit
+import hashlib
+import json
+import os
+import time
+from collections import Counter
+from pathlib import Path
+
+import requests
+
+from .scopus_client import get_client, CircuitOpenError
+from .instrumentation import count
+
+QUOTA_PATH = Path("data/raw_data/api_quota.json")
+# Scopus' default weekly quota, assumed for a key until its headers are seen
+DEFAULT_QUOTA = {"search": 20000, "affiliation": 5000}
+# How long a quota counted without the headers (no reset time known) is trusted
+ESTIMATE_MAX_AGE = 24 * 3600
+
+
+class QuotaExhaustedError(requests.exceptions.RequestException):
+    """
+    Raised when every configured API key is out of quota.
+    """
+
+
+def api_keys_from_env():
+    keys = [key.strip() for key in os.environ.get("API_KEYS", "").split(",") if key.strip()]
+    if not keys and os.environ.get("API_KEY"):
+        keys = [os.environ["API_KEY"]]
+    return keys
+
+
+def key_id(api_key):
+    """
+    The name a key is saved under: a hash, so the quota file never holds the key itself.
+    """
+    return hashlib.sha256(api_key.encode("utf-8")).hexdigest()[:12]
+
+
+def load_quota_summary(path=QUOTA_PATH, endpoint="search"):
+    """
+    Returns (remaining, earliest reset epoch or None) over all the saved keys of an endpoint, or None
+    when nothing is saved yet. Used by the app to show the quota left.
+    """
+    path = Path(path)
+    if not path.exists():
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        state = json.load(f)
+    quotas = [keys[endpoint] for keys in state.values() if endpoint in keys]
+    if not quotas:
+        return None
+    remaining = sum(quota.get("remaining") or 0 for quota in quotas)
+    resets = [quota["reset"] for quota in quotas if quota.get("reset")]
+    return remaining, min(resets) if resets else None
+
+
+class QuotaScheduler:
+    """
+    Chooses the API key of every request and the share of the quota each keyword may use.
+    """
+
+    def __init__(self, api_keys, path=QUOTA_PATH, max_share=0.25, reserve=100, client_factory=get_client,
+                 clock=time.time):
+        if not api_keys:
+            raise ValueError("No API key configured: set API_KEYS or API_KEY")
+        self.api_keys = list(dict.fromkeys(api_keys))
+        self.path = Path(path)
+        self.max_share = max_share
+        self.reserve = reserve
+        self.client_factory = client_factory
+        self.clock = clock
+        self.used = Counter()  # Requests sent per label (keyword) in this run
+        self.quota = self._load()
+        self.dirty = False
+
+    def _load(self):
+        if self.path.exists():
+            try:
+                with open(self.path, "r", encoding="utf-8") as f:
+                    return json.load(f)
+            except json.JSONDecodeError:  # Handle empty or broken JSON file
+                return {}
+        return {}
+
+    def save(self):
+        """
+        Writes the quotas back to their file, if responses were recorded since the last save.
+        """
+        if not self.dirty:
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_suffix(".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.quota, f, indent=4)
+        tmp.replace(self.path)
+        self.dirty = False
+
+    def remaining(self, api_key, endpoint):
+        """
+        The requests a key has left on an endpoint: the last X-RateLimit-Remaining seen,
+        or the full quota when its reset time has passed, its estimate is outdated, or nothing is known.
+        """
+        quota = self.quota.get(key_id(api_key), {}).get(endpoint)
+        default = DEFAULT_QUOTA.get(endpoint, 0)
+        if not quota or quota.get("remaining") is None:
+            return default
+        reset = quota.get("reset")
+        if not reset and quota.get("updated_at") is not None:
+            reset = quota["updated_at"] + ESTIMATE_MAX_AGE
+        if reset and reset <= self.clock():
+            return quota.get("limit") or default
+        return quota["remaining"]
+
+    def available(self, endpoint="search"):
+        return sum(self.remaining(api_key, endpoint) for api_key in self.api_keys)
+
+    def pick_key(self, endpoint="search", exclude=()):
+        candidates = [api_key for api_key in self.api_keys if api_key not in exclude]
+        candidates = [api_key for api_key in candidates if self.remaining(api_key, endpoint) > 0]
+        if not candidates:
+            return None
+        return max(candidates, key=lambda api_key: self.remaining(api_key, endpoint))
+
+    def record(self, api_key, endpoint, response):
+        headers = response.headers
+        if response.status_code == 429 and "X-RateLimit-Remaining" not in headers:
+            # A throttle, not a used-up quota: get() tries the next key, nothing is recorded
+            return
+        before = self.remaining(api_key, endpoint)
+        quota = self.quota.setdefault(key_id(api_key), {}).setdefault(endpoint, {})
+        for header, name in (("X-RateLimit-Limit", "limit"), ("X-RateLimit-Remaining", "remaining"),
+                             ("X-RateLimit-Reset", "reset")):
+            try:
+                quota[name] = int(float(headers[header]))
+            except (KeyError, ValueError):
+                pass
+        if "X-RateLimit-Remaining" not in headers:
+            # Counted off the last quota known; without a reset time, the estimate expires (see remaining)
+            quota["remaining"] = before - 1
+        quota["updated_at"] = int(self.clock())
+        self.dirty = True
+
+    def get(self, url, params=None, endpoint="search", label=None):
+        """
+        Sends a request with the key that has the most quota left; when that key answers 429 (out of
+        quota, or throttled) or its circuit breaker is open, the next key is tried for this request.
+
+        Returns:
+            The response, or the last 429 response when every key answered 429.
+        Raises:
+            QuotaExhaustedError when no key has quota left; CircuitOpenError when every key left was
+            skipped for an open circuit.
+        """
+        tried = []
+        response = None
+        circuit_error = None
+        while True:
+            api_key = self.pick_key(endpoint, exclude=tried)
+            if api_key is None:
+                if response is not None:
+                    return response
+                if circuit_error is not None:
+                    raise circuit_error
+                raise QuotaExhaustedError(f"Every API key is out of {endpoint} quota")
+            tried.append(api_key)
+            try:
+                response = self.client_factory(api_key).get(url, params=params)
+            except CircuitOpenError as e:
+                # This key's API calls keep failing: the request goes to the next key
+                circuit_error = e
+                continue
+            self.used[label] += 1
+            count("scopus_requests", endpoint=endpoint, status=response.status_code)
+            count("bytes_read", len(response.content or b""), stage=endpoint)
+            self.record(api_key, endpoint, response)
+            if response.status_code != 429:
+                return response
+
+    def grant(self, label, wanted_requests, endpoint="search"):
+        """
+        Returns how many of the wanted requests a keyword (label) may send: all of them while it stays
+        within max_share of the quota left (minus a reserve), fewer otherwise.
+        """
+        budget = int(max(0, self.available(endpoint) - self.reserve) * self.max_share)
+        left = max(0, budget - self.used[label])
+        return min(wanted_requests, left)
+
+
+_SCHEDULER = None
+
+
+def get_scheduler():
+    """
+    The scheduler of this process, over the keys configured in the environment.
+    """
+    global _SCHEDULER
+    if _SCHEDULER is None:
+        _SCHEDULER = QuotaScheduler(api_keys_from_env())
+        atexit.register(_SCHEDULER.save)
+    return _SCHEDULER
@@ -0,0 +1,228 @@
+"""
+HTTP client shared by the Scopus API calls (keyword search and affiliation lookups).
+
+    - One pooled requests.Session per API key, so connections are reused between pages.
+    - Retries on 429, 5xx and connection errors with exponential backoff and full jitter. A Retry-After
+      header wins; on a 429 with X-RateLimit-Remaining: 0 the wait is until X-RateLimit-Reset.
+    - A retry budget per run: once spent, errors are returned to the caller straight away instead of
+      retried, so a bad run degrades into fewer results rather than hours of sleeping.
+    - A circuit breaker: after several failures in a row, requests fail fast (CircuitOpenError) for a
+      cool-down period, then one trial request decides whether to close it again.
+    - A wait longer than max_wait (e.g. a weekly quota that resets in days) is not slept: the error
+      response is returned.
+
+SCOPUS_BASE_URL points the API calls somewhere else than api.elsevier.com, e.g. the local mock server
+of benchmarks/mock_scopus_server.py.
+"""
+import os
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+
+import requests
+from requests.adapters import HTTPAdapter
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+BASE_URL = os.environ.get("SCOPUS_BASE_URL", "https://api.elsevier.com").rstrip("/")
+
+
+class CircuitOpenError(requests.exceptions.RequestException):
+    """
+    Raised instead of sending a request while the circuit breaker is open.
+    """
+
+
+class RetryBudget:
+    """
+    The number of retries left for the whole run, shared by every request of a client.
+    """
+
+    def __init__(self, max_retries=100):
+        self.remaining = max_retries
+        self.spent = 0
+        self._lock = threading.Lock()
+
+    def spend(self):
+        with self._lock:
+            if self.remaining <= 0:
+                return False
+            self.remaining -= 1
+            self.spent += 1
+            return True
+
+
+class CircuitBreaker:
+    """
+    Opens after failure_threshold failures in a row; after reset_timeout seconds it lets one trial
+    request through ("half open"), which closes it on success or opens it again on failure. The other
+    callers (every thread sharing the client) keep failing fast until the trial is over.
+    """
+
+    def __init__(self, failure_threshold=5, reset_timeout=60.0, clock=time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.clock = clock
+        self.failures = 0
+        self.opened_at = None
+        self.trial_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return "closed"
+        if self.clock() - self.opened_at >= self.reset_timeout:
+            return "half_open"
+        return "open"
+
+    def before_request(self):
+        with self._lock:
+            state = self.state
+            if state == "open":
+                remaining = self.reset_timeout - (self.clock() - self.opened_at)
+                raise CircuitOpenError(f"Circuit open after {self.failures} failures, retry in {remaining:.0f}s")
+            if state == "half_open":
+                if self.trial_in_flight:
+                    raise CircuitOpenError("Circuit half open, waiting for the trial request")
+                self.trial_in_flight = True
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self.trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.trial_in_flight = False
+            self.failures += 1
+            if self.failures >= self.failure_threshold or self.opened_at is not None:
+                # A failed trial request re-opens the circuit for another cool-down
+                self.opened_at = self.clock()
+
+
+def parse_retry_after(value, now=None):
+    """
+    Returns the seconds to wait from a Retry-After header (seconds, or an HTTP date), or None.
+    """
+    if value is None:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        moment = parsedate_to_datetime(value).timestamp()
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, moment - (time.time() if now is None else now))
+
+
+class ScopusClient:
+    """
+    GET requests to the Scopus API with retries, backoff and a circuit breaker.
+    The last rate limit headers seen are kept in self.rate_limit.
+    """
+
+    def __init__(self, api_key, max_retries=5, backoff_base=1.0, backoff_cap=60.0, max_wait=300.0,
+                 timeout=30.0, retry_budget=None, breaker=None, pool_size=10, sleep=time.sleep, rng=None):
+        self.api_key = api_key
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self.max_wait = max_wait
+        self.timeout = timeout
+        self.retry_budget = retry_budget if retry_budget is not None else RetryBudget()
+        self.breaker = breaker if breaker is not None else CircuitBreaker()
+        self.sleep = sleep
+        self.rng = rng if rng is not None else random.Random()
+        self.rate_limit = {}
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.session.headers.update({"Accept": "application/json", "X-ELS-APIKey": api_key})
+
+    def _record_rate_limit(self, response):
+        for header, name in (("X-RateLimit-Limit", "limit"), ("X-RateLimit-Remaining", "remaining"),
+                             ("X-RateLimit-Reset", "reset")):
+            value = response.headers.get(header)
+            if value is not None:
+                try:
+                    self.rate_limit[name] = int(float(value))
+                except ValueError:
+                    pass
+
+    def retry_delay(self, attempt, response=None):
+        """
+        Seconds to wait before retry number attempt (0 based).
+        """
+        if response is not None:
+            retry_after = parse_retry_after(response.headers.get("Retry-After"))
+            if retry_after is not None:
+                return retry_after
+            if response.status_code == 429 and response.headers.get("X-RateLimit-Remaining") == "0":
+                reset = response.headers.get("X-RateLimit-Reset")
+                if reset is not None:
+                    try:
+                        return max(0.0, float(reset) - time.time())
+                    except ValueError:
+                        pass
+        # Full jitter: a random wait up to the exponential backoff, so clients do not retry in step
+        return self.rng.uniform(0, min(self.backoff_cap, self.backoff_base * 2 ** attempt))
+
+    def get(self, url, params=None):
+        """
+        Sends a GET request, retrying what is worth retrying.
+
+        Returns:
+            The final response, which may still be an error response when retrying was not possible
+            (retries or budget exhausted, or a wait longer than max_wait).
+        Raises:
+            CircuitOpenError while the breaker is open; requests exceptions when a connection error
+            cannot be retried.
+        """
+        attempt = 0
+        while True:
+            self.breaker.before_request()
+            try:
+                response = self.session.get(url, params=params, timeout=self.timeout)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+                self.breaker.record_failure()
+                if attempt >= self.max_retries or not self.retry_budget.spend():
+                    raise
+                self.sleep(self.retry_delay(attempt))
+                attempt += 1
+                continue
+            except Exception:
+                # Any other error also ends a trial request, which would otherwise hold the breaker half open
+                self.breaker.record_failure()
+                raise
+
+            self._record_rate_limit(response)
+            if response.status_code not in RETRY_STATUSES:
+                self.breaker.record_success()
+                return response
+
+            self.breaker.record_failure()
+            delay = self.retry_delay(attempt, response)
+            if attempt >= self.max_retries or delay > self.max_wait or not self.retry_budget.spend():
+                return response
+            print(f"⚠️ {response.status_code} from the API, retrying in {delay:.1f}s...")
+            self.sleep(delay)
+            attempt += 1
+
+
+_CLIENTS = {}
+
+
+def get_client(api_key):
+    """
+    Returns the client of an API key, shared by all the callers in this process
+    (one connection pool, one retry budget and one circuit breaker per key).
+    """
+    if api_key not in _CLIENTS:
+        _CLIENTS[api_key] = ScopusClient(api_key)
+    return _CLIENTS[api_key]
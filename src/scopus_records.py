@@ -0,0 +1,272 @@
+"""
+Typed records of the Scopus search entries, holding only the fields the pipeline reads.
+
+A raw entry carries about 20 fields and nested author/affiliation objects, of which build_paper_record
+keeps about 10. The records here are __slots__ classes (no per-object dict), so a decoded file only keeps
+those fields in memory:
+
+    Paper        eid, doi, title, publication, cited_by, cover_date, abstract, authkeywords,
+                 author (list of Author), affiliation (list of Affiliation)
+    Author       authid, authname, afid (list of AfidRef: the {"$": afid} objects)
+    Affiliation  afid, affilname, city, country
+
+Two optional packages make decoding faster, either is used when installed:
+    - msgspec: decode_papers decodes the bytes straight into Structs with the same attributes, skipping
+      the other fields without building them. A payload of an unexpected shape (e.g. an author whose
+      "afid" is not a list) is decoded the generic way instead.
+    - orjson: loads, used for the generic path and the API responses.
+Without them, the standard json module is used. decode_paper_records, which build_paper_json uses, goes
+through the Structs with msgspec and through the parsed dicts otherwise (see benchmarks/bench_decode.py).
+"""
+import json
+from typing import Optional
+
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Missing fields read as "NA", like dict.get(field, "NA") in build_paper_record
+NA = "NA"
+
+
+def loads(data):
+    """
+    Parses JSON bytes (or str), with orjson when it is installed.
+    """
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def _list(value):
+    return value if isinstance(value, list) else []
+
+
+class AfidRef:
+    __slots__ = ("value",)
+
+    def __init__(self, value=NA):
+        self.value = value
+
+
+class Author:
+    __slots__ = ("authid", "authname", "afid")
+
+    def __init__(self, authid=NA, authname=NA, afid=()):
+        self.authid = authid
+        self.authname = authname
+        self.afid = list(afid)
+
+    @classmethod
+    def from_entry(cls, entry):
+        return cls(entry.get("authid", NA), entry.get("authname", NA),
+                   [AfidRef(ref.get("$", NA)) for ref in _list(entry.get("afid"))])
+
+
+class Affiliation:
+    __slots__ = ("afid", "affilname", "city", "country")
+
+    def __init__(self, afid=None, affilname=NA, city=NA, country=NA):
+        self.afid = afid
+        self.affilname = affilname
+        self.city = city
+        self.country = country
+
+    @classmethod
+    def from_entry(cls, entry):
+        return cls(entry.get("afid"), entry.get("affilname", NA),
+                   entry.get("affiliation-city", NA), entry.get("affiliation-country", NA))
+
+
+class Paper:
+    __slots__ = ("eid", "doi", "title", "publication", "cited_by", "cover_date", "abstract", "authkeywords",
+                 "author", "affiliation")
+
+    def __init__(self, eid=None, doi=NA, title=NA, publication=NA, cited_by=NA, cover_date=NA, abstract=NA,
+                 authkeywords=None, author=(), affiliation=()):
+        self.eid = eid
+        self.doi = doi
+        self.title = title
+        self.publication = publication
+        self.cited_by = cited_by
+        self.cover_date = cover_date
+        self.abstract = abstract
+        self.authkeywords = authkeywords
+        self.author = list(author)
+        self.affiliation = list(affiliation)
+
+    @classmethod
+    def from_entry(cls, entry):
+        """
+        The record of a raw search entry (a dict, as json.load gives it).
+        """
+        return cls(
+            eid=entry.get("eid"),
+            doi=entry.get("prism:doi", NA),
+            title=entry.get("dc:title", NA),
+            publication=entry.get("prism:publicationName", NA),
+            cited_by=entry.get("citedby-count", NA),
+            cover_date=entry.get("prism:coverDate", NA),
+            abstract=entry.get("dc:description", NA),
+            authkeywords=entry.get("authkeywords"),
+            author=[Author.from_entry(author) for author in _list(entry.get("author"))],
+            affiliation=[Affiliation.from_entry(affiliation) for affiliation in _list(entry.get("affiliation"))],
+        )
+
+
+if msgspec is not None:
+    # The same records as msgspec Structs, named after the raw fields so they decode straight from the bytes.
+    # Fields are Optional because Scopus sends null for some of them (e.g. affiliation-city).
+    class _AfidRefStruct(msgspec.Struct, gc=False):
+        value: Optional[str] = msgspec.field(default=NA, name="$")
+
+    class _AuthorStruct(msgspec.Struct, gc=False):
+        authid: Optional[str] = NA
+        authname: Optional[str] = NA
+        afid: list[_AfidRefStruct] = []
+
+    class _AffiliationStruct(msgspec.Struct, gc=False):
+        afid: Optional[str] = None
+        affilname: Optional[str] = NA
+        city: Optional[str] = msgspec.field(default=NA, name="affiliation-city")
+        country: Optional[str] = msgspec.field(default=NA, name="affiliation-country")
+
+    class _PaperStruct(msgspec.Struct, gc=False):
+        eid: Optional[str] = None
+        doi: Optional[str] = msgspec.field(default=NA, name="prism:doi")
+        title: Optional[str] = msgspec.field(default=NA, name="dc:title")
+        publication: Optional[str] = msgspec.field(default=NA, name="prism:publicationName")
+        cited_by: Optional[str] = msgspec.field(default=NA, name="citedby-count")
+        cover_date: Optional[str] = msgspec.field(default=NA, name="prism:coverDate")
+        abstract: Optional[str] = msgspec.field(default=NA, name="dc:description")
+        authkeywords: Optional[str] = None
+        author: list[_AuthorStruct] = []
+        affiliation: list[_AffiliationStruct] = []
+
+    _PAPERS_DECODER = msgspec.json.Decoder(list[_PaperStruct])
+    _PAPER_DECODER = msgspec.json.Decoder(_PaperStruct)
+
+
+def _decode_structs(data, lines):
+    if lines:
+        return _PAPER_DECODER.decode_lines(data)
+    return _PAPERS_DECODER.decode(data)
+
+
+def _loads(data, lines):
+    if lines:
+        return [loads(line) for line in data.splitlines() if line.strip()]
+    return loads(data)
+
+
+def decode_papers(data, lines=False):
+    """
+    Decodes a JSON array of raw search entries (a *_raw.json file, as bytes) into Paper records.
+    With lines=True, data is JSON Lines (a block of a raw archive, see src/storage/raw_archive.py).
+    """
+    if msgspec is not None:
+        try:
+            return _decode_structs(data, lines)
+        except msgspec.ValidationError:
+            pass
+    return [Paper.from_entry(entry) for entry in _loads(data, lines)]
+
+
+def decode_paper_records(data, lines=False):
+    """
+    The paper records (see paper_record) of a JSON array (or JSON Lines) of raw search entries, by the
+    fastest path available: msgspec Structs, otherwise the dicts of loads. Building __slots__ records for
+    every author costs more than it saves when the dicts are already built, so Paper records are not used for this.
+    """
+    if msgspec is not None:
+        try:
+            return [paper_record(paper) for paper in _decode_structs(data, lines)]
+        except msgspec.ValidationError:
+            pass
+    return [entry_record(entry) for entry in _loads(data, lines)]
+
+
+def entry_record(each_search):
+    """
+    The paper record of a raw search entry as a dict (see paper_record).
+    """
+    # Important!! Using dict.get is necessary and safe, since there exsists missing part of the imfo
+    search_result = {
+        "paper_title": each_search.get("dc:title",NA),
+        "publication": each_search.get("prism:publicationName",NA),
+        "citied_by": each_search.get("citedby-count",NA),
+        "cover_date" : each_search.get("prism:coverDate",NA),
+        "Abstract": each_search.get("dc:description",NA),
+        "DOI": each_search.get("prism:doi",NA)
+    }
+
+    author = each_search.get("author",[])
+    if author and isinstance(author, list) and len(author) > 0:
+        search_result["paper_author"] = author[0].get("authname", NA)
+
+        author_afid = author[0].get("afid", [])
+        if isinstance(author_afid, list) and len(author_afid) > 0:
+            author_afid = author_afid[0].get("$", NA)
+        else:
+            author_afid = NA
+    else:
+        search_result["paper_author"] = NA
+        author_afid = NA
+
+    affiliation = each_search.get("affiliation", [])
+
+    search_result["affiliation_name"] = NA
+    search_result["affiliation_city"] = NA
+    search_result["affiliation_country"] = NA
+    search_result["affiliation_id"] = NA
+
+    if affiliation and isinstance(affiliation, list) and len(affiliation) > 0:
+        for each_affiliation in affiliation:
+            if each_affiliation.get("afid") == author_afid:
+                search_result["affiliation_name"] = each_affiliation.get("affilname", NA)
+                search_result["affiliation_city"] = each_affiliation.get("affiliation-city", NA)
+                search_result["affiliation_country"] = each_affiliation.get("affiliation-country", NA)
+                search_result["affiliation_id"] =  each_affiliation.get("afid",NA)
+                break
+
+    return search_result
+
+
+def paper_record(paper):
+    """
+    The paper record of the pipeline from a Paper record (or Struct): the title, date, citations, abstract
+    and DOI, the first author and the affiliation of that author. Missing parts are "NA".
+    """
+    record = {
+        "paper_title": paper.title,
+        "publication": paper.publication,
+        "citied_by": paper.cited_by,
+        "cover_date": paper.cover_date,
+        "Abstract": paper.abstract,
+        "DOI": paper.doi,
+    }
+    if paper.author:
+        first_author = paper.author[0]
+        record["paper_author"] = first_author.authname
+        author_afid = first_author.afid[0].value if first_author.afid else NA
+    else:
+        record["paper_author"] = NA
+        author_afid = NA
+
+    record["affiliation_name"] = NA
+    record["affiliation_city"] = NA
+    record["affiliation_country"] = NA
+    record["affiliation_id"] = NA
+    for affiliation in paper.affiliation:
+        if affiliation.afid == author_afid:
+            record["affiliation_name"] = affiliation.affilname
+            record["affiliation_city"] = affiliation.city
+            record["affiliation_country"] = affiliation.country
+            record["affiliation_id"] = affiliation.afid
+            break
+    return record
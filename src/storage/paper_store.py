@@ -0,0 +1,373 @@
+"""
+A local paper store shared by every keyword.
+
+Each paper is stored once, keyed by its Scopus EID (or "doi:<doi>" when the EID is missing); which
+keyword/year searches returned it is a separate mapping table. The cleaning and feature stages read
+one keyword/year through the mapping, selecting only the columns they use, so disk use and parse
+time scale with the number of unique papers instead of keyword x year.
+
+    python -m src.storage.paper_store --import-json    # load the existing *_paper.json files (or archives)
+"""
+import argparse
+import json
+import re
+import sqlite3
+from pathlib import Path
+from . import search_index
+from .raw_archive import find_records, read_records, INDEX_SUFFIX
+
+DEFAULT_PATH = Path("data/raw_data/papers.sqlite")
+
+# The fields of a paper record, as built by keyword_search.build_paper_record (+ affiliation_state)
+PAPER_COLUMNS = [
+    "paper_title", "publication", "citied_by", "cover_date", "Abstract", "DOI", "paper_author",
+    "affiliation_name", "affiliation_city", "affiliation_country", "affiliation_id", "affiliation_state",
+]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS papers (
+    paper_key TEXT PRIMARY KEY,
+    year INTEGER,
+    paper_title TEXT,
+    publication TEXT,
+    citied_by INTEGER,
+    cover_date TEXT,
+    Abstract TEXT,
+    DOI TEXT,
+    paper_author TEXT,
+    affiliation_name TEXT,
+    affiliation_city TEXT,
+    affiliation_country TEXT,
+    affiliation_id TEXT,
+    affiliation_state TEXT
+);
+CREATE INDEX IF NOT EXISTS papers_year ON papers (year);
+CREATE INDEX IF NOT EXISTS papers_affiliation ON papers (affiliation_id);
+
+-- The raw Scopus entries, apart so that reading records never touches them
+CREATE TABLE IF NOT EXISTS raw_entries (
+    paper_key TEXT PRIMARY KEY,
+    entry TEXT NOT NULL
+);
+
+-- Which papers a keyword/year search returned, in the result order
+CREATE TABLE IF NOT EXISTS keyword_papers (
+    keyword TEXT NOT NULL,
+    year INTEGER NOT NULL,
+    rank INTEGER NOT NULL,
+    paper_key TEXT NOT NULL REFERENCES papers (paper_key),
+    PRIMARY KEY (keyword, year, paper_key)
+);
+CREATE INDEX IF NOT EXISTS keyword_papers_key ON keyword_papers (paper_key);
+"""
+
+
+def keyword_filename(keyword):
+    """
+    Keywords are stored the way the output files name them: lowercase, no space.
+    """
+    return keyword.lower().replace(" ", "")
+
+
+def record_key(record):
+    """
+    Returns the store key of a paper record that has no EID (the *_paper.json files): "doi:<doi>",
+    or a key built from the title and cover date when the DOI is missing too.
+    """
+    doi = record.get("DOI")
+    if doi and doi != "NA":
+        return f"doi:{doi.lower()}"
+    return f"title:{record.get('paper_title', '').lower()}|{record.get('cover_date', '')}"
+
+
+def _year(record, default):
+    match = re.match(r"(\d{4})", str(record.get("cover_date", "")))
+    return int(match.group(1)) if match else default
+
+
+def _citations(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+class PaperStore:
+    """
+    SQLite paper store. Use it as a context manager, or call close() when done.
+    """
+
+    def __init__(self, path=DEFAULT_PATH):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(self.path)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.executescript(SCHEMA)
+        # The full-text index is skipped on Python builds whose sqlite3 lacks FTS5
+        self.has_fts = search_index.fts_available()
+        if self.has_fts:
+            self.conn.executescript(search_index.SCHEMA)
+            indexed = self.conn.execute("SELECT COUNT(*) FROM paper_fts").fetchone()[0]
+            if indexed == 0:
+                # A store created before the index existed
+                self.rebuild_index()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.conn.commit()
+        self.conn.close()
+
+    def add_papers(self, papers, year=None):
+        """
+        Inserts or updates papers. papers is an iterable of (paper_key, record, raw_entry) tuples;
+        raw_entry may be None. year is used when the record has no readable cover date.
+
+        An existing affiliation_state is kept when the new record does not have one yet.
+        """
+        papers = list(papers)
+        rows, raw_rows = [], []
+        for key, record, entry in papers:
+            row = [key, _year(record, year)] + [record.get(column) for column in PAPER_COLUMNS]
+            row[2 + PAPER_COLUMNS.index("citied_by")] = _citations(record.get("citied_by"))
+            rows.append(row)
+            if entry is not None:
+                raw_rows.append((key, json.dumps(entry, ensure_ascii=False)))
+
+        columns = ["paper_key", "year"] + PAPER_COLUMNS
+        updates = ", ".join(
+            f"{column} = excluded.{column}" for column in columns[1:] if column != "affiliation_state"
+        )
+        self.conn.executemany(
+            f"INSERT INTO papers ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))}) "
+            f"ON CONFLICT (paper_key) DO UPDATE SET {updates}, "
+            "affiliation_state = COALESCE(excluded.affiliation_state, papers.affiliation_state)",
+            rows,
+        )
+        self.conn.executemany(
+            "INSERT INTO raw_entries (paper_key, entry) VALUES (?, ?) "
+            "ON CONFLICT (paper_key) DO UPDATE SET entry = excluded.entry",
+            raw_rows,
+        )
+        if self.has_fts:
+            search_index.index_papers(self.conn, papers)
+        self.conn.commit()
+        return len(rows)
+
+    def rebuild_index(self):
+        """
+        Indexes every stored paper in the full-text index.
+        """
+        self.conn.execute("DELETE FROM paper_fts")
+        rows = self.conn.execute(
+            "SELECT p.paper_key, p.paper_title, p.Abstract, r.entry FROM papers p "
+            "LEFT JOIN raw_entries r ON r.paper_key = p.paper_key"
+        )
+        search_index.index_papers(self.conn, (
+            (row["paper_key"], {"paper_title": row["paper_title"], "Abstract": row["Abstract"]},
+             json.loads(row["entry"]) if row["entry"] else None)
+            for row in rows
+        ))
+        self.conn.commit()
+
+    def set_keyword_papers(self, keyword, year, keys):
+        """
+        Records (replacing any earlier result) the papers a keyword/year search returned, in order.
+        """
+        keyword = keyword_filename(keyword)
+        keys = list(dict.fromkeys(keys))
+        self.conn.execute("DELETE FROM keyword_papers WHERE keyword = ? AND year = ?", (keyword, year))
+        self.conn.executemany(
+            "INSERT INTO keyword_papers (keyword, year, rank, paper_key) VALUES (?, ?, ?, ?)",
+            [(keyword, year, rank, key) for rank, key in enumerate(keys)],
+        )
+        self.conn.commit()
+
+    def has_keyword(self, keyword, year):
+        row = self.conn.execute(
+            "SELECT 1 FROM keyword_papers WHERE keyword = ? AND year = ? LIMIT 1",
+            (keyword_filename(keyword), year),
+        ).fetchone()
+        return row is not None
+
+    def keyword_keys(self, keyword, year):
+        rows = self.conn.execute(
+            "SELECT paper_key FROM keyword_papers WHERE keyword = ? AND year = ? ORDER BY rank",
+            (keyword_filename(keyword), year),
+        )
+        return [row["paper_key"] for row in rows]
+
+    def has_papers(self, keys):
+        """
+        Returns the subset of keys already in the store.
+        """
+        keys = list(keys)
+        found = set()
+        # SQLite limits the number of bound parameters, so look the keys up in chunks
+        for start in range(0, len(keys), 500):
+            chunk = keys[start:start + 500]
+            rows = self.conn.execute(
+                f"SELECT paper_key FROM papers WHERE paper_key IN ({', '.join('?' * len(chunk))})", chunk
+            )
+            found.update(row["paper_key"] for row in rows)
+        return found
+
+    def update_states(self, state_dict):
+        """
+        Sets affiliation_state of every paper from an afid -> state dictionary.
+        """
+        self.conn.executemany(
+            "UPDATE papers SET affiliation_state = ? WHERE affiliation_id = ?",
+            [(state, afid) for afid, state in state_dict.items()],
+        )
+        self.conn.commit()
+
+    def affiliation_ids(self):
+        return {row[0] for row in self.conn.execute("SELECT DISTINCT affiliation_id FROM papers")}
+
+    def papers(self, keyword, year=None, columns=None):
+        """
+        Returns the paper records of a keyword (and year), in the search result order.
+        Only the requested columns are read; the filter runs inside SQLite.
+
+        Returns:
+            A list of dicts shaped like the *_paper.json records.
+        """
+        columns = PAPER_COLUMNS if columns is None else columns
+        unknown = set(columns) - set(PAPER_COLUMNS) - {"paper_key", "year"}
+        if unknown:
+            raise ValueError(f"Unknown paper columns {sorted(unknown)}")
+        # Papers never matched to a state read as "NA", like in the *_paper.json files
+        selected = [
+            "COALESCE(p.affiliation_state, 'NA') AS affiliation_state" if column == "affiliation_state" else f"p.{column}"
+            for column in columns
+        ]
+        query = (
+            f"SELECT {', '.join(selected)} FROM keyword_papers k "
+            "JOIN papers p ON p.paper_key = k.paper_key WHERE k.keyword = ?"
+        )
+        params = [keyword_filename(keyword)]
+        if year is not None:
+            query += " AND k.year = ?"
+            params.append(year)
+        query += " ORDER BY k.year, k.rank"
+        return [dict(row) for row in self.conn.execute(query, params)]
+
+    def raw_entries(self, keys):
+        """
+        Returns {paper_key: raw Scopus entry} for the keys that have one.
+        """
+        keys = list(keys)
+        entries = {}
+        for start in range(0, len(keys), 500):
+            chunk = keys[start:start + 500]
+            rows = self.conn.execute(
+                f"SELECT paper_key, entry FROM raw_entries WHERE paper_key IN ({', '.join('?' * len(chunk))})", chunk
+            )
+            entries.update((row["paper_key"], json.loads(row["entry"])) for row in rows)
+        return entries
+
+    def import_paper_json(self, keyword, year, filename):
+        """
+        Loads an existing {keyword}_{year}_paper.json file (or its archive) into the store.
+        """
+        records = read_records(filename)
+        keys = []
+        seen = {}
+        for record in records:
+            key = record_key(record)
+            # Without the EID, distinct Scopus records can share a DOI (e.g. proceedings volumes);
+            # repeats inside one search result are kept apart, as their EIDs would
+            seen[key] = seen.get(key, 0) + 1
+            keys.append(key if seen[key] == 1 else f"{key}#{seen[key]}")
+        self.add_papers(((key, record, None) for key, record in zip(keys, records)), year)
+        self.set_keyword_papers(keyword, year, keys)
+        return len(records)
+
+
+def load_papers(keyword, year, columns=None, store_path=DEFAULT_PATH):
+    """
+    Returns the paper records of a keyword/year: from the paper store when it has them,
+    otherwise from data/raw_data/{keyword}_{year}_paper.json (or its archive, see raw_archive).
+    """
+    store_path = Path(store_path)
+    if store_path.exists():
+        with PaperStore(store_path) as store:
+            if store.has_keyword(keyword, year):
+                return store.papers(keyword, year, columns)
+    data = read_records(f"data/raw_data/{keyword_filename(keyword)}_{year}_paper.json")
+    if columns is None:
+        return data
+    return [{column: record.get(column) for column in columns} for record in data]
+
+
+def load_raw_entries(keyword, year, store_path=DEFAULT_PATH):
+    """
+    Returns the raw Scopus entries of a keyword/year as (paper_key, entry) pairs, in the search result
+    order: from the paper store when it has them, otherwise from
+    data/raw_data/raw_api_data/{keyword}_{year}_raw.json or its archive. Empty when neither exists
+    (e.g. papers imported from a *_paper.json file only).
+    """
+    store_path = Path(store_path)
+    if store_path.exists():
+        with PaperStore(store_path) as store:
+            if store.has_keyword(keyword, year):
+                keys = store.keyword_keys(keyword, year)
+                entries = store.raw_entries(keys)
+                return [(key, entries[key]) for key in keys if key in entries]
+    filename = find_records(f"data/raw_data/raw_api_data/{keyword_filename(keyword)}_{year}_raw.json")
+    if filename is None:
+        return []
+    data = read_records(filename)
+    return [(entry.get("eid") or f"{keyword_filename(keyword)}_{year}#{rank}", entry) for rank, entry in enumerate(data)]
+
+
+def paper_files(directory="data/raw_data"):
+    """
+    Returns the {keyword}_{year}_paper files of a directory, each once in whichever format it is kept.
+    """
+    return sorted({find_records(path) for path in Path(directory).glob("*_paper.json*") if path.suffix != INDEX_SUFFIX})
+
+
+def load_all_papers(columns=None, directory="data/raw_data", store_path=DEFAULT_PATH):
+    """
+    Returns the paper records of every keyword and year: every paper of the paper store when it exists,
+    otherwise the records of every paper file in directory.
+    """
+    store_path = Path(store_path)
+    if store_path.exists():
+        columns = PAPER_COLUMNS if columns is None else columns
+        unknown = set(columns) - set(PAPER_COLUMNS)
+        if unknown:
+            raise ValueError(f"Unknown paper columns {sorted(unknown)}")
+        with PaperStore(store_path) as store:
+            selected = [
+                "COALESCE(affiliation_state, 'NA') AS affiliation_state" if column == "affiliation_state" else column
+                for column in columns
+            ]
+            return [dict(row) for row in store.conn.execute(f"SELECT {', '.join(selected)} FROM papers")]
+    records = []
+    for filename in paper_files(directory):
+        data = read_records(filename)
+        records.extend(data if columns is None else [{column: record.get(column) for column in columns} for record in data])
+    return records
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Manage the local paper store.")
+    parser.add_argument("--import-json", action="store_true", help="Load every data/raw_data/*_paper.json file")
+    parser.add_argument("--store", default=DEFAULT_PATH, help="Path of the SQLite store")
+    args = parser.parse_args()
+
+    if args.import_json:
+        with PaperStore(args.store) as store:
+            for filename in paper_files():
+                keyword, year, _ = filename.name.rsplit("_", 2)
+                n = store.import_paper_json(keyword, int(year), filename)
+                print(f"📂 Imported {n} papers from {filename}")
+            n_papers = store.conn.execute("SELECT COUNT(*) FROM papers").fetchone()[0]
+            print(f"✅ {n_papers} unique papers in {args.store}")
@@ -0,0 +1,259 @@
+"""
+Compressed archives of JSON records: the raw API results (*_raw.json) and the paper records (*_paper.json).
+
+An archive is JSON Lines (one compact record per line) compressed in independent blocks of
+BLOCK_RECORDS records, with zstd when the zstandard package is installed and gzip otherwise:
+
+    ai_2023_raw.jsonl.zst        the blocks, one zstd frame (or gzip member) each, back to back
+    ai_2023_raw.jsonl.zst.idx    JSON index: codec, record count, [offset, length, first record, records]
+                                 of every block
+
+A block is decompressed on its own, so a reader streams the records block by block, or seeks to the
+block holding record i without decompressing the ones before it. The blocks also concatenate into a
+valid .zst/.gz file, so zstd -d / gunzip read the whole archive (without the index, it is streamed).
+
+Readers accept any of the names of a records file: asked for x.json (or x.jsonl.zst) they read the
+archive when there is one and x.json otherwise (see find_records), so the JSON history fetched before
+keeps working. Writers pick the format from the suffix of the name they are given.
+
+    python -m src.storage.raw_archive data/raw_data --remove-json    # archive the existing JSON files
+"""
+import argparse
+import gzip
+import json
+import os
+import zlib
+from pathlib import Path
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+BLOCK_RECORDS = 200
+ZSTD_LEVEL = 10
+GZIP_LEVEL = 6
+ARCHIVE_SUFFIXES = {".jsonl.zst": "zstd", ".jsonl.gz": "gzip"}
+# New archives are zstd when it can be written
+ARCHIVE_SUFFIX = ".jsonl.zst" if zstandard is not None else ".jsonl.gz"
+INDEX_SUFFIX = ".idx"
+
+
+def _split_suffix(filename):
+    name = str(filename)
+    for suffix in (*ARCHIVE_SUFFIXES, ".json"):
+        if name.endswith(suffix):
+            return name[:-len(suffix)], suffix
+    return name, ""
+
+
+def is_archive(filename):
+    return _split_suffix(filename)[1] in ARCHIVE_SUFFIXES
+
+
+def archive_path(filename, suffix=ARCHIVE_SUFFIX):
+    """
+    The archive name of a records file: x.json -> x.jsonl.zst (or x.jsonl.gz without zstandard).
+    """
+    return Path(_split_suffix(filename)[0] + suffix)
+
+
+def find_records(filename):
+    """
+    Returns the existing file holding the records of filename (x.json, x.jsonl.zst or x.jsonl.gz):
+    its archive when there is one (.jsonl.zst, then .jsonl.gz), otherwise its .json version.
+    None when none exists.
+    """
+    stem, suffix = _split_suffix(filename)
+    if not suffix:
+        return Path(filename) if Path(filename).exists() else None
+    for candidate_suffix in (*ARCHIVE_SUFFIXES, ".json"):
+        candidate = Path(stem + candidate_suffix)
+        if candidate.exists():
+            return candidate
+    return None
+
+
+def records_exist(filename):
+    return find_records(filename) is not None
+
+
+def _codec(filename):
+    codec = ARCHIVE_SUFFIXES[_split_suffix(filename)[1]]
+    if codec == "zstd" and zstandard is None:
+        raise ImportError(f"Reading {filename} needs the zstandard package (pip install zstandard)")
+    return codec
+
+
+def _compress(data, codec):
+    if codec == "zstd":
+        return zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(data)
+    return gzip.compress(data, compresslevel=GZIP_LEVEL, mtime=0)
+
+
+def _decompress(data, codec):
+    if codec == "zstd":
+        return zstandard.ZstdDecompressor().decompress(data)
+    # One gzip member: zlib with the gzip header (wbits 16 + 15)
+    return zlib.decompress(data, 16 + zlib.MAX_WBITS)
+
+
+def write_archive(records, filename, block_records=BLOCK_RECORDS):
+    """
+    Writes records (any iterable, consumed block by block) to an archive and its index.
+    Returns the number of records written.
+    """
+    filename = Path(filename)
+    codec = _codec(filename)
+    filename.parent.mkdir(parents=True, exist_ok=True)
+    blocks = []
+    n_records = 0
+    offset = 0
+
+    def flush(lines, f):
+        nonlocal offset
+        data = _compress("".join(lines).encode("utf-8"), codec)
+        f.write(data)
+        blocks.append([offset, len(data), n_records - len(lines), len(lines)])
+        offset += len(data)
+
+    with open(filename, "wb") as f:
+        lines = []
+        for record in records:
+            lines.append(json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n")
+            n_records += 1
+            if len(lines) == block_records:
+                flush(lines, f)
+                lines = []
+        if lines:
+            flush(lines, f)
+    with open(str(filename) + INDEX_SUFFIX, "w", encoding="utf-8") as f:
+        json.dump({"codec": codec, "records": n_records, "blocks": blocks}, f)
+    return n_records
+
+
+def read_index(filename):
+    """
+    Returns the index of an archive ({"codec", "records", "blocks"}), or None without an index file.
+    """
+    index_file = Path(str(filename) + INDEX_SUFFIX)
+    if not index_file.exists():
+        return None
+    with open(index_file, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def iter_blocks(filename, start=0, stop=None):
+    """
+    Yields (first record number, JSON Lines bytes) of the blocks of an archive that hold records
+    start to stop (all of them by default). With the index, only those blocks are read; without it,
+    the whole archive is streamed as one block.
+    """
+    codec = _codec(filename)
+    index = read_index(filename)
+    if index is None:
+        if codec == "zstd":
+            with open(filename, "rb") as f:
+                reader = zstandard.ZstdDecompressor().stream_reader(f, read_across_frames=True)
+                yield 0, reader.read()
+        else:
+            with gzip.open(filename, "rb") as f:
+                yield 0, f.read()
+        return
+    with open(filename, "rb") as f:
+        for offset, length, first, n in index["blocks"]:
+            if first + n <= start:
+                continue
+            if stop is not None and first >= stop:
+                break
+            f.seek(offset)
+            yield first, _decompress(f.read(length), codec)
+
+
+def iter_archive(filename, start=0, stop=None):
+    """
+    Streams the records start to stop of an archive, decompressing one block at a time.
+    """
+    for first, data in iter_blocks(filename, start, stop):
+        for i, line in enumerate(data.splitlines(), first):
+            if i < start:
+                continue
+            if stop is not None and i >= stop:
+                return
+            yield json.loads(line)
+
+
+def iter_records(filename, start=0, stop=None):
+    """
+    Streams the records of a records file, archive or JSON (see find_records for the names it accepts).
+    """
+    found = find_records(filename)
+    if found is None:
+        raise FileNotFoundError(filename)
+    if is_archive(found):
+        yield from iter_archive(found, start, stop)
+        return
+    with open(found, "r", encoding="utf-8") as f:
+        yield from json.load(f)[start:stop]
+
+
+def read_records(filename):
+    """
+    Returns the records of a records file as a list, archive or JSON.
+    """
+    return list(iter_records(filename))
+
+
+def write_records(records, filename):
+    """
+    Writes records in the format of filename's suffix: an archive for .jsonl.zst/.jsonl.gz, a
+    JSON array (indented, as the files were written before) otherwise. The other versions of the
+    file are removed, so a reader never finds an outdated one. Returns the path written.
+    """
+    filename = Path(filename)
+    if is_archive(filename):
+        write_archive(records, filename)
+    else:
+        filename.parent.mkdir(parents=True, exist_ok=True)
+        with open(filename, "w", encoding="utf-8") as f:
+            json.dump(list(records), f, ensure_ascii=False, indent=4)
+    stem, suffix = _split_suffix(filename)
+    for other_suffix in (*ARCHIVE_SUFFIXES, ".json"):
+        if suffix and other_suffix != suffix:
+            for other in (Path(stem + other_suffix), Path(stem + other_suffix + INDEX_SUFFIX)):
+                if other.exists():
+                    os.remove(other)
+    return filename
+
+
+def convert(filename, remove_json=False):
+    """
+    Archives a JSON records file next to it. Returns (archive path, JSON bytes, archive bytes).
+    """
+    filename = Path(filename)
+    target = archive_path(filename)
+    with open(filename, "r", encoding="utf-8") as f:
+        write_archive(json.load(f), target)
+    sizes = (filename.stat().st_size, target.stat().st_size + Path(str(target) + INDEX_SUFFIX).stat().st_size)
+    if remove_json:
+        os.remove(filename)
+    return target, *sizes
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Archive the *_raw.json and *_paper.json files of a directory.")
+    parser.add_argument("directory", nargs="?", default="data/raw_data")
+    parser.add_argument("--remove-json", action="store_true", help="Delete each JSON file once it is archived")
+    args = parser.parse_args()
+
+    total_json = total_archive = 0
+    for filename in sorted(Path(args.directory).rglob("*.json")):
+        if not filename.name.endswith(("_raw.json", "_paper.json")):
+            continue
+        target, json_bytes, archive_bytes = convert(filename, args.remove_json)
+        total_json += json_bytes
+        total_archive += archive_bytes
+        print(f"📦 {filename} -> {target.name}: {json_bytes / 2**20:.1f} MiB -> {archive_bytes / 2**20:.1f} MiB")
+    if total_archive:
+        print(f"✅ {total_json / 2**20:.1f} MiB -> {total_archive / 2**20:.1f} MiB "
+              f"({total_json / total_archive:.1f}x smaller)")
@@ -0,0 +1,209 @@
+"""
+Full-text index over the titles, abstracts and author keywords of the papers in the paper store,
+so a Scopus TITLE-ABS-KEY query can be answered (approximately) from the papers already fetched.
+
+The index is an SQLite FTS5 table in the paper store's database, updated by PaperStore.add_papers,
+so it grows as papers are fetched. A query log records which keyword/year searches went to the API
+and whether all their results were fetched; a new query that only narrows a completely fetched one
+(e.g. "machine learning and policy" after "machine learning") is then answered locally, without an API
+call. The answer is approximate: FTS5 with porter stemming over the title, abstract and author keywords
+does not reproduce TITLE-ABS-KEY, which also matches Scopus' indexed terms and stems words its own way.
+
+    python -m src.storage.search_index "machine learning and policy" --year 2023
+"""
+import argparse
+import re
+import sqlite3
+from datetime import datetime, timezone
+
+SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS paper_fts USING fts5(
+    paper_key UNINDEXED,
+    title,
+    abstract,
+    keywords,
+    tokenize = 'porter unicode61 remove_diacritics 2'
+);
+
+-- One row per keyword/year search sent to the API
+CREATE TABLE IF NOT EXISTS query_log (
+    keyword TEXT NOT NULL,
+    year INTEGER NOT NULL,
+    fetched INTEGER NOT NULL,
+    complete INTEGER NOT NULL,
+    queried_at TEXT NOT NULL,
+    PRIMARY KEY (keyword, year)
+);
+"""
+
+# Quoted phrases ("..." loose, {...} exact in Scopus), parentheses, or words (with * wildcards)
+TOKEN_PATTERN = re.compile(r'"([^"]*)"|\{([^}]*)\}|(\()|(\))|([^\s(){}"]+)')
+OPERATORS = {"and", "or", "not"}
+
+
+def fts_available():
+    """
+    FTS5 is compiled into the sqlite3 of most Python builds, but not all of them.
+    """
+    try:
+        sqlite3.connect(":memory:").execute("CREATE VIRTUAL TABLE t USING fts5(x)")
+        return True
+    except sqlite3.OperationalError:
+        return False
+
+
+def _tokens(query):
+    for phrase, exact, open_paren, close_paren, word in TOKEN_PATTERN.findall(query):
+        if open_paren or close_paren:
+            yield ("paren", open_paren or close_paren)
+        elif word.lower() in OPERATORS:
+            yield ("operator", word.upper())
+        else:
+            text = phrase or exact or word
+            # Only letters and digits are indexed, anything else splits words (as in "test-time")
+            words = re.findall(r"\w+\*?", text.lower())
+            if words:
+                yield ("term", " ".join(words))
+
+
+def _fts_term(term):
+    # A quoted string is a phrase in FTS5; a trailing * (Scopus wildcard) becomes a prefix query
+    if term.endswith("*") and " " not in term:
+        return f'"{term[:-1]}"*'
+    return '"' + term.replace("*", "") + '"'
+
+
+def to_fts_query(query):
+    """
+    Translates a Scopus style search string (the text inside TITLE-ABS-KEY(...)) to an FTS5 query.
+    Terms next to each other are ANDed, as Scopus does; "AND NOT" becomes FTS5's NOT.
+    """
+    parts = []
+    previous = None
+    for kind, value in _tokens(query):
+        if kind == "operator":
+            if value == "NOT" and previous == "AND":
+                parts[-1] = "NOT"
+            elif previous in ("term", ")"):
+                parts.append(value)
+            previous = value
+            continue
+        if kind == "paren" and value == ")":
+            parts.append(")")
+            previous = ")"
+            continue
+        # A term or "(" right after a term or ")" is an implicit AND
+        if previous in ("term", ")"):
+            parts.append("AND")
+        parts.append("(" if kind == "paren" else _fts_term(value))
+        previous = "(" if kind == "paren" else "term"
+    while parts and parts[-1] in ("AND", "OR", "NOT"):
+        parts.pop()
+    if not parts:
+        raise ValueError(f"Nothing to search in {query!r}")
+    return " ".join(parts)
+
+
+def query_terms(query):
+    """
+    Returns the set of terms of a query made of ANDed terms only, or None if it uses OR, NOT or
+    parentheses. A query whose terms include all the terms of another one can only narrow it.
+    """
+    terms = set()
+    for kind, value in _tokens(query):
+        if kind == "paren" or (kind == "operator" and value != "AND"):
+            return None
+        if kind == "term":
+            terms.add(value)
+    return frozenset(terms)
+
+
+def index_papers(conn, papers):
+    """
+    Adds (or re-indexes) papers in the FTS table. papers is an iterable of (paper_key, record, raw_entry)
+    tuples, as given to PaperStore.add_papers; the author keywords come from the raw entry when there is one.
+    """
+    rows = []
+    for key, record, entry in papers:
+        keywords = (entry or {}).get("authkeywords") or ""
+        title, abstract = record.get("paper_title"), record.get("Abstract")
+        rows.append((key, "" if title in (None, "NA") else title, "" if abstract in (None, "NA") else abstract,
+                     keywords.replace("|", " ")))
+    conn.executemany("DELETE FROM paper_fts WHERE paper_key = ?", [(row[0],) for row in rows])
+    conn.executemany("INSERT INTO paper_fts (paper_key, title, abstract, keywords) VALUES (?, ?, ?, ?)", rows)
+
+
+class SearchIndex:
+    """
+    Local search over a PaperStore.
+    """
+
+    def __init__(self, store):
+        if not store.has_fts:
+            raise RuntimeError("The sqlite3 module of this Python build has no FTS5 support")
+        self.conn = store.conn
+
+    def search(self, query, year=None, limit=None):
+        """
+        Returns the keys of the local papers matching a Scopus style query, most cited first
+        (the order the API is queried in).
+        """
+        sql = (
+            "SELECT p.paper_key FROM paper_fts f JOIN papers p ON p.paper_key = f.paper_key "
+            "WHERE paper_fts MATCH ?"
+        )
+        params = [to_fts_query(query)]
+        if year is not None:
+            sql += " AND p.year = ?"
+            params.append(year)
+        sql += " ORDER BY p.citied_by DESC, p.paper_key"
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(limit)
+        return [row[0] for row in self.conn.execute(sql, params)]
+
+    def log_query(self, query, year, fetched, complete):
+        """
+        Records an API search. complete means every result of the search was fetched.
+        """
+        self.conn.execute(
+            "INSERT INTO query_log (keyword, year, fetched, complete, queried_at) VALUES (?, ?, ?, ?, ?) "
+            "ON CONFLICT (keyword, year) DO UPDATE SET fetched = excluded.fetched, "
+            "complete = excluded.complete, queried_at = excluded.queried_at",
+            (query.lower(), year, fetched, int(complete), datetime.now(timezone.utc).isoformat()),
+        )
+        self.conn.commit()
+
+    def covering_query(self, query, year):
+        """
+        Returns a logged, completely fetched search of the same year that the query can only narrow,
+        or None. When there is one, every result of the query is already in the store.
+        """
+        terms = query_terms(query)
+        if not terms:
+            return None
+        rows = self.conn.execute("SELECT keyword FROM query_log WHERE year = ? AND complete = 1", (year,))
+        for (logged,) in rows:
+            logged_terms = query_terms(logged)
+            if logged_terms and logged_terms <= terms:
+                return logged
+        return None
+
+
+if __name__ == "__main__":
+    from .paper_store import PaperStore
+
+    parser = argparse.ArgumentParser(description="Search the papers already fetched.")
+    parser.add_argument("query", help="A Scopus style query, e.g. \"machine learning and policy\"")
+    parser.add_argument("--year", type=int)
+    parser.add_argument("--limit", type=int, default=20)
+    args = parser.parse_args()
+
+    with PaperStore() as store:
+        keys = SearchIndex(store).search(args.query, args.year, args.limit)
+        titles = dict(store.conn.execute(
+            f"SELECT paper_key, paper_title FROM papers WHERE paper_key IN ({', '.join('?' * len(keys))})", keys
+        ))
+        for key in keys:
+            print(f"{key}\t{titles[key]}")
+        print(f"✅ {len(keys)} local results")
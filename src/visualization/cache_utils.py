@@ -1,10 +1,21 @@
+import io
 import re
 import json
 import pathlib
 import pandas as pd
 import streamlit as st
+from PIL import Image
 from unidecode import unidecode
 
+def clean_region_name(name):
+    """
+    The key regions are joined on between the crdi csv (state_name) and the GeoJSON (clean_name):
+    lowercase ASCII letters and digits only, so "Washington, D.C." and "washington,d.c." both give "washingtondc".
+    """
+    if not isinstance(name, str):
+        return name
+    return re.sub(r'[^a-z0-9]', '', unidecode(name.lower()).lower())
+
 @st.cache_data(show_spinner=False)
 def load_geojson():
     geojson_path = pathlib.Path("data") / "raw_data" / "provinces_worldwide.json"
@@ -12,12 +23,7 @@ def load_geojson():
         geodata = json.load(f)
 
         for province in geodata["features"]:
-            name = province["properties"].get("name", "")
-            if isinstance(name, str):
-                name = name.lower()
-                name = unidecode(name)
-                name = re.sub(r'[^a-z0-9]', '', name)
-            province["properties"]["clean_name"] = name
+            province["properties"]["clean_name"] = clean_region_name(province["properties"].get("name", ""))
 
     return geodata
 
@@ -25,3 +31,48 @@ def load_geojson():
 def load_csv(keywords, year):
     csv_path = pathlib.Path("data") / "output_data" / "state_crdi" / f"{keywords}_{year}_state_crdi.csv"
     return pd.read_csv(csv_path, encoding="utf-8", sep=";")
+
+@st.cache_data(show_spinner=False, max_entries=64)
+def load_thumbnail(image_path, mtime, max_width=800):
+    """
+    Returns a downscaled PNG preview of an output image as bytes.
+
+    The file's modification time is part of the cache key, so a rerun of the pipeline
+    that rewrites the image invalidates the old preview.
+    """
+    with Image.open(image_path) as img:
+        img.thumbnail((max_width, max_width))
+        buffer = io.BytesIO()
+        img.save(buffer, format="PNG", optimize=True)
+    return buffer.getvalue()
+
+@st.cache_data(show_spinner=False)
+def load_crdi_summary(keywords):
+    """
+    Loads the crdi summary statistics written by the cleaning pipeline, or None if there is none yet.
+    """
+    summary_path = pathlib.Path("data") / "output_data" / "state_crdi" / f"{keywords}_crdi_summary.json"
+    if not summary_path.exists():
+        return None
+    with summary_path.open("r", encoding="utf-8") as f:
+        summary = json.load(f)
+    return summary if summary.get("count") else None
+
+@st.cache_data(show_spinner=False)
+def load_region_flows(keywords, year):
+    """
+    Loads the region-to-region collaboration flows written by the cleaning pipeline, or None if there are none.
+    """
+    flows_path = pathlib.Path("data") / "output_data" / "collaboration" / f"{keywords}_{year}_region_flows.csv"
+    if not flows_path.exists():
+        return None
+    return pd.read_csv(flows_path, encoding="utf-8", sep=";")
+
+def clear_keyword_caches():
+    """
+    Drops the cached outputs of the cleaning pipeline (crdi csv, crdi summary, region flows), which are
+    keyed on the keyword and year only, so a search that reruns the pipeline is shown with its new files.
+    """
+    load_csv.clear()
+    load_crdi_summary.clear()
+    load_region_flows.clear()
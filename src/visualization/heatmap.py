@@ -2,9 +2,114 @@ import streamlit as st
 import plotly.express as px
 import plotly.graph_objects as go
 from plotly.subplots import make_subplots
-from .cache_utils import load_geojson, load_csv
+import numpy as np
+import pandas as pd
+from .cache_utils import load_geojson, load_csv, load_crdi_summary, load_region_flows, clean_region_name
+from ..instrumentation import instrument
 from concurrent.futures import ProcessPoolExecutor, as_completed
 
+COMBINED_COLORS = [
+    "#D1D4FC", "#B0B5FA", "#8E96F5", "#6E7CEF",
+    "#5A65C9", "#464FA0", "#333C80"
+]
+# Only the strongest collaboration flows are drawn, in a few line widths
+MAX_FLOW_LINES = 40
+FLOW_LINE_WIDTHS = [1, 2.5, 4]
+FLOW_LINE_COLOR = "rgba(199, 130, 71, 0.7)"
+
+
+def quantile_colorscale(summary, colors=COMBINED_COLORS):
+    """
+    Builds a stepped Plotly colorscale whose bins hold (about) the same number of regions.
+
+    The bin edges are the precomputed "color_bins" quantiles of the crdi summary, so they are
+    computed once by the pipeline instead of from the loaded data on every render.
+
+    Parameters:
+        summary (dict): The crdi summary loaded by load_crdi_summary.
+        colors (list): One color per bin.
+
+    Returns:
+        list: [position, color] pairs usable as a Plotly colorscale on the [min, max] range.
+    """
+    low, high = summary["min"], summary["max"]
+    span = (high - low) or 1.0
+    edges = [min(max((edge - low) / span, 0.0), 1.0) for edge in summary["color_bins"]]
+    # Bin i covers [edges[i], edges[i + 1]]; its color depends on where it sits among len(colors)
+    n_bins = len(edges) - 1
+    scale = []
+    for i in range(n_bins):
+        color = colors[min(i * len(colors) // n_bins, len(colors) - 1)]
+        scale.append([edges[i], color])
+        scale.append([edges[i + 1], color])
+    scale[0][0], scale[-1][0] = 0.0, 1.0
+    return scale
+
+def region_centroids(geojson_data, names):
+    """
+    Returns {clean_name: (lat, lon)} for the given regions: the mean vertex of each region's largest ring,
+    which is close enough to the center to anchor a flow line.
+    """
+    names = set(names)
+    centroids = {}
+    for feature in geojson_data["features"]:
+        name = feature["properties"].get("clean_name")
+        geometry = feature.get("geometry")
+        if name not in names or name in centroids or not geometry:
+            continue
+        if geometry["type"] == "Polygon":
+            rings = [geometry["coordinates"][0]]
+        elif geometry["type"] == "MultiPolygon":
+            rings = [polygon[0] for polygon in geometry["coordinates"]]
+        else:
+            continue
+        ring = np.asarray(max(rings, key=len), dtype=float)
+        lon, lat = ring[:-1].mean(axis=0) if len(ring) > 1 else ring[0]
+        centroids[name] = (lat, lon)
+    return centroids
+
+
+def add_flow_lines(fig, flows, geojson_data, max_lines=MAX_FLOW_LINES):
+    """
+    Draws the strongest collaboration flows between regions as lines on a map figure.
+
+    Parameters:
+        fig (plotly.graph_objects.Figure): A figure with a map, e.g. from main_heatmap.
+        flows (pandas.DataFrame): source_region, target_region, weight (see cleaning.collaboration).
+        geojson_data: The GeoJSON of the map, to place the lines.
+        max_lines (int): How many flows to draw.
+
+    Returns:
+        plotly.graph_objects.Figure: The same figure. Each line width is one trace, and a trace holds
+        all its lines separated by None, so the number of traces does not grow with the flows.
+    """
+    flows = flows[flows["source_region"] != flows["target_region"]].nlargest(max_lines, "weight")
+    centroids = region_centroids(geojson_data, pd.concat([flows["source_region"], flows["target_region"]]))
+    flows = flows[flows["source_region"].isin(centroids) & flows["target_region"].isin(centroids)]
+    if flows.empty:
+        return fig
+    # Equal-width bins over the weights give the line width of each flow
+    bins = np.linspace(flows["weight"].min(), flows["weight"].max(), len(FLOW_LINE_WIDTHS) + 1)
+    width_index = np.clip(np.searchsorted(bins, flows["weight"], side="right") - 1, 0, len(FLOW_LINE_WIDTHS) - 1)
+    for i, width in enumerate(FLOW_LINE_WIDTHS):
+        selected = flows[width_index == i]
+        if selected.empty:
+            continue
+        lats, lons, texts = [], [], []
+        for source, target, weight in selected[["source_region", "target_region", "weight"]].itertuples(index=False):
+            (lat0, lon0), (lat1, lon1) = centroids[source], centroids[target]
+            label = f"{source} ↔ {target}: {weight:.1f}"
+            lats += [lat0, lat1, None]
+            lons += [lon0, lon1, None]
+            texts += [label, label, None]
+        fig.add_trace(go.Scattermap(
+            lat=lats, lon=lons, mode="lines", text=texts, hoverinfo="text",
+            line=dict(width=width, color=FLOW_LINE_COLOR), showlegend=False,
+            name="Collaboration",
+        ))
+    return fig
+
+@instrument()
 def main_heatmap(keywords, year, geojson_data=None):
     """
     Generates a choropleth map for a given year using pre-loaded data.
@@ -21,12 +126,18 @@ def main_heatmap(keywords, year, geojson_data=None):
     if geojson_data is None:
         geojson_data = load_geojson()
     df = load_csv(keywords, year)
+    # The pipeline keeps punctuation in state_name ("washington,d.c."), the GeoJSON key does not
+    df['state_name'] = df['state_name'].map(clean_region_name)
     
     # Create a mapping from cleaned name to original name from the GeoJSON
     mapping = {feature['properties']['clean_name']: feature['properties']['name']
                for feature in geojson_data['features']}
     # Add a new column to the DataFrame for display purposes using the original name
     df['region_display'] = df['state_name'].map(mapping)
+
+    # Use the keyword's range over all years (precomputed by the pipeline) so every year shares one scale
+    summary = load_crdi_summary(keywords)
+    range_color = (summary["min"], summary["max"]) if summary else None
     
     # Create a choropleth map using Plotly Express, with custom_data for displaying the original name
     fig = px.choropleth_map(
@@ -39,6 +150,7 @@ def main_heatmap(keywords, year, geojson_data=None):
             "#E9F8F6", "#C2DEDB", "#9CC4C1", "#75AAA6",
             "#4D908A", "#277670", "#005C55"
         ],                                          # Custom color scale
+        range_color=range_color,                    # Shared range across years, if known
         map_style="carto-positron",                 # Map style
         center={"lat": 20, "lon": 160},             # Map center coordinates
         zoom=0.8,                                   # Zoom level
@@ -65,6 +177,13 @@ def main_heatmap(keywords, year, geojson_data=None):
         ),
         marker_line_width=0
     )
+
+    # Collaboration links between regions, when the pipeline had the full author lists
+    flows = load_region_flows(keywords, year)
+    if flows is not None:
+        flows = flows.assign(source_region=flows["source_region"].map(clean_region_name),
+                             target_region=flows["target_region"].map(clean_region_name))
+        add_flow_lines(fig, flows, geojson_data)
     
     return fig
 
@@ -98,6 +217,7 @@ def create_map_and_left_timeline_figure(n: int):
     return fig
 
 
+@instrument()
 def generate_heatmaps(keywords: str, years: list, geojson_data):
     """
     Generate heatmaps for each year in parallel.
@@ -183,8 +303,9 @@ def add_maps_and_left_timeline(fig, heatmap_results: dict, years: list):
         row_idx = idx + 1
         single_fig = heatmap_results[year]
         for trace in single_fig.data:
-            # Bind the trace to a common coloraxis.
-            trace.update(coloraxis='coloraxis')
+            # Bind the choropleth to a common coloraxis (flow lines have no colors to share).
+            if trace.type == "choroplethmap":
+                trace.update(coloraxis='coloraxis')
             fig.add_trace(trace, row=row_idx, col=2)
         map_key = "map" if row_idx == 1 else f"map{row_idx}"
         if map_key in fig.layout:
@@ -195,7 +316,8 @@ def add_maps_and_left_timeline(fig, heatmap_results: dict, years: list):
             })
 
 
-def combined_heatmaps_vertical_with_left_timeline(keywords: str, years: list):
+@instrument("heatmap_render")
+def combined_heatmaps_vertical_with_left_timeline(keywords: str, years: list, binned: bool = False):
     """
     Combines multiple year-based heatmaps (arranged vertically) with a left-side timeline.
     
@@ -205,6 +327,8 @@ def combined_heatmaps_vertical_with_left_timeline(keywords: str, years: list):
     Parameters:
         keywords (str): The research keywords used to filter the data.
         years (list): A list of integer years to be visualized.
+        binned (bool): Use quantile-binned colors instead of a linear scale
+                       (needs the crdi summary written by the cleaning pipeline).
     
     Returns:
         plotly.graph_objects.Figure: The final Plotly figure combining the left timeline and vertical heatmaps.
@@ -214,6 +338,15 @@ def combined_heatmaps_vertical_with_left_timeline(keywords: str, years: list):
     geojson_data = load_geojson()
     heatmap_results = generate_heatmaps(keywords, years, geojson_data)
     add_maps_and_left_timeline(fig, heatmap_results, years)
+
+    # The color range comes from the precomputed summary; without one Plotly falls back to the loaded data
+    summary = load_crdi_summary(keywords)
+    colorscale = COMBINED_COLORS
+    color_range = {}
+    if summary:
+        color_range = {"cmin": summary["min"], "cmax": summary["max"]}
+        if binned:
+            colorscale = quantile_colorscale(summary)
     
     # Apply unified coloraxis settings and overall layout configuration.
     fig.update_layout(
@@ -225,13 +358,30 @@ def combined_heatmaps_vertical_with_left_timeline(keywords: str, years: list):
         title_font=dict(size=22, family="Arial", color="black"), 
         margin={"r": 20, "t": 50, "l": 20, "b": 20},
         coloraxis=dict(
-            colorscale=[
-                "#D1D4FC", "#B0B5FA", "#8E96F5", "#6E7CEF",
-                "#5A65C9", "#464FA0", "#333C80"
-            ],
+            colorscale=colorscale,
+            **color_range,
             colorbar=dict(title=dict(text='Research Density',
                                      font=dict(size=18)),
                           tickfont=dict(size=14))
         )
     )
     return fig
+
+
+@st.cache_resource(show_spinner="Building the research distribution map...")
+def cached_combined_heatmaps(keywords: str, years: tuple, binned: bool = False):
+    """
+    Cached wrapper of combined_heatmaps_vertical_with_left_timeline.
+
+    The figure is built once per (keywords, years) pair and shared across Streamlit reruns,
+    so interacting with other widgets does not regenerate every yearly map.
+
+    Parameters:
+        keywords (str): The research keywords used to filter the data.
+        years (tuple): A tuple of integer years (hashable, so it can be used as a cache key).
+        binned (bool): Use quantile-binned colors instead of a linear scale.
+
+    Returns:
+        plotly.graph_objects.Figure: The combined figure.
+    """
+    return combined_heatmaps_vertical_with_left_timeline(keywords, list(years), binned)
@@ -0,0 +1,113 @@
+from src import batch_search
+from src.storage.paper_store import PaperStore
+from src.storage.raw_archive import read_records
+
+# Same loader as the batch mode: the "-" in src/api-calling rules out a normal import
+keyword_search_module = batch_search.load_api_module("keyword_search")
+affiliation_module = batch_search.load_api_module("affiliation_state_match")
+
+# A paper found by two keywords is fetched once
+def test_batch_fetches_shared_papers_once(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    results = {
+        "ai": [{"eid": "2-s2.0-1"}, {"eid": "2-s2.0-2"}],
+        "policy": [{"eid": "2-s2.0-2"}, {"eid": "2-s2.0-3"}],
+    }
+    fetched = []
+    def fake_fetch_by_eid(eids, label=None):
+        fetched.extend(eids)
+        return [{"eid": eid, "dc:title": eid, "affiliation": []} for eid in eids]
+    monkeypatch.setattr(keyword_search_module, "fetch_paper_ids", lambda keyword, year, max_results: results[keyword])
+    monkeypatch.setattr(keyword_search_module, "fetch_papers_by_eid", fake_fetch_by_eid)
+
+    with PaperStore(tmp_path / "papers.sqlite") as store:
+        counts = batch_search.collect_papers(keyword_search_module, store, ["ai", "policy"], [2023])
+        assert sorted(fetched) == ["2-s2.0-1", "2-s2.0-2", "2-s2.0-3"]
+        assert counts == {("ai", 2023): 2, ("policy", 2023): 1}
+        assert [paper["paper_title"] for paper in store.papers("policy", 2023)] == ["2-s2.0-2", "2-s2.0-3"]
+        assert store.conn.execute("SELECT COUNT(*) FROM papers").fetchone()[0] == 3
+
+        # A second run finds everything in the store and calls nothing
+        fetched.clear()
+        batch_search.collect_papers(keyword_search_module, store, ["ai", "policy"], [2023])
+        assert fetched == []
+
+# A keyword narrowing a completely fetched one is answered by the local index
+def test_batch_answers_narrower_keyword_locally(tmp_path, monkeypatch):
+    listed = []
+    def fake_fetch_ids(keyword, year, max_results):
+        listed.append(keyword)
+        keyword_search_module.TOTAL_RESULTS[(keyword, year)] = 2
+        return [{"eid": "2-s2.0-1"}, {"eid": "2-s2.0-2"}]
+    def fake_fetch_by_eid(eids, label=None):
+        titles = {"2-s2.0-1": "Machine learning for policy", "2-s2.0-2": "Machine learning in medicine"}
+        return [{"eid": eid, "dc:title": titles[eid], "citedby-count": "1", "prism:coverDate": "2023-01-01"}
+                for eid in eids]
+    monkeypatch.setattr(keyword_search_module, "fetch_paper_ids", fake_fetch_ids)
+    monkeypatch.setattr(keyword_search_module, "fetch_papers_by_eid", fake_fetch_by_eid)
+
+    with PaperStore(tmp_path / "papers.sqlite") as store:
+        batch_search.collect_papers(keyword_search_module, store, ["machine learning", "machine learning and policy"], [2023])
+        assert listed == ["machine learning"]
+        assert store.keyword_keys("machine learning and policy", 2023) == ["2-s2.0-1"]
+
+# A search whose papers did not all reach the store covers nothing: DOI-only results, failed fetches
+def test_incomplete_store_does_not_answer_narrower_keyword(tmp_path, monkeypatch):
+    listed = []
+    def fake_fetch_ids(keyword, year, max_results):
+        listed.append(keyword)
+        keyword_search_module.TOTAL_RESULTS[(keyword, year)] = 3
+        return [{"eid": "2-s2.0-1"}, {"eid": "2-s2.0-2"}, {"prism:doi": "10.1/x"}]
+    def fake_fetch_by_eid(eids, label=None):
+        # The request for the second paper failed
+        return [{"eid": "2-s2.0-1", "dc:title": "Machine learning for policy", "citedby-count": "1",
+                 "prism:coverDate": "2023-01-01"}]
+    monkeypatch.setattr(keyword_search_module, "fetch_paper_ids", fake_fetch_ids)
+    monkeypatch.setattr(keyword_search_module, "fetch_papers_by_eid", fake_fetch_by_eid)
+
+    with PaperStore(tmp_path / "papers.sqlite") as store:
+        batch_search.collect_papers(keyword_search_module, store, ["machine learning", "machine learning and policy"], [2023])
+        assert listed == ["machine learning", "machine learning and policy"]
+
+# The app's single-keyword fetch also answers narrower keywords locally, and logs its own API searches
+def test_single_keyword_fetch_answers_narrower_keyword_locally(tmp_path, monkeypatch):
+    titles = {"2-s2.0-1": "Machine learning for policy", "2-s2.0-2": "Machine learning in medicine"}
+    searched = []
+    def fake_fetch(keywords, year):
+        searched.append(keywords)
+        keyword_search_module.TOTAL_RESULTS[(keywords, year)] = 2
+        return [{"eid": eid, "dc:title": title, "citedby-count": "1", "prism:coverDate": "2023-01-01"}
+                for eid, title in titles.items()]
+    monkeypatch.setattr(keyword_search_module, "fetch_results_with_cursor", fake_fetch)
+
+    with PaperStore(tmp_path / "papers.sqlite") as store:
+        broad = [(2023, tmp_path / "machinelearning_2023_raw.jsonl.gz")]
+        api_searches = keyword_search_module.fetch_keyword_years("machine learning", broad, store)
+        keyword_search_module.update_paper_store(store, "machine learning", broad, api_searches)
+
+        narrow = [(2023, tmp_path / "machinelearningandpolicy_2023_raw.jsonl.gz")]
+        assert keyword_search_module.fetch_keyword_years("machine learning and policy", narrow, store) == {}
+        assert searched == ["machine learning"]
+        assert [entry["eid"] for entry in read_records(narrow[0][1])] == ["2-s2.0-1"]
+
+def test_paper_key_falls_back_to_doi():
+    assert keyword_search_module.paper_key({"eid": "2-s2.0-1", "prism:doi": "10.1/X"}) == "2-s2.0-1"
+    assert keyword_search_module.paper_key({"prism:doi": "10.1/X"}) == "doi:10.1/x"
+    assert keyword_search_module.paper_key({}) is None
+
+# Each affiliation is matched once, whichever keywords it appears in
+def test_update_state_dict_only_looks_up_new_affiliations(monkeypatch):
+    looked_up = []
+    monkeypatch.setattr(affiliation_module, "affiliation_state", lambda afid: looked_up.append(afid) or "IL")
+
+    state_dict = affiliation_module.update_state_dict({"1", "2"}, {"1": "CA"})
+
+    assert looked_up == ["2"]
+    assert state_dict == {"1": "CA", "2": "IL"}
+
+def test_read_keywords_merges_file_and_duplicates(tmp_path):
+    keywords_file = tmp_path / "keywords.txt"
+    keywords_file.write_text("# nightly topics\nquantum computing\nMachine Learning and Policy\n")
+    args = type("Args", (), {"keywords": ["machine learning and policy"], "keywords_file": keywords_file})
+
+    assert batch_search.read_keywords(args) == ["machine learning and policy", "quantum computing"]
@@ -7,8 +7,21 @@ import json
 
 
 from src.cleaning.utils import remove, process_word_list, ignore
-from src.cleaning.clean_data import calculate_crdi, clean_columns, clean_duplicates, AREA_DF, match_na_state
+from src.cleaning.clean_data import calculate_crdi, clean_columns, clean_duplicates, AREA_DF, match_na_state, match_nocode_state, summarize_crdi
 from src.cleaning.feature_selecting import preprocess_title
+from src.cleaning.render import render_word_cloud, render_feature_coefs, render_batch
+from src.cleaning.visualize_words_yr import generate_word_frq_yearlygif, build_word_frq_animation, top_words_by_year
+from src.cleaning.word_store import WordFreqStore
+from src.cleaning.index_engine import build_aggregate_table, evaluate_indices, register_index, INDEX_VARIANTS
+from src.cleaning.authorship import normalize_entries, fractional_counts, save_tables, load_tables
+from src.cleaning.collaboration import coauthorship_matrix, build_collaboration
+from src.cleaning import normalization
+from src.cleaning.normalization import NormalizationCache, normalize_column
+from src.cleaning.schema import apply_paper_schema
+from src.cleaning.gazetteer import Gazetteer, build_gazetteer
+from src.cleaning import clean_data, geocode
+from src.cleaning.geocode import ProvinceIndex
+from src.cleaning.fuzzy_match import StateMatcher, COUNTRY_ALIASES, STATE_ALIASES
 
 
 @pytest.mark.parametrize("input_words, expected_output", [
@@ -157,6 +170,152 @@ def test_NA_match(test_NA_sample):
     assert len(result_df.loc[(result_df["state_name"] == "zabol"), "area_km2"].tolist()) == 0
 
 
+def test_NA_match_through_the_gazetteer(test_NA_sample, tmp_path):
+    """ Cities that are not a province name are placed by the offline gazetteer, per country """
+    seed = tmp_path / "seed.csv"
+    seed.write_text("city,country,state_name\nZabol,Iran,Sistan and Baluchestan\nParis,Texas,Nowhere\n", encoding="utf-8")
+    observations = pd.DataFrame({
+        "affiliation_city": ["Cambridge", "Cambridge", "Cambridge", "Cambridge"],
+        "affiliation_country": ["United States", "United States", "United Kingdom", "United States"],
+        "state_name": ["Massachusetts", "Massachusetts", "Cambridgeshire", "Maryland"],
+    })
+    gazetteer = build_gazetteer(observations, seed)
+    # The region most papers of a city were matched to
+    assert gazetteer.lookup("Cambridge", "United States") == "massachusetts"
+    assert gazetteer.lookup("cambridge", "unitedkingdom") == "cambridgeshire"
+    assert gazetteer.lookup("Zabol", "Iran") == "sistanandbaluchestan"
+    assert gazetteer.lookup("Zabol", "Pakistan") is None
+    assert gazetteer.resolve(pd.Series(["cambridge", None, "zabol"]), pd.Series(["unitedstates", "iran", "iran"])).tolist() == \
+        ["massachusetts", None, "sistanandbaluchestan"]
+
+    gazetteer.save(tmp_path / "gazetteer.json")
+    gazetteer = Gazetteer.load(tmp_path / "gazetteer.json")
+    result_df = match_na_state(test_NA_sample, gazetteer)
+    assert result_df.loc[result_df["affiliation_name"] == "C", "state_name"].tolist() == ["sistanandbaluchestan"]
+    assert result_df["area_km2"].notna().all()
+    # Without the gazetteer, zabol stays unmatched
+    assert match_na_state(test_NA_sample, Gazetteer())["area_km2"].isna().sum() == 1
+
+
+def test_state_matcher_resolves_variants_within_their_country(tmp_path):
+    """ Spelling variants, exonyms and Scopus country names are matched, and the outcomes are kept in the alias table """
+    path = tmp_path / "aliases.json"
+    matcher = StateMatcher(AREA_DF, path)
+    pairs = pd.DataFrame([
+        ("sindh", "pakistan", "sind"),
+        ("stockholms", "sweden", "stockholm"),
+        ("tunapuna-piarco", "trinidadandtobago", "tunapuna/piarco"),
+        ("bavaria", "germany", "bayern"),
+        ("sverdlovskaya", "russianfederation", "sverdlovsk"),
+        # Not within the country, too short to be fuzzed, too far from any name
+        ("sindh", "india", None),
+        ("mi", "unitedstates", None),
+        ("westyorkshire", "unitedkingdom", None),
+    ], columns=["state", "country", "expected"])
+    assert matcher.match_states(pairs["state"], pairs["country"]).tolist() == pairs["expected"].tolist()
+    assert matcher.match_countries(pd.Series(["russianfederation", "sweden", None])).tolist() == ["russia", "sweden", None]
+    matcher.save()
+
+    reloaded = StateMatcher(AREA_DF, path)
+    assert reloaded.aliases["states"]["pakistan"] == {"sindh": "sind"}
+    assert reloaded.aliases["states"]["unitedkingdom"] == {"westyorkshire": None}
+    # Entries of the table are used as they are, so a hand-set one overrides the fuzzy match
+    reloaded.aliases["states"]["sweden"]["stockholms"] = "uppsala"
+    assert reloaded.match_state("stockholms", "sweden") == "uppsala"
+    assert not reloaded.dirty
+
+
+def test_match_nocode_state_fuzzy(tmp_path):
+    """ States that are not exactly a province name get the area of the province they are matched to """
+    unmatched = pd.DataFrame({
+        "affiliation_state": ["sindh", "gyeonggi-do", "texas", "nowhereland"],
+        "affiliation_name": ["a", "b", "c", "d"],
+        "affiliation_country": ["pakistan", "southkorea", "unitedstates", "pakistan"],
+        "citied_by": [1, 2, 3, 4],
+        "cover_date": ["2023-03-07"] * 4,
+    })
+    result = match_nocode_state(unmatched, StateMatcher(AREA_DF, tmp_path / "aliases.json")).set_index("affiliation_name")
+    assert result.loc[["a", "b", "c"], "state_name"].tolist() == ["sind", "gyeonggi", "texas"]
+    assert result.loc[["a", "b", "c"], "area_km2"].notna().all()
+    assert pd.isna(result.loc["d", "state_name"])
+
+
+def test_alias_targets_are_province_names():
+    area_countries = set(AREA_DF["country_name"].astype(object))
+    assert set(COUNTRY_ALIASES.values()) <= area_countries
+    area_states = set(zip(AREA_DF["state_name"].astype(object), AREA_DF["country_name"].astype(object)))
+    assert all((state, country) in area_states for country, states in STATE_ALIASES.items() for state in states.values())
+
+
+def square(x, y, size):
+    return [[x, y], [x + size, y], [x + size, y + size], [x, y + size], [x, y]]
+
+PROVINCE_FEATURES = [
+    # A province with a hole (an enclave), the enclave, and a province in two parts
+    {"properties": {"name": "Sistan and Baluchestan", "admin": "Iran"},
+     "geometry": {"type": "Polygon", "coordinates": [square(0, 0, 4), square(1, 1, 1)]}},
+    {"properties": {"name": "Washington, D.C.", "admin": "United States of America"},
+     "geometry": {"type": "Polygon", "coordinates": [square(1, 1, 1)]}},
+    {"properties": {"name": "Zabol", "admin": "Afghanistan"},
+     "geometry": {"type": "MultiPolygon", "coordinates": [[square(10, 10, 1)], [square(20, -5, 2.5)]]}},
+    {"properties": {"name": "No geometry", "admin": "Nowhere"}, "geometry": None},
+]
+
+@pytest.mark.parametrize("use_shapely", [False, True])
+def test_province_index_locates_points(use_shapely):
+    """ Points are placed in the polygon containing them, holes and multipolygons included """
+    if use_shapely and geocode.shapely is None:
+        pytest.skip("shapely is not installed")
+    index = ProvinceIndex(PROVINCE_FEATURES, use_shapely=use_shapely)
+    lats = [0.5, 1.5, 10.5, -3.0, 50.0, None]
+    lons = [0.5, 1.5, 10.5, 21.0, 50.0, 1.0]
+    assert index.locate(lats, lons).tolist() == [0, 1, 2, 2, -1, -1]
+    assert index.names[2] == "zabol" and index.countries[1] == "unitedstatesofamerica"
+
+
+def test_building_state_df_places_papers_with_coordinates(monkeypatch):
+    """ Papers with coordinates get the region of their polygon, the others are matched by name """
+    monkeypatch.setattr(clean_data, "get_province_index", lambda: ProvinceIndex(PROVINCE_FEATURES, use_shapely=False))
+    monkeypatch.setattr(clean_data, "get_gazetteer", lambda: Gazetteer())
+    data = pd.DataFrame({
+        "affiliation_name": ["A", "B", "C"],
+        # A's state and city would match nothing by name; C has no coordinates
+        "affiliation_state": ["NA", "NA", "NA"],
+        "affiliation_city": ["somewhere", "zabol", "beijing"],
+        "affiliation_country": ["iran", "afghanistan", "china"],
+        "affiliation_lat": [0.5, 10.5, None],
+        "affiliation_lon": [0.5, 10.5, None],
+        "citied_by": [1, 2, 3],
+        "cover_date": ["2023-03-07"] * 3,
+    })
+    result = clean_data.building_state_df(data, None).set_index("affiliation_name")
+    assert result.loc["a", "state_name"] == "sistanandbaluchestan"
+    assert result.loc["a", "area_km2"] == pytest.approx(174603.5090679983, rel=1e-6)
+    # Zabol is also a province of Iran; the polygon gives the Afghan one, with no area in provinces_area
+    assert result.loc["b", "state_name"] == "zabol"
+    assert result.loc["c", "state_name"] == "beijing"
+
+
+def test_clean_columns_through_the_normalization_cache(tmp_path, monkeypatch):
+    """
+    Values are normalized once per distinct value, into categoricals, and the cache is kept across runs
+    """
+    monkeypatch.setattr(normalization, "_CACHE", NormalizationCache(tmp_path / "cache.json"))
+    df = pd.DataFrame({"affiliation_city": ["New  York", "new york", None, "Zürich", "Zürich"]})
+    result = clean_columns(df, ["affiliation_city"])["affiliation_city"]
+    assert isinstance(result.dtype, pd.CategoricalDtype)
+    assert result.tolist() == ["newyork", "newyork", "", "zurich", "zurich"]
+    assert sorted(result.cat.categories) == ["", "newyork", "zurich"]
+
+    normalization.get_normalization_cache().save()
+    cache = NormalizationCache(tmp_path / "cache.json")
+    assert cache.values["Zürich"] == "zurich"
+    # A value found in the cache is not normalized again
+    cache.values["Zürich"] = "zurich-cached"
+    assert normalize_column(pd.Series(["Zürich"]), cache).tolist() == ["zurich-cached"]
+    assert not cache.dirty
+
+
 @pytest.mark.parametrize("input_title, expected_output", [
     ("The 3 great Projects 2025", "great projects"),
     ("Hello World", "hello world"),
@@ -168,4 +327,253 @@ def test_preprocess_title(input_title, expected_output):
     Tests that the preprocess_title function handles titles correctly.
     """
     result = preprocess_title(input_title)
-    assert result == expected_output
\ No newline at end of file
+    assert result == expected_output
+
+
+def test_render_leaves_no_pyplot_figures(tmp_path):
+    """
+    Rendering goes through the Agg canvas directly, so pyplot never tracks (and leaks) a figure
+    """
+    import matplotlib.pyplot as plt
+    before = plt.get_fignums()
+    output = render_word_cloud({"policy": 5, "learning": 3}, tmp_path / "cloud.png", dpi=50)
+    coefs = pd.Series([0.3, -0.2], index=["machine", "policy"])
+    features = render_feature_coefs(coefs, tmp_path / "features.png", dpi=50)
+    assert output.exists() and features.exists()
+    assert plt.get_fignums() == before
+
+
+def test_render_batch_formats_and_previews(tmp_path):
+    """
+    render_batch writes the requested format and a low-dpi preview next to every image
+    """
+    jobs = [(render_word_cloud, {"policy": 5, "learning": 3}, tmp_path / f"{year}_word_cloud.png") for year in [2020, 2021]]
+    outputs = render_batch(jobs, dpi=60, image_format="webp", preview_dpi=20, max_workers=1)
+    assert [p.name for p in outputs] == ["2020_word_cloud.webp", "2020_word_cloud_preview.webp",
+                                         "2021_word_cloud.webp", "2021_word_cloud_preview.webp"]
+    assert outputs[1].stat().st_size < outputs[0].stat().st_size
+    # Switching back to PNG replaces the WebP images, which the app would otherwise find first
+    render_batch(jobs[:1], dpi=60, image_format="png", preview_dpi=20, max_workers=1)
+    assert sorted(p.name for p in tmp_path.glob("2020_*")) == ["2020_word_cloud.png", "2020_word_cloud_preview.png"]
+
+
+def test_word_frq_animation_in_memory(tmp_path):
+    """
+    The animation is written straight from memory: one frame per year and no per-frame PNG left behind
+    """
+    from collections import Counter
+    from PIL import Image
+    word_freq_year = {2021: Counter({"policy": 4, "model": 2}), 2020: Counter({"learning": 3, "policy": 1})}
+    output = generate_word_frq_yearlygif(word_freq_year, "gif", tmp_path / "animation.gif")
+    assert Image.open(output).n_frames == 2
+    assert [p.name for p in tmp_path.iterdir()] == ["animation.gif"]
+    # Switching formats replaces the animation, which the app would otherwise keep showing
+    generate_word_frq_yearlygif(word_freq_year, "plotly", tmp_path / "animation.json")
+    assert [p.name for p in tmp_path.iterdir()] == ["animation.json"]
+    generate_word_frq_yearlygif(word_freq_year, "gif", tmp_path / "animation.gif")
+    assert [p.name for p in tmp_path.iterdir()] == ["animation.gif"]
+
+    fig = build_word_frq_animation(top_words_by_year(word_freq_year))
+    assert [frame.name for frame in fig.frames] == ["2020", "2021"]
+    assert list(fig.frames[1].data[0].y) == ["policy", "model"]
+
+
+def test_word_freq_store_round_trip(tmp_path):
+    """
+    The store keeps every count, and its precomputed/partial top-k matches a full sort
+    """
+    from collections import Counter
+    word_freq_year = {
+        2020: Counter({"policy": 5, "learning": 5, "model": 1, "ai": 2}),
+        2021: Counter({"policy": 6, "model": 9, "fairness": 1}),
+    }
+    store = WordFreqStore.from_yearly(word_freq_year, k=2)
+    store = WordFreqStore.load(store.save(tmp_path / "word_frequency.npz"))
+
+    assert store.word_freq(2020) == dict(word_freq_year[2020])
+    # Precomputed (k <= 2) and partial selection (k > 2) agree with sorting, ties alphabetical
+    expected = sorted(word_freq_year[2020].items(), key=lambda x: (-x[1], x[0]))
+    assert store.top_k(2020, 2) == expected[:2]
+    assert store.top_k(2020, 3) == expected[:3]
+    assert store.top_rising(2020, 2021, k=5) == [("model", 1, 9), ("fairness", 0, 1), ("policy", 5, 6)]
+
+
+def test_summarize_crdi(tmp_path):
+    """
+    The summary covers every year at once and is written next to the crdi outputs
+    """
+    crdi_by_year = {
+        2020: pd.DataFrame({"crdi_index": [1.0, 2.0, 3.0]}),
+        2021: pd.DataFrame({"crdi_index": [0.5, 10.0]}),
+    }
+    output_filename = tmp_path / "crdi_summary.json"
+    summary = summarize_crdi(crdi_by_year, output_filename)
+    assert json.loads(output_filename.read_text()) == summary
+    assert (summary["min"], summary["max"], summary["count"]) == (0.5, 10.0, 5)
+    assert summary["per_year"]["2021"] == {"min": 0.5, "max": 10.0}
+    assert summary["color_bins"][0] == 0.5 and summary["color_bins"][-1] == 10.0
+    assert summary["color_bins"] == sorted(summary["color_bins"])
+
+
+def test_calculate_crdi_same_state_name_in_two_countries(tmp_path):
+    """
+    Counts are grouped by state and country, so a state name shared by two countries does not
+    pick up the other country's papers and citations
+    """
+    papers = pd.DataFrame({
+        "state_name": ["punjab", "punjab", "punjab"],
+        "affiliation_state": ["pb", "pb", "punjab"],
+        "affiliation_country": ["india", "india", "pakistan"],
+        "affiliation_name": ["A", "B", "C"],
+        "citied_by": [100, 60, 36],
+        "cover_date": ["2020-05-01", "2020-06-01", "2020-07-01"],
+        "area_km2": [50378.24, 50378.24, 203843.63],
+    })
+    result_df = calculate_crdi(papers, tmp_path / "crdi.csv", 2020).set_index("affiliation_country")
+    assert result_df.loc["india", "total_paper_num"] == 2
+    assert result_df.loc["india", "total_cited_num"] == 160
+    assert result_df.loc["india", "month"] == 5
+    assert result_df.loc["pakistan", "total_paper_num"] == 1
+    assert result_df.loc["pakistan", "total_cited_num"] == 36
+    assert result_df.loc["pakistan", "academic_index"] == pytest.approx(36 / 2)
+
+
+def test_paper_schema(tmp_path):
+    """
+    Paper-level frames are typed once; the crdi month comes from the parsed date
+    """
+    papers = pd.DataFrame({
+        "state_name": ["illinois", "illinois", "ontario"],
+        "affiliation_state": ["il", "il", "on"],
+        "affiliation_country": ["unitedstates", "unitedstates", "canada"],
+        "affiliation_name": ["uchicago", "northwestern", "utoronto"],
+        "citied_by": ["12", None, "3"],
+        "cover_date": ["2023-03-07", "2023-03-21", "2023-11-02"],
+        "area_km2": [149997.0, 149997.0, 1076395.0],
+    })
+    typed = apply_paper_schema(papers)
+    assert all(isinstance(typed[c].dtype, pd.CategoricalDtype) for c in ["state_name", "affiliation_name"])
+    assert typed["citied_by"].dtype == "int32" and typed["citied_by"].tolist() == [12, 0, 3]
+    assert typed["cover_date"].dt.month.tolist() == [3, 3, 11]
+    assert apply_paper_schema(typed) is typed
+    assert papers["citied_by"].dtype == object
+
+    crdi = calculate_crdi(typed, tmp_path / "crdi.csv", 2023).set_index("state_name")
+    assert crdi.loc["illinois", "month"] == 3 and crdi.loc["illinois", "total_cited_num"] == 12
+    assert crdi["month"].dtype == "int16"
+
+
+def test_index_engine_variants():
+    """
+    All index variants are evaluated from one aggregate table, including a newly registered one
+    """
+    papers = pd.DataFrame({
+        "state_name": ["illinois"] * 4 + ["beijing"],
+        "affiliation_state": ["il"] * 4 + ["beijing"],
+        "affiliation_country": ["unitedstates"] * 4 + ["china"],
+        "affiliation_name": ["uchicago", "uchicago", "northwestern", "uiuc", "pku"],
+        "citied_by": [10, 3, 2, 0, 7],
+        "cover_date": ["2023-03-07"] * 5,
+        "area_km2": [149997.0] * 4 + [16251.9],
+    })
+    aggregate_df = build_aggregate_table(papers).set_index("state_name")
+    # Citations 10, 3, 2, 0 -> two papers with at least 2 citations
+    assert aggregate_df.loc["illinois", "h_index"] == 2
+    assert aggregate_df.loc["beijing", "h_index"] == 1
+    assert aggregate_df.loc["illinois", "n_institutions"] == 3
+
+    definitions = register_index("citations_per_km2", "total_cited_num / area_km2", dict(INDEX_VARIANTS))
+    index_df = evaluate_indices(aggregate_df, definitions)
+    assert index_df.loc["illinois", "citations_per_km2"] == pytest.approx(15 / 149997.0)
+    assert index_df.loc["illinois", "papers_per_institution"] == pytest.approx(4 / 3)
+    # The mean paper has 22 / 5 citations
+    assert index_df.loc["beijing", "field_normalized_citation"] == pytest.approx(7 / (22 / 5))
+    crdi = (index_df["paper_num_density"] + index_df["citation_density"] + index_df["academic_index"]) / 3
+    assert index_df["crdi_index"].tolist() == pytest.approx(crdi.tolist())
+
+
+def authorship_entry(eid, cited, authors, affiliations):
+    return {
+        "eid": eid,
+        "citedby-count": str(cited),
+        "affiliation": [{"afid": afid, "affilname": afid.upper()} for afid in affiliations],
+        "author": [{"@seq": str(seq), "authid": authid, "authname": authid,
+                    "afid": [{"$": afid} for afid in afids]}
+                   for seq, (authid, afids) in enumerate(authors, start=1)],
+    }
+
+
+def test_authorship_fractional_counts(tmp_path):
+    """
+    Every author and affiliation of a paper is kept; each paper's credit sums to 1
+    """
+    entries = [
+        # Two authors: a1 at uchicago and pku, a2 at uchicago
+        ("e1", authorship_entry("e1", 8, [("a1", ["uchicago", "pku"]), ("a2", ["uchicago"])], ["uchicago", "pku"])),
+        # A single author without affiliation
+        ("e2", authorship_entry("e2", 0, [("a2", [])], [])),
+        # No author list: shared by the listed affiliations
+        ("e3", authorship_entry("e3", 4, [], ["pku", "mit"])),
+    ]
+    tables = normalize_entries(entries)
+    assert len(tables["papers"]) == 3
+    assert tables["authors"]["authid"].tolist() == ["a1", "a2"]
+    assert len(tables["authorship"]) == 3 + 1 + 2
+    assert tables["authorship"]["affiliation_id"].min() == -1
+
+    counts = fractional_counts(tables, {"uchicago": "il"}).set_index("afid")
+    assert counts.loc["uchicago", "fractional_paper_num"] == pytest.approx(1 / 4 + 1 / 2)
+    assert counts.loc["pku", "fractional_paper_num"] == pytest.approx(1 / 4 + 1 / 2)
+    assert counts.loc["mit", "fractional_cited_num"] == pytest.approx(2)
+    assert counts.loc["pku", "full_paper_num"] == 2
+    assert counts.loc["uchicago", "affiliation_state"] == "il"
+    # Only the author without affiliation is not credited to any institution
+    assert counts["fractional_paper_num"].sum() == pytest.approx(2)
+
+    save_tables(tables, tmp_path / "kw_2023")
+    loaded = load_tables(tmp_path / "kw_2023")
+    pd.testing.assert_frame_equal(loaded["authorship"], tables["authorship"])
+
+
+def test_authorship_sample_entries():
+    """
+    The raw sample entries (first author only, or no author list) normalize without loss
+    """
+    with open("tests/sample.json", "r", encoding="utf-8") as f:
+        sample = json.load(f)
+    tables = normalize_entries([(entry.get("eid"), entry) for entry in sample])
+    assert len(tables["papers"]) == len(sample)
+    assert set(tables["authorship"]["paper_id"]) == set(range(len(sample)))
+
+
+def test_collaboration_network(tmp_path):
+    """
+    Co-authorship weights, region flows (R^T A R) and centralities from the sparse matrix
+    """
+    entries = [
+        ("e1", authorship_entry("e1", 0, [("a1", ["uchicago"]), ("a2", ["northwestern"]), ("a3", ["pku"])], [])),
+        ("e2", authorship_entry("e2", 0, [("a1", ["uchicago"]), ("a4", ["pku"])], [])),
+        ("e3", authorship_entry("e3", 0, [("a1", ["uchicago"])], [])),
+    ]
+    tables = normalize_entries(entries)
+    ids = dict(zip(tables["affiliations"]["afid"], tables["affiliations"]["affiliation_id"]))
+    matrix = coauthorship_matrix(tables)
+    assert (matrix != matrix.T).nnz == 0
+    # e1 gives each pair 1/2, e2 gives uchicago-pku 1; a single-affiliation paper adds nothing
+    assert matrix[ids["uchicago"], ids["pku"]] == pytest.approx(1.5)
+    assert matrix[ids["uchicago"], ids["northwestern"]] == pytest.approx(0.5)
+    assert matrix.diagonal().sum() == 0
+
+    regions = pd.Series({"uchicago": "illinois", "northwestern": "illinois", "pku": "beijing"})
+    network = build_collaboration(tables, regions, tmp_path / "kw_2023")
+    flows = network["flows"].set_index(["source_region", "target_region"])["weight"]
+    assert flows[("beijing", "illinois")] == pytest.approx(2.0)
+    assert flows[("illinois", "illinois")] == pytest.approx(0.5)
+
+    centrality = network["centrality"].set_index("afid")
+    assert centrality.loc["uchicago", "degree"] == 2
+    assert centrality.loc["uchicago", "eigenvector"] == pytest.approx(1.0)
+    assert centrality["pagerank"].sum() == pytest.approx(1.0)
+    assert centrality["pagerank"].idxmax() == "uchicago"
+    assert (tmp_path / "kw_2023_coauthorship.npz").exists()
+    assert (tmp_path / "kw_2023_region_flows.csv").exists()
@@ -0,0 +1,65 @@
+import json
+import pstats
+import tracemalloc
+
+from src.instrumentation import Metrics, instrument, profiled, write_metrics, METRICS
+
+
+def test_spans_and_counters():
+    """
+    Spans are aggregated by name, the enclosing span's memory peak includes the nested one's
+    """
+    metrics = Metrics(trace_memory=True)
+    with metrics.span("outer"):
+        with metrics.span("inner"):
+            blob = bytearray(2_000_000)
+        del blob
+    with metrics.span("inner"):
+        pass
+    metrics.count("scopus_requests", endpoint="search", status=200)
+    metrics.count("scopus_requests", endpoint="search", status=200)
+    metrics.count("bytes_written", 10, stage="state_crdi")
+    tracemalloc.stop()
+
+    report = metrics.report()
+    assert report["spans"]["inner"]["calls"] == 2
+    assert report["spans"]["inner"]["peak_traced_bytes"] >= 2_000_000
+    assert report["spans"]["outer"]["peak_traced_bytes"] >= report["spans"]["inner"]["peak_traced_bytes"]
+    counters = {(c["name"], c["labels"].get("status")): c["value"] for c in report["counters"]}
+    assert counters[("scopus_requests", "200")] == 2
+
+    text = metrics.to_prometheus()
+    assert 'mapademic_span_calls_total{span="inner"} 2' in text
+    assert 'mapademic_scopus_requests_total{endpoint="search",status="200"} 2' in text
+    assert 'mapademic_bytes_written_total{stage="state_crdi"} 10' in text
+    assert "# TYPE mapademic_span_seconds_total counter" in text
+
+
+def test_instrument_and_write_metrics(tmp_path):
+    """
+    The decorator keeps the function's name and result; the run metrics are saved as JSON and Prometheus text
+    """
+    @instrument("double_it")
+    def double(x):
+        return 2 * x
+
+    METRICS.reset()
+    assert double(4) == 8
+    assert double.__name__ == "double"
+    json_path, prom_path = write_metrics("test", tmp_path)
+    with open(json_path, "r", encoding="utf-8") as f:
+        report = json.load(f)
+    assert report["spans"]["double_it"]["calls"] == 1
+    assert "mapademic_span_calls_total" in prom_path.read_text(encoding="utf-8")
+
+
+def test_profiled(tmp_path):
+    """
+    A profile is written only when a profiler is asked for
+    """
+    with profiled("off", profiler="", output_dir=tmp_path):
+        sum(range(1000))
+    assert not list(tmp_path.iterdir())
+    with profiled("run", profiler="cprofile", output_dir=tmp_path):
+        sorted(range(1000), reverse=True)
+    assert pstats.Stats(str(tmp_path / "run.prof")).total_calls > 0
@@ -0,0 +1,127 @@
+import json
+from src.storage.paper_store import PaperStore, load_papers, record_key
+
+def paper(title, doi, afid="1", citied_by="3"):
+    return {"paper_title": title, "publication": "J", "citied_by": citied_by, "cover_date": "2023-05-01",
+            "Abstract": f"about {title}", "DOI": doi, "paper_author": "A.", "affiliation_name": "U",
+            "affiliation_city": "Chicago", "affiliation_country": "United States", "affiliation_id": afid}
+
+# A paper shared by two keywords is stored once
+def test_papers_are_deduplicated_across_keywords(tmp_path):
+    with PaperStore(tmp_path / "papers.sqlite") as store:
+        store.add_papers([("2-s2.0-1", paper("a", "10.1/a"), {"eid": "2-s2.0-1"}),
+                          ("2-s2.0-2", paper("b", "10.1/b"), None)], 2023)
+        store.add_papers([("2-s2.0-2", paper("b", "10.1/b", citied_by="5"), None)], 2023)
+        store.set_keyword_papers("Machine Learning", 2023, ["2-s2.0-2", "2-s2.0-1"])
+        store.set_keyword_papers("policy", 2023, ["2-s2.0-2"])
+
+        assert store.conn.execute("SELECT COUNT(*) FROM papers").fetchone()[0] == 2
+        records = store.papers("machinelearning", 2023, ["paper_title", "citied_by", "affiliation_state"])
+        assert records == [{"paper_title": "b", "citied_by": 5, "affiliation_state": "NA"},
+                           {"paper_title": "a", "citied_by": 3, "affiliation_state": "NA"}]
+        assert store.raw_entries(["2-s2.0-1", "2-s2.0-2"]) == {"2-s2.0-1": {"eid": "2-s2.0-1"}}
+
+# States set from the afid dictionary survive a later update of the same paper
+def test_update_states_is_kept_on_reinsert(tmp_path):
+    with PaperStore(tmp_path / "papers.sqlite") as store:
+        store.add_papers([("k", paper("a", "10.1/a", afid="60"), None)], 2023)
+        store.set_keyword_papers("ai", 2023, ["k"])
+        store.update_states({"60": "IL"})
+        store.add_papers([("k", paper("a", "10.1/a", afid="60"), None)], 2023)
+        assert store.papers("ai", 2023, ["affiliation_state"]) == [{"affiliation_state": "IL"}]
+
+def test_load_papers_prefers_store_and_falls_back_to_json(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "data/raw_data").mkdir(parents=True)
+    records = [dict(paper("a", "NA"), affiliation_state="CA")]
+    with open("data/raw_data/ai_2022_paper.json", "w") as f:
+        json.dump(records, f)
+    store_path = tmp_path / "papers.sqlite"
+
+    assert load_papers("ai", 2022, ["paper_title", "affiliation_state"], store_path) == \
+        [{"paper_title": "a", "affiliation_state": "CA"}]
+
+    with PaperStore(store_path) as store:
+        store.import_paper_json("ai", 2022, "data/raw_data/ai_2022_paper.json")
+        store.update_states({"1": "IL"})
+    assert load_papers("ai", 2022, ["paper_title", "affiliation_state"], store_path) == \
+        [{"paper_title": "a", "affiliation_state": "IL"}]
+    assert record_key(records[0]) == "title:a|2023-05-01"
+
+# Full-text index: Scopus style queries answered from the stored papers
+from src.storage.search_index import SearchIndex, to_fts_query, query_terms
+
+def test_to_fts_query_translates_scopus_syntax():
+    assert to_fts_query("machine learning and policy") == '"machine" AND "learning" AND "policy"'
+    assert to_fts_query('"machine learning" OR ai') == '"machine learning" OR "ai"'
+    assert to_fts_query("(climate OR weather) AND NOT polic*") == '( "climate" OR "weather" ) NOT "polic"*'
+    assert to_fts_query("test-time augmentation") == '"test time" AND "augmentation"'
+    assert query_terms("Machine Learning AND policy") == {"machine", "learning", "policy"}
+    assert query_terms("ai OR ml") is None
+
+def test_search_index_is_updated_as_papers_are_added(tmp_path):
+    with PaperStore(tmp_path / "papers.sqlite") as store:
+        store.add_papers([
+            ("k1", paper("Machine learning for climate policies", "10.1/a", citied_by="1"), {"authkeywords": "ai | governance"}),
+            ("k2", paper("Deep learning in healthcare", "10.1/b", citied_by="9"), None),
+        ], 2023)
+        index = SearchIndex(store)
+        assert index.search("policy") == ["k1"]
+        assert index.search("learning") == ["k2", "k1"]
+        assert index.search("governance", year=2023) == ["k1"]
+        assert index.search("learning", year=2022) == []
+
+        store.add_papers([("k3", paper("Policy learning", "10.1/c", citied_by="4"), None)], 2023)
+        assert index.search("learning AND policy") == ["k3", "k1"]
+
+def test_covering_query_needs_a_complete_broader_search(tmp_path):
+    with PaperStore(tmp_path / "papers.sqlite") as store:
+        index = SearchIndex(store)
+        index.log_query("machine learning", 2023, fetched=40, complete=True)
+        index.log_query("policy", 2023, fetched=100, complete=False)
+        assert index.covering_query("machine learning and policy", 2023) == "machine learning"
+        assert index.covering_query("machine learning and policy", 2022) is None
+        assert index.covering_query("policy and law", 2023) is None
+        assert index.covering_query("machine OR learning", 2023) is None
+
+def test_existing_store_is_indexed_when_opened(tmp_path):
+    with PaperStore(tmp_path / "papers.sqlite") as store:
+        store.add_papers([("k1", paper("Quantum sensing", "10.1/q"), None)], 2023)
+        store.conn.execute("DELETE FROM paper_fts")
+    with PaperStore(tmp_path / "papers.sqlite") as store:
+        assert SearchIndex(store).search("quantum") == ["k1"]
+
+# Raw archives: block-compressed JSON Lines next to (and preferred over) the JSON files
+from src.storage.raw_archive import (write_archive, write_records, read_records, iter_records, iter_blocks,
+                                     find_records, read_index)
+
+def test_archive_round_trip_and_seek(tmp_path):
+    records = [{"eid": f"2-s2.0-{i}", "dc:title": f"paper {i}", "city": "Zürich"} for i in range(25)]
+    archive = tmp_path / "ai_2023_raw.jsonl.gz"
+    write_records(iter(records), archive)
+    index = read_index(archive)
+    assert index["records"] == 25 and len(index["blocks"]) == 1
+
+    write_archive(records, archive, block_records=10)
+    assert [n for *_, n in read_index(archive)["blocks"]] == [10, 10, 5]
+    assert read_records(archive) == records
+    assert list(iter_records(archive, 12, 15)) == records[12:15]
+    # Only the block holding the records is read
+    assert [first for first, _ in iter_blocks(archive, 12, 15)] == [10]
+    # Without the index, the blocks are one valid gzip stream
+    (tmp_path / "ai_2023_raw.jsonl.gz.idx").unlink()
+    assert list(iter_records(archive, 12, 15)) == records[12:15]
+
+def test_archive_replaces_json_and_loaders_read_it(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "data/raw_data").mkdir(parents=True)
+    records = [dict(paper("a", "NA"), affiliation_state="CA")]
+    with open("data/raw_data/ai_2022_paper.json", "w") as f:
+        json.dump(records, f)
+    assert find_records("data/raw_data/ai_2022_paper.jsonl.gz").name == "ai_2022_paper.json"
+
+    write_records(records, "data/raw_data/ai_2022_paper.jsonl.gz")
+    assert not (tmp_path / "data/raw_data/ai_2022_paper.json").exists()
+    assert find_records("data/raw_data/ai_2022_paper.json").name == "ai_2022_paper.jsonl.gz"
+    assert load_papers("ai", 2022, ["paper_title", "affiliation_state"], tmp_path / "papers.sqlite") == \
+        [{"paper_title": "a", "affiliation_state": "CA"}]
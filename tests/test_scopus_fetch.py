@@ -0,0 +1,465 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+import pytest
+import requests
+
+from src import batch_search
+from src.scopus_client import ScopusClient, CircuitBreaker, CircuitOpenError, RetryBudget, parse_retry_after
+from src.quota_scheduler import QuotaScheduler, QuotaExhaustedError, key_id, load_quota_summary, ESTIMATE_MAX_AGE
+from src.scopus_records import Paper, decode_papers, decode_paper_records, paper_record, entry_record
+
+# The "-" in src/api-calling rules out a normal import
+keyword_search_module = batch_search.load_api_module("keyword_search")
+
+
+class FakeScopus:
+    """
+    A local HTTP server standing in for the Scopus API. `respond` maps (path, params) to
+    (status, headers, body); every request is recorded in `requests`.
+    """
+
+    def __init__(self, respond):
+        self.respond = respond
+        self.requests = []
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                url = urlparse(self.path)
+                params = {key: values[0] for key, values in parse_qs(url.query).items()}
+                fake.requests.append((url.path, params, dict(self.headers)))
+                status, headers, body = fake.respond(url.path, params)
+                payload = json.dumps(body).encode("utf-8")
+                self.send_response(status)
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_port}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def search_pages(total):
+    """
+    Serves `total` search results page by page (the cursor is the offset).
+    """
+    def respond(path, params):
+        start = 0 if params["cursor"] == "*" else int(params["cursor"])
+        end = min(start + int(params["count"]), total)
+        entries = [{"eid": f"2-s2.0-{i}"} for i in range(start, end)] or [{"error": "Result set was empty"}]
+        cursor = {"@next": str(end)} if end < total else {}
+        return 200, {}, {"search-results": {"opensearch:totalResults": str(total), "entry": entries, "cursor": cursor}}
+    return respond
+
+
+@pytest.fixture
+def fake_search(monkeypatch, tmp_path):
+    servers = []
+    def start(respond):
+        server = FakeScopus(respond)
+        servers.append(server)
+        client = ScopusClient("test-key", sleep=lambda seconds: None)
+        scheduler = QuotaScheduler(["test-key"], path=tmp_path / "api_quota.json", client_factory=lambda api_key: client)
+        monkeypatch.setattr(keyword_search_module, "SEARCH_URL", f"{server.url}/content/search/scopus")
+        monkeypatch.setattr(keyword_search_module, "get_scheduler", lambda: scheduler)
+        monkeypatch.setattr(keyword_search_module.time, "sleep", lambda seconds: None)
+        monkeypatch.setattr(keyword_search_module, "REQUEST_COUNTS", keyword_search_module.Counter())
+        return server
+    yield start
+    for server in servers:
+        server.close()
+
+
+# No separate totalResults probe: 100 complete records are 4 pages of 25
+def test_complete_fetch_sends_no_probe_request(fake_search):
+    server = fake_search(search_pages(1000))
+    results = keyword_search_module.fetch_results_with_cursor("ai", 2023)
+    assert len(results) == 100
+    assert [params["count"] for _, params, _ in server.requests] == ["25", "25", "25", "25"]
+    assert {params["view"] for _, params, _ in server.requests} == {"COMPLETE"}
+    assert server.requests[0][2]["X-ELS-APIKey"] == "test-key"
+    assert keyword_search_module.REQUEST_COUNTS["ai"] == 4
+
+# The first page tells there are only 30 results, so the second page asks for the last 5
+def test_fetch_is_sized_from_the_first_page(fake_search):
+    server = fake_search(search_pages(30))
+    results = keyword_search_module.fetch_results_with_cursor("ai", 2023)
+    assert len(results) == 30
+    assert [params["count"] for _, params, _ in server.requests] == ["25", "5"]
+
+def test_id_listing_uses_the_standard_view(fake_search):
+    server = fake_search(search_pages(1000))
+    ids = keyword_search_module.fetch_paper_ids("ai", 2023, max_results=300)
+    assert len(ids) == 300
+    assert [params["count"] for _, params, _ in server.requests] == ["200", "100"]
+    assert server.requests[0][1]["view"] == "STANDARD"
+    assert server.requests[0][1]["field"] == "eid,prism:doi"
+
+def test_empty_search_costs_one_request(fake_search):
+    server = fake_search(search_pages(0))
+    assert keyword_search_module.fetch_results_with_cursor("nothing", 2023) == []
+    assert len(server.requests) == 1
+
+def test_query_plan_picks_the_view_from_the_fields():
+    plan = keyword_search_module.QueryPlan("q", ["eid", "dc:title", "citedby-count"], 500)
+    assert (plan.view, plan.page_size, plan.expected_requests()) == ("STANDARD", 200, 3)
+    plan = keyword_search_module.QueryPlan("q", keyword_search_module.PAPER_FIELDS, 500)
+    assert (plan.view, plan.page_size, plan.expected_requests()) == ("COMPLETE", 25, 20)
+    plan.total_results = 40
+    assert plan.expected_requests() == 2
+
+# A 401 used to loop without end; now the fetch stops at once
+def test_fetch_stops_on_401(fake_search):
+    server = fake_search(lambda path, params: (401, {}, {"error": "invalid key"}))
+    assert keyword_search_module.fetch_results_with_cursor("ai", 2023) == []
+    assert len(server.requests) == 1
+
+
+# The resilient client
+def make_client(**kwargs):
+    slept = []
+    client = ScopusClient("test-key", sleep=slept.append, **kwargs)
+    return client, slept
+
+def test_client_retries_429_honoring_retry_after():
+    responses = iter([(429, {"Retry-After": "7"}, {}), (503, {}, {}), (200, {"X-RateLimit-Remaining": "41"}, {"ok": 1})])
+    server = FakeScopus(lambda path, params: next(responses))
+    try:
+        client, slept = make_client(backoff_base=1.0)
+        response = client.get(f"{server.url}/content/search/scopus")
+        assert response.status_code == 200
+        assert slept[0] == 7.0
+        assert 0 <= slept[1] <= 2.0  # Full jitter up to base * 2**1
+        assert client.rate_limit["remaining"] == 41
+        assert client.retry_budget.spent == 2
+    finally:
+        server.close()
+
+def test_client_gives_up_when_the_budget_is_spent():
+    server = FakeScopus(lambda path, params: (500, {}, {}))
+    try:
+        client, slept = make_client(retry_budget=RetryBudget(2), breaker=CircuitBreaker(failure_threshold=100))
+        assert client.get(server.url).status_code == 500
+        assert len(server.requests) == 3
+        # Nothing left: the next call is not retried
+        assert client.get(server.url).status_code == 500
+        assert len(server.requests) == 4
+    finally:
+        server.close()
+
+def test_client_does_not_sleep_until_a_distant_quota_reset():
+    server = FakeScopus(lambda path, params: (429, {"X-RateLimit-Remaining": "0", "X-RateLimit-Reset": "9999999999"}, {}))
+    try:
+        client, slept = make_client(max_wait=60)
+        assert client.get(server.url).status_code == 429
+        assert slept == []
+        assert len(server.requests) == 1
+    finally:
+        server.close()
+
+def test_circuit_breaker_fails_fast_then_half_opens():
+    now = [0.0]
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=30, clock=lambda: now[0])
+    server = FakeScopus(lambda path, params: (503, {}, {}))
+    try:
+        client, slept = make_client(max_retries=10, breaker=breaker)
+        with pytest.raises(CircuitOpenError):
+            client.get(server.url)
+        assert len(server.requests) == 3
+        with pytest.raises(CircuitOpenError):
+            client.get(server.url)
+        assert len(server.requests) == 3
+
+        now[0] = 31.0
+        assert breaker.state == "half_open"
+        server.respond = lambda path, params: (200, {}, {})
+        assert client.get(server.url).status_code == 200
+        assert breaker.state == "closed"
+    finally:
+        server.close()
+
+def test_half_open_circuit_lets_a_single_trial_through():
+    now = [0.0]
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=30, clock=lambda: now[0])
+    breaker.record_failure()
+    now[0] = 31.0
+    breaker.before_request()
+    # The other callers sharing the client fail fast while the trial is in flight
+    with pytest.raises(CircuitOpenError):
+        breaker.before_request()
+    breaker.record_failure()
+    assert breaker.state == "open"
+
+    now[0] = 62.0
+    breaker.before_request()
+    breaker.record_success()
+    assert breaker.state == "closed"
+    breaker.before_request()
+    breaker.before_request()
+
+def test_affiliation_lookups_stop_when_the_circuit_opens(monkeypatch, tmp_path):
+    """
+    Only real answers are stored: a failed lookup is left for the next run, and once the breaker opens
+    the remaining affiliations are not requested at all
+    """
+    answers = {"1": (200, {}, {"affiliation-retrieval-response": {"institution-profile": {"address": {"state": "IL"}}}}),
+               "2": (404, {}, {})}
+    server = FakeScopus(lambda path, params: answers.get(path.rsplit("/", 1)[-1], (503, {}, {})))
+    try:
+        client, slept = make_client(max_retries=0, breaker=CircuitBreaker(failure_threshold=2))
+        scheduler = QuotaScheduler(["test-key"], path=tmp_path / "q.json", client_factory=lambda api_key: client)
+        affiliation_module = batch_search.load_api_module("affiliation_state_match")
+        monkeypatch.setattr(affiliation_module, "AFFILIATION_URL", f"{server.url}/content/affiliation")
+        monkeypatch.setattr(affiliation_module, "get_scheduler", lambda: scheduler)
+
+        state_dict = affiliation_module.update_state_dict(["1", "2", "3", "4", "5", "6"], {})
+        assert state_dict == {"1": "IL", "2": "NA"}
+        assert [path.rsplit("/", 1)[-1] for path, _, _ in server.requests] == ["1", "2", "3", "4"]
+    finally:
+        server.close()
+
+def test_connection_errors_are_retried_then_raised():
+    client, slept = make_client(max_retries=2, breaker=CircuitBreaker(failure_threshold=100))
+    # Nothing listens on port 9 of localhost
+    with pytest.raises(requests.exceptions.ConnectionError):
+        client.get("http://127.0.0.1:9/")
+    assert len(slept) == 2
+
+def test_parse_retry_after():
+    assert parse_retry_after("12") == 12.0
+    assert parse_retry_after("Wed, 21 Oct 2015 07:28:10 GMT", now=1445412480) == 10.0
+    assert parse_retry_after("soon") is None
+
+
+# Spreading the calls over several API keys
+class StubResponse:
+    def __init__(self, status_code=200, headers=None):
+        self.status_code = status_code
+        self.headers = headers or {}
+        self.content = b"{}"
+
+def stub_clients(responses):
+    """
+    A client factory whose client for each key returns the next scripted response of that key.
+    """
+    sent = []
+    class StubClient:
+        def __init__(self, api_key):
+            self.api_key = api_key
+        def get(self, url, params=None):
+            sent.append(self.api_key)
+            return responses[self.api_key].pop(0)
+    return StubClient, sent
+
+def test_scheduler_uses_the_key_with_most_quota_and_persists_it(tmp_path):
+    quota_path = tmp_path / "api_quota.json"
+    responses = {"a": [StubResponse(headers={"X-RateLimit-Limit": "20000", "X-RateLimit-Remaining": "5",
+                                               "X-RateLimit-Reset": "9999999999"})],
+                 "b": [StubResponse(headers={"X-RateLimit-Remaining": "900"}), StubResponse(headers={"X-RateLimit-Remaining": "899"})]}
+    factory, sent = stub_clients(responses)
+    scheduler = QuotaScheduler(["a", "b"], path=quota_path, client_factory=factory)
+    scheduler.quota = {key_id("a"): {"search": {"remaining": 1000}}, key_id("b"): {"search": {"remaining": 10}}}
+
+    scheduler.get("url")
+    scheduler.get("url")
+    scheduler.get("url")
+    assert sent == ["a", "b", "b"]
+    # The quotas are written once per batch, not after every request
+    assert not quota_path.exists()
+    scheduler.save()
+
+    saved = quota_path.read_text()
+    assert '"a"' not in saved and '"b"' not in saved  # The keys themselves are never written
+    reloaded = QuotaScheduler(["a", "b"], path=quota_path, client_factory=factory)
+    assert reloaded.remaining("a", "search") == 5
+    assert reloaded.remaining("b", "search") == 899
+    assert load_quota_summary(quota_path) == (904, 9999999999)
+
+def test_scheduler_moves_to_the_next_key_on_429(tmp_path):
+    responses = {"a": [StubResponse(429, {"X-RateLimit-Remaining": "0", "X-RateLimit-Reset": "9999999999"})],
+                 "b": [StubResponse(200)]}
+    factory, sent = stub_clients(responses)
+    scheduler = QuotaScheduler(["a", "b"], path=tmp_path / "q.json", client_factory=factory)
+    assert scheduler.get("url").status_code == 200
+    assert sent == ["a", "b"]
+    assert scheduler.pick_key() == "b"
+
+def test_scheduler_429_without_headers_only_skips_the_key_for_that_request(tmp_path):
+    quota_path = tmp_path / "q.json"
+    responses = {"a": [StubResponse(429), StubResponse(200)], "b": [StubResponse(200)]}
+    factory, sent = stub_clients(responses)
+    scheduler = QuotaScheduler(["a", "b"], path=quota_path, client_factory=factory, clock=lambda: 1000)
+    scheduler.quota = {key_id("a"): {"search": {"remaining": 50}}, key_id("b"): {"search": {"remaining": 10}}}
+    assert scheduler.get("url").status_code == 200
+    assert scheduler.get("url").status_code == 200
+    assert sent == ["a", "b", "a"]
+    assert scheduler.remaining("a", "search") == 49
+    scheduler.save()
+
+    # A single key throttled without headers is not taken for out of quota, in this run or the next
+    factory, sent = stub_clients({"a": [StubResponse(429)]})
+    single = QuotaScheduler(["a"], path=quota_path, client_factory=factory, clock=lambda: 1000)
+    assert single.get("url").status_code == 429
+    assert QuotaScheduler(["a"], path=quota_path, client_factory=factory, clock=lambda: 1000).pick_key() == "a"
+
+def test_scheduler_estimates_expire(tmp_path):
+    scheduler = QuotaScheduler(["a"], path=tmp_path / "q.json", clock=lambda: 1000)
+    scheduler.quota = {key_id("a"): {"search": {"remaining": 0, "updated_at": 1000}}}
+    assert scheduler.pick_key() is None
+    scheduler.clock = lambda: 1000 + ESTIMATE_MAX_AGE
+    assert scheduler.remaining("a", "search") == 20000
+
+def test_scheduler_skips_a_key_whose_circuit_is_open(tmp_path):
+    server = FakeScopus(lambda path, params: (200, {}, {"ok": 1}))
+    try:
+        broken = CircuitBreaker(failure_threshold=1, reset_timeout=60)
+        broken.record_failure()
+        clients = {"a": make_client(breaker=broken)[0], "b": make_client()[0]}
+        scheduler = QuotaScheduler(["a", "b"], path=tmp_path / "q.json", client_factory=clients.get)
+        scheduler.quota = {key_id("a"): {"search": {"remaining": 1000}}, key_id("b"): {"search": {"remaining": 10}}}
+        # "a" has the most quota, but its circuit is open: the request goes to "b"
+        assert scheduler.get(server.url).status_code == 200
+        assert len(server.requests) == 1
+        assert scheduler.remaining("b", "search") == 9
+
+        single = QuotaScheduler(["a"], path=tmp_path / "q.json", client_factory=clients.get)
+        with pytest.raises(CircuitOpenError):
+            single.get(server.url)
+    finally:
+        server.close()
+
+def test_scheduler_raises_when_every_key_is_exhausted(tmp_path):
+    factory, sent = stub_clients({})
+    scheduler = QuotaScheduler(["a"], path=tmp_path / "q.json", client_factory=factory, clock=lambda: 0)
+    scheduler.quota = {key_id("a"): {"search": {"remaining": 0, "reset": 100}}}
+    with pytest.raises(QuotaExhaustedError):
+        scheduler.get("url")
+    # After the reset time the key is usable again
+    scheduler.clock = lambda: 200
+    assert scheduler.pick_key() == "a"
+
+def test_grant_gives_small_keywords_everything_and_throttles_large_ones(tmp_path):
+    scheduler = QuotaScheduler(["a"], path=tmp_path / "q.json", max_share=0.25, reserve=0)
+    scheduler.quota = {key_id("a"): {"search": {"remaining": 400}}}
+    assert scheduler.grant("small", 30) == 30
+    assert scheduler.grant("large", 500) == 100
+    scheduler.used["large"] = 100
+    assert scheduler.grant("large", 500) == 0
+
+# Without the 100 cap, a search is fetched completely when the quota share allows it, and cut otherwise
+def test_uncapped_fetch_is_sized_by_the_quota(fake_search, monkeypatch):
+    server = fake_search(search_pages(120))
+    assert len(keyword_search_module.fetch_results_with_cursor("ai", 2023, max_results=None)) == 120
+
+    scheduler = keyword_search_module.get_scheduler()
+    scheduler.quota = {key_id("test-key"): {"search": {"remaining": 113}}}
+    scheduler.used.clear()
+    server.requests.clear()
+    # After the first page 112 are left: (112 - 100 reserve) * 0.25 = 3 requests, the first page + 2 more
+    assert len(keyword_search_module.fetch_results_with_cursor("ai", 2023, max_results=None)) == 75
+    assert len(server.requests) == 3
+
+
+# The whole batch fetch against the local mock API, with throttling, errors and quotas
+from benchmarks.mock_scopus_server import MockScopusServer
+from benchmarks.bench_fetch import point_at
+from src import quota_scheduler
+from src.storage.paper_store import PaperStore
+
+@pytest.fixture
+def mock_api(monkeypatch, tmp_path):
+    (tmp_path / "data" / "raw_data").mkdir(parents=True)
+    monkeypatch.setattr(quota_scheduler, "_SCHEDULER", None)
+    servers = []
+    def start(api_keys=("key-1",), **kwargs):
+        # The mock reads its affiliations from data/raw_data, the fetch writes under the temporary directory
+        server = MockScopusServer(papers_per_year=300, retry_after=0, **kwargs).start()
+        servers.append(server)
+        monkeypatch.chdir(tmp_path)
+        # Fresh copies of the scripts, so the other tests keep the real URLs
+        keyword_search = batch_search.load_api_module("keyword_search")
+        affiliation_state_match = batch_search.load_api_module("affiliation_state_match")
+        scheduler = point_at(server, keyword_search, affiliation_state_match, list(api_keys), tmp_path / "api_quota.json")
+        return server, keyword_search, affiliation_state_match, scheduler
+    yield start
+    for server in servers:
+        server.close()
+
+def test_batch_fetch_against_mock_api(mock_api, tmp_path):
+    server, keyword_search, affiliation_state_match, _ = mock_api(match_share=0.2, throttle_rate=0.15, error_rate=0.1, seed=1)
+    with PaperStore(tmp_path / "papers.sqlite") as store:
+        batch_search.collect_papers(keyword_search, store, ["ai", "policy"], [2023], max_results=None)
+        states = batch_search.match_affiliations(affiliation_state_match, store, ["ai", "policy"])
+        # Every result is stored, most cited first, despite the 429s and 503s on the way
+        for keyword in ("ai", "policy"):
+            assert store.keyword_keys(keyword, 2023) == [entry["eid"] for entry in server.search_results(keyword, 2023)]
+        assert server.stats[("search", 429)] + server.stats[("search", 503)] > 0
+        assert set(states.values()) <= set(server.affiliations["state"])
+
+        # A resumed run finds everything in the store
+        server.stats.clear()
+        batch_search.collect_papers(keyword_search, store, ["ai", "policy"], [2023], max_results=None)
+        assert sum(server.stats.values()) == 0
+
+def test_fetch_stays_within_the_mock_quota(mock_api):
+    server, keyword_search, _, scheduler = mock_api(quota=3)
+    # The first page reports 2 requests left, one of which the keyword already spent on that page
+    assert len(keyword_search.fetch_results_with_cursor("ai", 2023, max_results=100)) == 50
+    # The last request of the quota gives another keyword its first page only
+    assert len(keyword_search.fetch_results_with_cursor("policy", 2023, max_results=100)) == 25
+    assert server.stats[("search", 200)] == 3
+    assert server.stats[("search", 429)] == 0
+    assert scheduler.remaining("key-1", "search") == 0
+
+def test_mock_api_enforces_page_sizes(mock_api):
+    server, *_ = mock_api()
+    params = {"query": "TITLE-ABS-KEY(ai) AND PUBYEAR = 2023", "view": "COMPLETE", "count": "26"}
+    assert requests.get(f"{server.url}/content/search/scopus", params=params, headers={"X-ELS-APIKey": "k"}).status_code == 400
+    assert requests.get(f"{server.url}/content/search/scopus", params=params).status_code == 401
+
+
+def test_paper_records_from_raw_bytes(tmp_path):
+    """
+    Typed records (Structs with msgspec, __slots__ classes without) give the same paper records as the
+    raw dicts, missing fields and nulls included
+    """
+    with open("tests/sample.json", "r", encoding="utf-8") as f:
+        entries = json.load(f)
+    odd = json.loads(json.dumps(entries[0]))
+    odd["affiliation"][0]["affiliation-city"] = None
+    del odd["dc:description"]
+    # An unexpected shape: the Struct decoding gives way to the generic one
+    odd_afid = json.loads(json.dumps(entries[0]))
+    odd_afid["author"][0]["afid"] = {"$": "60104538"}
+    entries += [odd, odd_afid]
+    data = json.dumps(entries).encode()
+
+    expected = [entry_record(entry) for entry in entries]
+    assert [paper_record(paper) for paper in decode_papers(data)] == expected
+    assert [paper_record(Paper.from_entry(entry)) for entry in entries] == expected
+    assert decode_paper_records(data) == expected
+    assert expected[0]["affiliation_name"] == "Institute of Legal Studies of the Polish Academy of Sciences"
+    assert expected[1]["paper_author"] == "NA" and expected[2]["affiliation_name"] == "NA"
+    assert expected[3]["affiliation_city"] is None and expected[3]["Abstract"] == "NA"
+    assert expected[4]["affiliation_id"] == "NA"
+    assert not hasattr(Paper.from_entry(entries[0]), "__dict__")
+
+    raw_file = tmp_path / "raw.json"
+    raw_file.write_bytes(data)
+    keyword_search_module.build_paper_json(raw_file, tmp_path / "paper.json")
+    with open(tmp_path / "paper.json", "r", encoding="utf-8") as f:
+        assert json.load(f) == expected
@@ -9,8 +9,15 @@ from src.visualization.heatmap import (
     create_map_and_left_timeline_figure,
     generate_heatmaps,
     add_maps_and_left_timeline,
-    combined_heatmaps_vertical_with_left_timeline
+    combined_heatmaps_vertical_with_left_timeline,
+    quantile_colorscale,
+    add_flow_lines
 )
+from src.visualization import cache_utils
+from src.visualization.cache_utils import clean_region_name, load_crdi_summary, clear_keyword_caches
+
+# The cached loader, before the fixture below replaces it
+REAL_LOAD_CSV = cache_utils.load_csv
 
 # --------------------------
 # Dummy Functions for Testing
@@ -93,6 +100,18 @@ def test_main_heatmap():
     assert fig.data[0].type in valid_types
 
 
+def test_main_heatmap_joins_names_with_punctuation(monkeypatch):
+    """ A state_name with punctuation ("washington,d.c.") is drawn on its GeoJSON region, not left blank """
+    monkeypatch.setattr("src.visualization.heatmap.load_csv", lambda keywords, year: pd.DataFrame(
+        {"state_name": ["washington,d.c."], "crdi_index": [1.0], "year": [year]}))
+    geojson_data = {"type": "FeatureCollection", "features": [{
+        "type": "Feature", "properties": {"name": "Washington, D.C.", "clean_name": clean_region_name("Washington, D.C.")},
+        "geometry": {"type": "Polygon", "coordinates": [[[0, 0], [0, 1], [1, 1], [1, 0], [0, 0]]]}}]}
+    fig = main_heatmap("test", 2021, geojson_data)
+    assert list(fig.data[0].locations) == ["washingtondc"]
+    assert fig.data[0].customdata[0][0] == "Washington, D.C."
+
+
 def test_create_map_and_left_timeline_figure():
     """
     Test the creation of the subplot layout with a left timeline:
@@ -192,3 +211,67 @@ def test_combined_heatmaps_vertical_with_left_timeline(monkeypatch):
         if getattr(trace, "type", None) == "scatter" and getattr(trace, "mode", None) == "lines+markers+text"
     ]
     assert len(timeline_traces) == 1
+
+
+def test_combined_heatmaps_use_precomputed_summary(monkeypatch):
+    """
+    With a crdi summary, the shared coloraxis range (and the quantile bins) come from it
+    instead of from the loaded yearly data.
+    """
+    summary = {"min": 0.0, "max": 10.0, "count": 8, "color_bins": [0, 1, 2, 3, 4, 5, 6, 10]}
+    monkeypatch.setattr("src.visualization.heatmap.main_heatmap", dummy_main_heatmap)
+    monkeypatch.setattr("src.visualization.heatmap.load_crdi_summary", lambda keywords: summary)
+    fig = combined_heatmaps_vertical_with_left_timeline("test", [2020, 2021], binned=True)
+    assert (fig.layout.coloraxis.cmin, fig.layout.coloraxis.cmax) == (0.0, 10.0)
+    scale = fig.layout.coloraxis.colorscale
+    # 7 bins, two stops each, covering the whole [0, 1] range
+    assert len(scale) == 14
+    assert scale[0][0] == 0.0 and scale[-1][0] == 1.0
+    assert scale[2][0] == pytest.approx(0.1)
+
+
+def test_quantile_colorscale_skewed_bins():
+    """
+    Repeated quantile edges (many equal values) still give a valid, non-decreasing colorscale
+    """
+    summary = {"min": 0.0, "max": 100.0, "color_bins": [0, 0, 0, 1, 2, 5, 20, 100]}
+    scale = quantile_colorscale(summary)
+    positions = [position for position, _ in scale]
+    assert positions == sorted(positions)
+    assert scale[-1][1] == "#333C80"
+
+
+def test_add_flow_lines():
+    """
+    Flows between regions become a few line traces on the map; flows within a region are not drawn.
+    """
+    geojson_data = {"type": "FeatureCollection", "features": [
+        {"type": "Feature", "properties": {"name": name, "clean_name": name},
+         "geometry": {"type": "Polygon", "coordinates": [[[x, 0], [x, 2], [x + 2, 2], [x + 2, 0], [x, 0]]]}}
+        for name, x in (("a", 0), ("b", 10), ("c", 20))
+    ]}
+    flows = pd.DataFrame({
+        "source_region": ["a", "a", "b", "a"],
+        "target_region": ["b", "c", "c", "a"],
+        "weight": [1.0, 5.0, 3.0, 9.0],
+    })
+    fig = add_flow_lines(go.Figure(), flows, geojson_data)
+    lines = [trace for trace in fig.data if trace.type == "scattermap"]
+    assert 1 <= len(lines) <= 3
+    assert sum(trace.lat.count(None) for trace in lines) == 3
+    # The line of the strongest flow a-c goes from the center of a to the center of c
+    strongest = max(lines, key=lambda trace: trace.line.width)
+    assert strongest.lon[:2] == (1.0, 21.0)
+
+
+def test_rerun_outputs_replace_the_cached_ones(tmp_path, monkeypatch):
+    # The summary cache is keyed on the keyword only: a rerun of the pipeline must clear it
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(cache_utils, "load_csv", REAL_LOAD_CSV)
+    summary_path = tmp_path / "data" / "output_data" / "state_crdi" / "rerun_crdi_summary.json"
+    summary_path.parent.mkdir(parents=True)
+    summary_path.write_text('{"count": 1, "min": 0, "max": 1}', encoding="utf-8")
+    assert load_crdi_summary("rerun")["max"] == 1
+    summary_path.write_text('{"count": 2, "min": 0, "max": 5}', encoding="utf-8")
+    clear_keyword_caches()
+    assert load_crdi_summary("rerun")["max"] == 5